@@ -0,0 +1,323 @@
+"""Benchmark | Legacy Profile
+
+The Profile class as it was before profiles were slotted and
+decoded from a field table, the stat views as they were before they
+were compiled from specs, and the global permission check as it was
+before permissions were compiled, kept here so that benchmarks can
+compare against them. Also provides API payloads recorded from
+the profiles in the data file.
+
+Run benchmarks from the `bot` folder, e.g.
+python -m Benchmarks.ProfileMemory
+"""
+import datetime
+import pickle
+
+from Resources.APISession import STATS, WEAPONS, HACKS, WeaponStat, HackStat
+
+class LegacyWeaponStat:
+    def __init__(self, options, name):
+        self.name = name
+
+        self.kills = options.get('kills')
+        self.damage = options.get('damage')
+        self.headshot_damage = options.get('headshot_damage')
+        self.fusions = options.get('fusions')
+        self.hs_accuracy = options.get('hs_accuracy')
+
+class LegacyHackStat:
+    def __init__(self, options, name):
+        self.name = name
+
+        self.kills = options.get('kills')
+        self.damage = options.get('damage')
+        self.headshot_damage = options.get('headshot_damage')
+        self.fusions = options.get('fusions')
+        self.hs_accuracy = options.get('headshot_accuracy')
+
+class LegacyProfile:
+    def __init__(self, options):
+        self.found = options.get('found', False)
+
+        if self.found:
+            self.player = options.get('player')
+            self.player_id = self.player.get('p_id')
+            self.player_user = self.player.get('p_user')
+            self.player_name = self.player.get('p_name')
+            self.platform = self.player.get('p_platform')
+
+            self.profile_verified = options.get('custom').get('verified')
+            self.profile_visitors = options.get('custom').get('visitors')
+
+            self.last_refresh = datetime.datetime.fromtimestamp(options.get('refresh').get('utime'))
+
+            stats = options.get('data').get('stats')
+
+            self.wins = stats.get('wins')
+            self.crown_wins = stats.get('crown_wins')
+            self.damage = stats.get('damage')
+            self.assists = stats.get('assists')
+            self.matches = stats.get('matches')
+            self.chests_broken = stats.get('chests_broken')
+            self.crown_pickups = stats.get('crown_pickups')
+            self.damage_done = stats.get('damage_done')
+            self.kills = stats.get('kills')
+            self.fusions = stats.get('fusions')
+            self.last_rank = stats.get('last_rank')
+            self.revives = stats.get('revives')
+            self.time_played = stats.get('time_played')
+            self.solo_crown_wins = stats.get('solo_crown_wins')
+            self.squad_crown_wins = stats.get('squad_crown_wins')
+            self.solo_last_rank = stats.get('solo_last_rank')
+            self.squad_last_rank = stats.get('squad_last_rank')
+            self.solo_time_played = stats.get('solo_time_played')
+            self.squad_time_played = stats.get('squad_time_played')
+            self.solo_matches = stats.get('solo_matches')
+            self.squad_matches = stats.get('squad_matches')
+            self.solo_wins = stats.get('solo_wins')
+            self.squad_wins = stats.get('squad_wins')
+            self.careerbest_fused_to_max = stats.get('careerbest_fused_to_max')
+            self.careerbest_chests = stats.get('careerbest_chests')
+            self.careerbest_shockwaved = stats.get('careerbest_shockwaved')
+            self.careerbest_damage_done = stats.get('careerbest_damage_done')
+            self.careerbest_revealed = stats.get('careerbest_revealed')
+            self.careerbest_assists = stats.get('careerbest_assists')
+            self.careerbest_damage_shielded = stats.get('careerbest_shielded')
+            self.careerbest_long_range_final_blows = stats.get('careerbest_long_range_final_blows')
+            self.careerbest_short_range_final_blows = stats.get('careerbest_short_range_final_blows')
+            self.careerbest_kills = stats.get('careerbest_kills')
+            self.careerbest_item_fused = stats.get('careerbest_item_fused')
+            self.careerbest_critical_damage = stats.get('careerbest_critical_damage')
+            self.careerbest_survival_time = stats.get('careerbest_survival_time')
+            self.careerbest_healed = stats.get('careerbest_healed')
+            self.careerbest_revives = stats.get('careerbest_revives')
+            self.careerbest_snare_triggered = stats.get('careerbest_snare_triggered')
+            self.careerbest_mines_triggered = stats.get('careerbest_mines_triggered')
+            self.weapon_headshot_damage = stats.get('weapon_headshot_damage')
+            self.weapon_body_damage = stats.get('weapon_body_damage')
+            self.damage_by_items = stats.get('damage_by_items')
+            self.avg_kills_per_match = stats.get('avg_kills_per_match')
+            self.avg_dmg_per_kill = stats.get('avg_dmg_per_kill')
+            self.losses = stats.get('losses')
+            self.solo_losses = stats.get('solo_losses')
+            self.squad_losses = stats.get('squad_losses')
+            self.winrate = stats.get('winrate')
+            self.solo_winrate = stats.get('solo_winrate')
+            self.squad_winrate = stats.get('squad_winrate')
+            self.crown_pickup_success_rate = stats.get('crown_pick_success_rate')
+            self.kd = stats.get('kd')
+            self.headshot_accuracy = stats.get('headshot_accuracy')
+
+            weapons = options.get('data').get('weapons')
+            self.dragonfly = LegacyWeaponStat(weapons.get('Dragon Fly'), 'Dragon Fly')
+            self.mammoth = LegacyWeaponStat(weapons.get('Mammoth MK1'), 'Mammoth MK1')
+            self.ripper = LegacyWeaponStat(weapons.get('The Ripper'), 'The Ripper')
+            self.dtap = LegacyWeaponStat(weapons.get('D-Tap'), 'D-Tap')
+            self.harpy = LegacyWeaponStat(weapons.get('Harpy'), 'Harpy')
+            self.komodo = LegacyWeaponStat(weapons.get('Komodo'), 'Komodo')
+            self.hexfire = LegacyWeaponStat(weapons.get('Hexfire'), 'Hexfire')
+            self.riot = LegacyWeaponStat(weapons.get('Riot One'), 'Riot One')
+            self.salvo = LegacyWeaponStat(weapons.get('Salvo EPL'), 'Salvo EPL')
+            self.skybreaker = LegacyWeaponStat(weapons.get('Skybreaker'), 'Skybreaker')
+            self.protocol = LegacyWeaponStat(weapons.get('Protocol V'), 'Protocol V')
+
+            hacks = options.get('data').get('hacks')
+            self.mine = LegacyHackStat(hacks.get('Mine'), 'Mine')
+            self.slam = LegacyHackStat(hacks.get('Slam'), 'Slam')
+            self.shockwave = LegacyHackStat(hacks.get('Shockwave'), 'Shockwave')
+            self.wall = LegacyHackStat(hacks.get('Wall'), 'Wall')
+            self.heal = LegacyHackStat(hacks.get('Heal'), 'Heal')
+            self.reveal = LegacyHackStat(hacks.get('Reveal'), 'Reveal')
+            self.teleport = LegacyHackStat(hacks.get('Teleport'), 'Teleport')
+            self.ball = LegacyHackStat(hacks.get('Ball'), 'Ball')
+            self.invis = LegacyHackStat(hacks.get('Invisibility'), 'Invisibility')
+            self.armor = LegacyHackStat(hacks.get('Armor'), 'Armor')
+            self.magnet = LegacyHackStat(hacks.get('Magnet'), 'Magnet')
+
+            self.avatar_url = f"https://ubisoft-avatars.akamaized.net/{self.player_id}/default_146_146.png"
+            self.url = f"https://tabstats.com/hyperscape/player/{self.player_name.lower()}/{self.player_id}"
+
+            self.is_premium = options.get('social').get('is_premium')
+
+def recorded_payloads(path = "./Data/data_storage.pickle"):
+    """Function | Recorded Payloads
+
+    Rebuild the API payloads of every complete profile saved in the
+    data file, in the shape returned by the API's player endpoint.
+    """
+    with open(path, 'rb') as file:
+        data = pickle.load(file)
+
+    payloads = []
+    for profile in data['HyperscapeUsers']['profiles'].values():
+        # Profiles saved before weapon and hack stats existed are incomplete.
+        if profile.protocol.kills is None:
+            continue
+        payloads.append({
+            "found": True,
+            "player": profile.player,
+            "custom": {"verified": profile.profile_verified, "visitors": profile.profile_visitors},
+            "refresh": {"utime": int(profile.refresh_utime)},
+            "social": {"is_premium": profile.is_premium},
+            "data": {
+                "stats": {key: getattr(profile, attr) for attr, key in STATS},
+                "weapons": {name: dict(zip(WeaponStat.KEYS, getattr(profile, attr).values())) for attr, name in WEAPONS},
+                "hacks": {name: dict(zip(HackStat.KEYS, getattr(profile, attr).values())) for attr, name in HACKS}
+            }
+        })
+    return payloads
+
+def legacy_stat_category_fields(name, profile):
+    """Function | Legacy Stat Category Fields
+
+    The hand written fields of each StatCategory, as they were before
+    views were compiled from specs in "./Resources/Views.py".
+    """
+    if name == "main":
+        fields = [
+            {"name": "Kills", "value": profile.kills, "inline": True},
+            {"name": "Assists", "value": profile.assists, "inline": True},
+            {"name": "KD", "value": profile.kd, "inline": True},
+            {"name": "Wins", "value": profile.wins, "inline": True},
+            {"name": "Losses", "value": profile.losses, "inline": True},
+            {"name": "Winrate", "value": profile.winrate, "inline": True},
+            {"name": "Crown Wins", "value": profile.crown_wins, "inline": True},
+            {"name": "Crown Pickups", "value": profile.crown_pickups, "inline": True},
+            {"name": "Crown Success", "value": profile.crown_pickup_success_rate, "inline": True}
+        ]
+    elif name == "solo":
+        fields = [
+            {"name": "Solo Winrate", "value": profile.solo_winrate, "inline": True},
+            {"name": "Solo Wins", "value": profile.solo_wins, "inline": True},
+            {"name": "Solo Losses", "value": profile.solo_losses, "inline": True},
+            {"name": "Solo Matches", "value": profile.solo_matches, "inline": True},
+            {"name": "Crown Wins", "value": profile.solo_crown_wins, "inline": True},
+            {"name": "Time Played", "value": profile.solo_time_played, "inline": True}
+        ]
+    elif name == "squad":
+        fields = [
+            {"name": "Squad Winrate", "value": profile.squad_winrate, "inline": True},
+            {"name": "Squad Wins", "value": profile.squad_wins, "inline": True},
+            {"name": "Squad Losses", "value": profile.squad_losses, "inline": True},
+            {"name": "Squad Matches", "value": profile.squad_matches, "inline": True},
+            {"name": "Crown Wins", "value": profile.squad_crown_wins, "inline": True},
+            {"name": "Time Played", "value": profile.squad_time_played, "inline": True}
+        ]
+    elif name == "general":
+        fields = [
+            {"name": "Kills", "value": profile.kills, "inline": True},
+            {"name": "Matches", "value": profile.matches, "inline": True},
+            {"name": "Avg. Kills per Match", "value": profile.avg_kills_per_match, "inline": True},
+            {"name": "Avg. Damage per Kill", "value": profile.avg_dmg_per_kill, "inline": True},
+            {"name": "Headshot Accuracy", "value": profile.headshot_accuracy, "inline": True},
+            {"name": "Headshot Damage", "value": profile.weapon_headshot_damage, "inline": True},
+            {"name": "Weapon Damage", "value": profile.weapon_headshot_damage + profile.weapon_body_damage, "inline": True},
+            {"name": "Hack Damage", "value": profile.damage_by_items, "inline": True},
+            {"name": "Chests Broken", "value": profile.chests_broken, "inline": True},
+            {"name": "Fusions", "value": profile.fusions, "inline": True},
+            {"name": "Revives", "value": profile.revives, "inline": True},
+            {"name": "Time Played", "value": profile.time_played, "inline": True}
+        ]
+    elif name == "best":
+        fields = [
+            {"name": "Most Kills", "value": profile.careerbest_kills, "inline": True},
+            {"name": "Long Range Kills", "value": profile.careerbest_long_range_final_blows, "inline": True},
+            {"name": "Short Range Kills", "value": profile.careerbest_short_range_final_blows, "inline": True},
+            {"name": "Damage Done", "value": profile.careerbest_damage_done, "inline": True},
+            {"name": "Headshot Damage", "value": profile.careerbest_critical_damage, "inline": True},
+            {"name": "Assists", "value": profile.careerbest_assists, "inline": True},
+            {"name": "Healed", "value": profile.careerbest_healed, "inline": True},
+            {"name": "Survival Time", "value": profile.careerbest_survival_time, "inline": True},
+            {"name": "Items Fused", "value": profile.careerbest_item_fused, "inline": True},
+            {"name": "Maximum Fusion", "value": profile.careerbest_fused_to_max, "inline": True},
+            {"name": "Revealed", "value": profile.careerbest_revealed, "inline": True}
+        ]
+    elif name == "weapons":
+        fields = [
+            {"name": f"{profile.dragonfly.name} Kills", "value": profile.dragonfly.kills, "inline": True},
+            {"name": f"{profile.mammoth.name} Kills", "value": profile.mammoth.kills, "inline": True},
+            {"name": f"{profile.ripper.name} Kills", "value": profile.ripper.kills, "inline": True},
+            {"name": f"{profile.dtap.name} Kills", "value": profile.dtap.kills, "inline": True},
+            {"name": f"{profile.harpy.name} Kills", "value": profile.harpy.kills, "inline": True},
+            {"name": f"{profile.komodo.name} Kills", "value": profile.komodo.kills, "inline": True},
+            {"name": f"{profile.hexfire.name} Kills", "value": profile.hexfire.kills, "inline": True},
+            {"name": f"{profile.riot.name} Kills", "value": profile.riot.kills, "inline": True},
+            {"name": f"{profile.salvo.name} Kills", "value": profile.salvo.kills, "inline": True},
+            {"name": f"{profile.skybreaker.name} Kills", "value": profile.skybreaker.kills, "inline": True},
+            {"name": f"{profile.protocol.name} Kills", "value": profile.protocol.kills, "inline": True}
+        ]
+    elif name == "hacks":
+        fields = [
+            {"name": f"{profile.mine.name} Fusions", "value": profile.mine.fusions, "inline": True},
+            {"name": f"{profile.slam.name} Fusions", "value": profile.slam.fusions, "inline": True},
+            {"name": f"{profile.shockwave.name} Fusions", "value": profile.shockwave.fusions, "inline": True},
+            {"name": f"{profile.wall.name} Fusions", "value": profile.wall.fusions, "inline": True},
+            {"name": f"{profile.heal.name} Fusions", "value": profile.heal.fusions, "inline": True},
+            {"name": f"{profile.teleport.name} Fusions", "value": profile.teleport.fusions, "inline": True},
+            {"name": f"{profile.ball.name} Fusions", "value": profile.ball.fusions, "inline": True},
+            {"name": f"{profile.invis.name} Fusions", "value": profile.invis.fusions, "inline": True},
+            {"name": f"{profile.armor.name} Fusions", "value": profile.armor.fusions, "inline": True},
+            {"name": f"{profile.magnet.name} Fusions", "value": profile.magnet.fusions, "inline": True}
+        ]
+
+    return fields
+
+def legacy_weapon_fields(name, profile):
+    """Function | Legacy Weapon Fields
+
+    The hand written fields of the `stat` view of a single weapon.
+    """
+    stat = getattr(profile, name)
+    return [
+        {"name": "Kills", "value": stat.kills, "inline": True},
+        {"name": "Damage", "value": stat.damage, "inline": True},
+        {"name": "Headshot Damage", "value": stat.headshot_damage, "inline": True},
+        {"name": "Fusions", "value": stat.fusions, "inline": True},
+        {"name": "Headshot Accuracy", "value": f"{stat.hs_accuracy}%", "inline": True}
+    ]
+
+def legacy_hack_fields(name, profile):
+    """Function | Legacy Hack Fields
+
+    The hand written fields of the `stat` view of a single hack.
+    """
+    stat = getattr(profile, name)
+    return [
+        {"name": "Kills", "value": stat.kills, "inline": True},
+        {"name": "Damage", "value": stat.damage, "inline": True},
+        {"name": "Fusions", "value": stat.fusions, "inline": True}
+    ]
+
+def legacy_command_permissions(ctx):
+    """Function | Legacy Command Permissions
+
+    The global permission check as it was before permissions were
+    compiled, reading a dict of hyphenated command names to lists of
+    role ID strings. Only finishes for commands at most one level deep.
+    """
+    # Administrators are always allowed to use the command.
+    if ctx.author.guild_permissions.administrator:
+        return True
+    else:
+        # Finding permission name scheme of a command.
+        name = ctx.command.name
+        if ctx.command.parent:
+            command = ctx.command
+            parent_exists = True
+            while parent_exists == True:
+                name = ctx.command.parent.name + '-' + name
+                command = ctx.command.parent
+                if not command.parent:
+                    parent_exists = False
+
+        if name in ctx.bot.permissions.keys():
+            for permission in ctx.bot.permissions[name]:
+                try:
+                    role = ctx.guild.get_role(int(permission))
+                    if role in ctx.author.roles:
+                        return True
+                except Exception as e:
+                    print(e)
+            return False
+        else:
+            return True
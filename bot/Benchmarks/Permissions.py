@@ -0,0 +1,88 @@
+"""Benchmark | Permissions
+
+Compares the cost of the global permission check per command with
+the compiled permission table against the legacy check, for the
+commands in 'Permissions.yml' and an unrestricted command, as a
+member with a number of roles but none of the allowed ones, and as
+a member who also has the first allowed role of each command, and
+checks that a user in a DM, without roles, is refused.
+
+The legacy check is given the permissions with their placeholders
+filled in, as intended, rather than the raw YAML it was given.
+Members, roles and guilds are stand-ins behaving like discord.py's:
+`Member.roles` looks up and sorts the member's roles on every read,
+and `guild_permissions` combines the permissions of every role.
+
+Run from the `bot` folder:
+python -m Benchmarks.Permissions [role count]
+"""
+import sys
+import timeit
+from types import SimpleNamespace
+
+from ruamel.yaml import YAML
+
+from Benchmarks.Legacy import legacy_command_permissions
+from Resources.Permissions import command_allowed, compile_permissions
+
+class Role:
+    def __init__(self, id, position, administrator = False):
+        self.id = id
+        self.position = position
+        self.administrator = administrator
+
+    def __lt__(self, other):
+        return self.position < other.position
+
+class Member:
+    def __init__(self, guild, role_ids):
+        self.guild = guild
+        self._roles = sorted(role_ids)
+
+    @property
+    def roles(self):
+        return sorted(self.guild.get_role(id) for id in self._roles)
+
+    @property
+    def guild_permissions(self):
+        return SimpleNamespace(administrator = any(role.administrator for role in self.roles))
+
+class Command:
+    def __init__(self, name, parent = None):
+        self.name = name
+        self.parent = parent
+        self.qualified_name = f"{parent.qualified_name} {name}" if parent else name
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with open("./Permissions.yml", 'r') as file:
+        permissions = YAML().load(file)
+    table = compile_permissions(permissions)
+    formatted = {name.replace(' ', '-'): [str(id) for id in ids] for name, ids in table.items()}
+
+    roles = {id: Role(id, position) for position, id in enumerate(range(1000, 1000 + count))}
+    for position, id in enumerate(sorted(set().union(*table.values())), count):
+        roles[id] = Role(id, position)
+    guild = SimpleNamespace(get_role = roles.get)
+
+    # Groups are listed before their commands, so each parent exists before its children.
+    commands = {}
+    for name in sorted(table) + ["search"]:
+        parent, space, part = name.rpartition(' ')
+        commands[name] = Command(part, commands.get(parent))
+
+    dm = SimpleNamespace(bot = SimpleNamespace(permissions = table), command = commands[next(iter(table))], guild = None, author = SimpleNamespace())
+    if command_allowed(dm):
+        print("A user in a DM was allowed a restricted command")
+
+    print(f"{'Command':<20}{'Member':<10}{'Legacy':>12}{'Compiled':>12}{'Speedup':>10}")
+    for name, command in commands.items():
+        allowed = sorted(table.get(name, ()))[:1]
+        for kind, member in (("denied", Member(guild, range(1000, 1000 + count))), ("allowed", Member(guild, list(range(1000, 1000 + count)) + allowed))):
+            legacy = SimpleNamespace(bot = SimpleNamespace(permissions = formatted), command = command, guild = guild, author = member)
+            compiled = SimpleNamespace(bot = SimpleNamespace(permissions = table), command = command, guild = guild, author = member)
+            if legacy_command_permissions(legacy) != command_allowed(compiled):
+                print(f"The checks disagree on {name}")
+            old = min(timeit.repeat(lambda: legacy_command_permissions(legacy), number = 10000, repeat = 3)) / 10000
+            new = min(timeit.repeat(lambda: command_allowed(compiled), number = 10000, repeat = 3)) / 10000
+            print(f"{name:<20}{kind:<10}{old * 1e6:>9.2f} us{new * 1e6:>9.2f} us{old / new:>9.1f}x")
@@ -0,0 +1,63 @@
+"""Benchmark | Profile Decode
+
+Compares how long decoding a response of the player endpoint takes
+with the Profile decoder built from the field table against the
+legacy hand written Profile constructor, on the recorded payloads.
+
+Also checks that both read the same stats from every payload, that
+partial payloads decode, and exits with an error if the decoder is
+slower than the legacy one.
+
+Run from the `bot` folder:
+python -m Benchmarks.ProfileDecode [rounds]
+"""
+import sys
+import timeit
+
+from Benchmarks.Legacy import LegacyProfile, recorded_payloads
+from Resources.APISession import Profile, WeaponStat, STATS, WEAPONS, HACKS
+
+def differences(payload):
+    """Function | Decode Differences
+
+    Returns the attributes which the two constructors read differently
+    from the payload. Stats missing from a payload are `None` for the
+    legacy Profile, but the field's default for the decoded one.
+    """
+    legacy, profile = LegacyProfile(payload), Profile(payload)
+    different = [attr for attr, key in STATS if getattr(legacy, attr) not in (getattr(profile, attr), None)]
+    for attr, name in WEAPONS + HACKS:
+        old, new = getattr(legacy, attr), getattr(profile, attr)
+        different += [f"{attr}.{stat}" for stat in WeaponStat.__slots__[1:] if getattr(old, stat) not in (getattr(new, stat), None)]
+    return different
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    payloads = recorded_payloads()
+
+    for payload in payloads:
+        different = differences(payload)
+        if different:
+            print(f"{payload['player']['p_name']} decoded differently: {', '.join(different)}")
+
+    print(f"{rounds} rounds of {len(payloads)} recorded payloads")
+    results = {}
+    for name, cls in (("Legacy", LegacyProfile), ("Decoder", Profile)):
+        elapsed = min(timeit.repeat(lambda: [cls(payload) for payload in payloads], number = rounds, repeat = 5))
+        results[name] = elapsed / (rounds * len(payloads))
+        print(f"{name:<10}{results[name] * 1e6:>10.2f} us per profile")
+
+    speedup = results['Legacy'] / results['Decoder']
+    print(f"{'Speedup':<10}{speedup:>10.2f}x")
+
+    # A response missing sections used to raise AttributeError.
+    partial = {"found": True, "player": payloads[0]["player"], "data": {"stats": payloads[0]["data"]["stats"]}}
+    profile = Profile(partial)
+    print(f"Partial payload decoded: {profile.player_name}, {profile.kills} kills, {profile.protocol.kills} Protocol V kills")
+
+    # A response without a player section used to leave no name for the profile's URL.
+    nameless = Profile({"found": True, "data": partial["data"]})
+    print(f"Payload without a player section decoded: {nameless.url}")
+
+    if speedup < 1:
+        sys.exit(f"The decoder is slower than the legacy constructor ({speedup:.2f}x).")
@@ -0,0 +1,48 @@
+"""Benchmark | Profile Memory
+
+Compares the memory use and pickled size of the slotted Profile
+against the legacy dict based Profile, for a large number of
+profiles built from the recorded payloads.
+
+Run from the `bot` folder:
+python -m Benchmarks.ProfileMemory [count]
+"""
+import gc
+import pickle
+import sys
+import time
+import tracemalloc
+
+from Benchmarks.Legacy import LegacyProfile, recorded_payloads
+from Resources.APISession import Profile
+
+def measure(cls, payloads, count):
+    """Function | Measure Profiles
+
+    Build `count` profiles of the class, then return the memory they
+    take, the size of their pickle and how long pickling took.
+    """
+    gc.collect()
+    tracemalloc.start()
+    profiles = [cls(payloads[i % len(payloads)]) for i in range(count)]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    data = pickle.dumps(profiles)
+    elapsed = time.perf_counter() - start
+    return memory, len(data), elapsed
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    payloads = recorded_payloads()
+
+    print(f"{count} profiles from {len(payloads)} recorded payloads")
+    print(f"{'':<10}{'Memory':>14}{'Pickle Size':>14}{'Pickle Time':>14}")
+    results = {}
+    for name, cls in (("Legacy", LegacyProfile), ("Slotted", Profile)):
+        memory, size, elapsed = results[name] = measure(cls, payloads, count)
+        print(f"{name:<10}{memory / 1024:>11.0f} KB{size / 1024:>11.0f} KB{elapsed * 1000:>11.1f} ms")
+
+    legacy, slotted = results["Legacy"], results["Slotted"]
+    print(f"{'Ratio':<10}{legacy[0] / slotted[0]:>13.1f}x{legacy[1] / slotted[1]:>13.1f}x{legacy[2] / slotted[2]:>13.1f}x")
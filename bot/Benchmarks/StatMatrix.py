@@ -0,0 +1,105 @@
+"""Benchmark | Stat Matrix
+
+Compares server-wide analytics computed by iterating Profile objects
+against the same analytics computed over the StatMatrix, for growing
+numbers of profiles built from the recorded payloads with their stats
+scaled randomly, so that profiles differ.
+
+The analytics are the average kills, the weapon with the most kills,
+and the top 10 KD of profiles with at least 10 matches. Also times
+updating a single profile's row in place, and checks that both ways
+give the same answers.
+
+Run from the `bot` folder:
+python -m Benchmarks.StatMatrix [largest count]
+"""
+import random
+import sys
+import time
+
+from Benchmarks.Legacy import recorded_payloads
+from Resources.APISession import Profile
+from Resources.Fields import WEAPONS
+from Resources.Leaderboard import score
+from Resources.StatMatrix import StatMatrix, WEAPON_KILLS
+
+def scaled_profiles(payloads, count):
+    """Function | Scaled Profiles
+
+    Build `count` profiles from the payloads, with every integer
+    stat and the KD multiplied by a random factor.
+    """
+    profiles = {}
+    for i in range(count):
+        payload = payloads[i % len(payloads)]
+        factor = random.uniform(0.1, 3)
+        stats = {
+            key: int(value * factor) if isinstance(value, int) else value
+            for key, value in payload["data"]["stats"].items()
+        }
+        stats["kd"] = f"{(score(stats.get('kd')) or 1) * factor:.2f}"
+        weapons = {
+            name: {key: int(value * random.uniform(0.1, 3)) if isinstance(value, int) else value for key, value in weapon.items()}
+            for name, weapon in payload["data"]["weapons"].items()
+        }
+        profiles[f"player{i}"] = Profile(dict(payload, data = dict(payload["data"], stats = stats, weapons = weapons)))
+    return profiles
+
+def iterate(profiles):
+    """Function | Analytics By Iteration
+
+    Returns the average kills, the weapon with the most kills and the top
+    10 KD of profiles with 10 or more matches, reading each Profile.
+    """
+    kills = [profile.kills for profile in profiles.values() if profile.kills is not None]
+    average = sum(kills) / len(kills)
+    totals = {attr: sum(getattr(profile, attr).kills or 0 for profile in profiles.values()) for attr, name in WEAPONS}
+    weapon = max(totals, key = totals.get)
+    eligible = [(key, score(profile.kd)) for key, profile in profiles.items() if (profile.matches or 0) >= 10]
+    top = sorted(eligible, key = lambda entry: -entry[1])[:10]
+    return average, weapon, top
+
+def vectorized(matrix):
+    """Function | Analytics By Matrix
+
+    Returns the same analytics as `iterate`, computed over the StatMatrix.
+    """
+    average = matrix.mean('kills')
+    weapon, total = matrix.best(WEAPON_KILLS)
+    top = matrix.top('kd', 10, matrix.mask(minimums = {'matches': 10}))
+    return average, weapon, top
+
+def timed(func, *args, repeat = 5):
+    """Returns the result of a function, and its fastest time of `repeat` calls."""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+if __name__ == "__main__":
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payloads = recorded_payloads()
+    random.seed(0)
+
+    print(f"{'Profiles':<10}{'Iterate':>12}{'Matrix':>12}{'Speedup':>10}{'Build':>12}{'Update':>12}")
+    count = 1000
+    while count <= largest:
+        profiles = scaled_profiles(payloads, count)
+        matrix = StatMatrix()
+        start = time.perf_counter()
+        matrix.rebuild(profiles.items())
+        build = time.perf_counter() - start
+
+        expected, iterated = timed(iterate, profiles)
+        result, computed = timed(vectorized, matrix)
+        if abs(expected[0] - result[0]) > 1e-6 or expected[1] != result[1] or [value for key, value in expected[2]] != [value for key, value in result[2]]:
+            print(f"Analytics differ for {count} profiles: {expected} != {result}")
+
+        key, profile = next(iter(profiles.items()))
+        update = timed(matrix.update, key, profile, repeat = 100)[1]
+
+        print(f"{count:<10}{iterated * 1000:>9.2f} ms{computed * 1000:>9.2f} ms{iterated / computed:>9.1f}x{build * 1000:>9.0f} ms{update * 1e6:>9.1f} us")
+        count *= 10
@@ -0,0 +1,46 @@
+"""Benchmark | Stat Views
+
+Compares how long building the embed fields of every `stat` view
+takes with the views compiled from specs against the legacy hand
+written field lists, on profiles decoded from the recorded payloads.
+
+Also checks that both build the same fields for every view.
+
+Run from the `bot` folder:
+python -m Benchmarks.StatViews [rounds]
+"""
+import sys
+import timeit
+
+from Benchmarks.Legacy import legacy_hack_fields, legacy_stat_category_fields, legacy_weapon_fields, recorded_payloads
+from Resources.APISession import Profile
+from Resources.Enums import HackStat, StatCategory, WeaponStat
+from Resources.Views import VIEWS, render_fields
+
+# The legacy function building the fields of each kind of view.
+LEGACY = {StatCategory: legacy_stat_category_fields, WeaponStat: legacy_weapon_fields, HackStat: legacy_hack_fields}
+
+def legacy(category, profile):
+    """Returns the fields of a view built the legacy way."""
+    return LEGACY[type(category)](category.name, profile)
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    profiles = [Profile(payload) for payload in recorded_payloads()]
+    views = list(VIEWS)
+
+    different = [
+        (profile.player_name, category.name) for profile in profiles for category in views
+        if legacy(category, profile) != render_fields(VIEWS[category], profile)
+    ]
+    for name, view in different:
+        print(f"Fields differ for the {view} view of {name}")
+
+    print(f"{'View':<12}{'Legacy':>12}{'Compiled':>12}{'Speedup':>10}")
+    for group in (list(StatCategory), list(WeaponStat), list(HackStat)):
+        for category in group:
+            view = VIEWS[category]
+            old = min(timeit.repeat(lambda: [legacy(category, profile) for profile in profiles], number = rounds, repeat = 3))
+            new = min(timeit.repeat(lambda: [render_fields(view, profile) for profile in profiles], number = rounds, repeat = 3))
+            calls = rounds * len(profiles)
+            print(f"{category.name:<12}{old / calls * 1e6:>9.2f} us{new / calls * 1e6:>9.2f} us{old / new:>9.1f}x")
@@ -0,0 +1,156 @@
+import discord
+from discord.ext import commands
+import datetime
+
+"""Cog | Diagnostics
+
+This Cog provides commands for checking on how the bot is
+talking to the Hyper Scape API, so the effect of caching
+and request coalescing can be seen while the bot is running.
+
+NOTE: All commands are restricted to server use only by default,
+remove the `@commands.guild_only()` line before any command that
+should also be able to be used in a DM.
+"""
+class Diagnostics(commands.Cog, name = "Diagnostics"):
+    """
+    Commands for checking on the bot's use of the Hyper Scape API.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        print(f"{self.bot.OK} {self.bot.TIMELOG()} Loaded Diagnostics Cog.")
+
+    @commands.guild_only()
+    @commands.group(name = "diagnostics", aliases = ['diag'], help = "Commands for checking on the bot's use of the API.", invoke_without_command = True, case_insensitive = True)
+    async def diagnostics(self, ctx):
+        """Command | Diagnostics
+
+        Lists the available diagnostics subcommands.
+        """
+        embed = self.bot.embed_util.get_embed(
+            title = "Diagnostics",
+            desc = "\n".join(f"`{self.bot.prefix}{command.qualified_name}` - {command.help}" for command in self.diagnostics.commands),
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+    @commands.guild_only()
+    @diagnostics.command(name = "api", help = "Shows the state of the API circuit breaker, and how requests were coalesced and rate limited.")
+    async def diagnostics_api(self, ctx):
+        """Command | API Diagnostics
+
+        Shows, for each kind of API request, how many were made and
+        how many of them were coalesced into a request already in flight.
+        Also shows the queue of each rate limiter lane, how long requests
+        waited in it, how many requests failed or were hedged, how many
+        profile refreshes finished in time, the adaptive concurrency
+        limit and its recent changes, and the circuit breaker state.
+        """
+        fields = []
+        for title, stats in (("Profile Lookups", self.bot.data_manager.inflight.stats()), ("API Requests", self.bot.api.inflight.stats())):
+            fields.append({
+                "name": title,
+                "value": "\n".join(f"`{kind}`: {counts['calls']} calls, {counts['coalesced']} coalesced" for kind, counts in stats.items()) or "No requests yet.",
+                "inline": False
+            })
+
+        fields.append({
+            "name": "Rate Limiter",
+            "value": "\n".join(
+                f"`{lane}`: {stats['queued']} queued, {stats['granted']} sent, {stats['rejected']} rejected, "
+                f"{stats['average wait']:.2f}s average wait, {stats['longest wait']:.2f}s longest"
+                for lane, stats in self.bot.api.limiter.stats().items()
+            ),
+            "inline": False
+        })
+
+        fields.append({
+            "name": "Upstream Requests",
+            "value": "\n".join(
+                f"`{kind}`: {stats['attempts']} sent, {stats['failures']} failed, "
+                f"{stats['hedges']} hedged ({stats['hedge wins']} won)"
+                + (f", hedging after {stats['hedge delay']:.2f}s" if stats['hedge delay'] is not None else "")
+                for kind, stats in self.bot.api.stats().items()
+            ) or "No requests yet.",
+            "inline": False
+        })
+
+        refreshes = self.bot.api.refreshes
+        fields.append({
+            "name": "Profile Refreshes",
+            "value": f"Updated: {refreshes['updated']}, Timed Out: {refreshes['timed out']}",
+            "inline": False
+        })
+
+        history = self.bot.data_manager.history.stats()
+        fields.append({
+            "name": "Profile History",
+            "value": f"Recorded: {history['recorded']}, Already Stored: {history['skipped']}, Downsampled: {history['dropped']}",
+            "inline": False
+        })
+
+        concurrency = self.bot.api.concurrency.stats()
+        history = " → ".join(str(limit) for changed, limit in list(self.bot.api.concurrency.history)[-15:])
+        fields.append({
+            "name": "Concurrency Limit",
+            "value": (
+                f"Limit: {concurrency['limit']} ({concurrency['in flight']} in flight, {concurrency['waiting']} waiting)\n"
+                f"Last Window: {concurrency['latency']:.2f}s average latency, {concurrency['error rate']:.0%} errors\n"
+                f"Increases: {concurrency['increases']}, Decreases: {concurrency['decreases']}\n"
+                f"History: {history}"
+            ),
+            "inline": False
+        })
+
+        breaker = self.bot.api.breaker.stats()
+        fields.append({
+            "name": "Circuit Breaker",
+            "value": (
+                f"State: `{breaker['state']}`"
+                + (f" (retrying in {breaker['retry in']:.0f}s)" if 'retry in' in breaker else "")
+                + f"\nFailures In A Row: {breaker['failures']}\nTrips: {breaker['trips']}\nRefused: {breaker['refused']}"
+            ),
+            "inline": False
+        })
+
+        embed = self.bot.embed_util.get_embed(
+            title = "API Diagnostics",
+            fields = fields,
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+    @commands.guild_only()
+    @diagnostics.command(name = "cache", help = "Shows profile, player ID, negative cache, leaderboard and render cache statistics.")
+    async def diagnostics_cache(self, ctx):
+        """Command | Cache Diagnostics
+
+        Shows the hit, miss and eviction counts of the profile cache and
+        the player ID cache, as well as how many entries each holds, and
+        how often the negative cache answered for names that were not found.
+        Also shows how many profiles the leaderboards rank, how many
+        entries their updates moved, the size of the stat matrix, and
+        how much rendering the render cache saved.
+        """
+        users = self.bot.data['HyperscapeUsers']
+        fields = []
+        for title, cache in (("Profile Cache", users['profiles']), ("Player ID Cache", users['ids']), ("Negative Cache", self.bot.data_manager.not_found), ("Leaderboards", self.bot.data_manager.leaderboards), ("Guild Leaderboards", self.bot.data_manager.guild_leaderboards), ("Stat Matrix", self.bot.data_manager.stat_matrix), ("Render Cache", self.bot.embed_util.renders)):
+            fields.append({
+                "name": title,
+                "value": "\n".join(f"{name.capitalize()}: {value}" for name, value in cache.stats().items()),
+                "inline": False
+            })
+
+        embed = self.bot.embed_util.get_embed(
+            title = "Cache Diagnostics",
+            fields = fields,
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+def setup(bot):
+    """Setup
+
+    The function called by Discord.py when adding another file in a multi-file project.
+    """
+    bot.add_cog(Diagnostics(bot))
@@ -2,6 +2,8 @@ import discord
 from discord.ext import commands
 import datetime
 
+from Resources.APISession import APIError
+
 """Cog | Error Handler
 
 This cog handles all errors for the bot, preventing
@@ -128,6 +130,16 @@ class Errors(commands.Cog, name = "Error Handling"):
             )
             await self.bot.log_channel.send(embed = embed)
 
+        elif isinstance(error, commands.CommandInvokeError) and isinstance(error.original, APIError):
+            self.print_log(type = self.bot.WARN, message = "Hyper Scape API request failed", err = error.original, ctx = ctx)
+
+            embed = self.bot.embed_util.get_embed(
+                title = "Hyper Scape API Unavailable",
+                desc = str(error.original),
+                author = ctx.author
+            )
+            await ctx.send(embed = embed)
+
         else:
             embed = self.bot.embed_util.get_embed(
                 title = "Command Failed",
@@ -0,0 +1,204 @@
+import discord
+from discord.ext import commands, tasks
+import datetime
+import re
+import time
+
+from Resources.Query import QueryError, resolve_column
+from Resources.StatMatrix import COLUMN_INDEX, COLUMN_LABELS
+
+"""Cog | Hyper Scape History
+
+This cog is put in place to show how the stats of linked profiles
+changed over time, from the snapshots kept by the history store,
+and to regularly downsample old snapshots.
+
+NOTE: All commands are restricted to server use only by default,
+remove the `@commands.guild_only()` line before any command that
+should also be able to be used in a DM.
+"""
+
+# Seconds in each named period, and in each unit of a period like `7d`.
+PERIODS = {'day': 86400, 'week': 604800, 'month': 2592000, 'year': 31536000}
+PERIOD_UNITS = {'h': 3600, 'd': 86400, 'w': 604800, 'm': 2592000}
+
+def format_value(value):
+    """Returns a stat value as shown in history, with decimals only if it has them."""
+    return f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+
+class HyperscapeHistory(commands.Cog, name = "HyperscapeHistory"):
+    """
+    This Cog shows the progress of linked profiles over time,
+    and compacts their history regularly.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.history_compact.start()
+        print(f"{self.bot.OK} {self.bot.TIMELOG()} Loaded Hyperscape History Cog")
+
+    def cog_unload(self):
+        self.history_compact.cancel()
+        print(f"{self.bot.OK} {self.bot.TIMELOG()} Unloaded Hyperscape History Cog")
+
+    def parse_period(self, period):
+        """Function | Parse Period
+
+        Returns the number of seconds in a period, either named, e.g.
+        `week`, or a count of hours, days, weeks or months, e.g. `7d`.
+        Returns `None` if the period is not valid.
+        """
+        period = period.lower()
+        if period in PERIODS:
+            return PERIODS[period]
+        match = re.fullmatch(r"(\d+)\s*([hdwm])", period)
+        if match:
+            return int(match.group(1)) * PERIOD_UNITS[match.group(2)]
+        return None
+
+    async def get_linked_profile(self, ctx, user):
+        """Function | Get Linked Profile
+
+        Returns the cached profile linked to a Discord user, replying
+        and returning `None` if they have none.
+        """
+        name = self.bot.data['HyperscapeUsers']['discords'].get(user.id)
+        profile = self.bot.data['HyperscapeUsers']['profiles'].peek(name.lower()) if name else None
+        if not (profile and profile.found):
+            embed = self.bot.embed_util.get_embed(
+                title = "No Profile Registered",
+                desc = f"There are no stat profiles linked for {user.mention},\n but they can use `{self.bot.prefix}profile link Username` to get started."
+            )
+            await ctx.send(embed = embed)
+            return None
+        return profile
+
+    async def get_column(self, ctx, stat):
+        """Function | Get Column
+
+        Returns the stat matrix column of a stat, replying and
+        returning `None` if it is not a stat.
+        """
+        try:
+            return resolve_column(stat)
+        except QueryError as e:
+            embed = self.bot.embed_util.get_embed(
+                title = "Stat Not Found",
+                desc = f"{e}\n\nStats of a weapon or hack are given as `protocol.kills`.",
+                author = ctx.author
+            )
+            await ctx.send(embed = embed)
+            return None
+
+    @commands.guild_only()
+    @commands.command(name = "progress", aliases = ['prog'], help = "Shows how much a user's linked profile has gained in a stat over a period.\nThe period can be `day`, `week`, `month`, `year` or a count like `7d`, `24h` or `2w`.", brief = "kills week @User")
+    async def progress(self, ctx, stat, period = "week", user: discord.User = None):
+        """Command | Progress
+
+        Shows the change of a stat of a linked profile between the
+        snapshot at the start of a period and the latest snapshot.
+
+        Args
+        ----------
+        stat - The stat to show, see `top`.
+        period - How far back to compare against.
+        user - A discord.User class instance if given,
+            set to the message author it not given
+        """
+        column = await self.get_column(ctx, stat)
+        if column is None:
+            return
+        seconds = self.parse_period(period)
+        if seconds is None:
+            embed = self.bot.embed_util.get_embed(
+                title = "Invalid Period",
+                desc = "The period can be `day`, `week`, `month`, `year` or a count like `7d`, `24h` or `2w`.",
+                author = ctx.author
+            )
+            await ctx.send(embed = embed)
+            return
+
+        if not user:
+            user = ctx.author
+        profile = await self.get_linked_profile(ctx, user)
+        if profile is None:
+            return
+
+        history = self.bot.data_manager.history
+        start = await history.at(profile.player_id, time.time() - seconds)
+        snapshots = await history.recent(profile.player_id, 1)
+        index = COLUMN_INDEX[column]
+        if start is None or not snapshots or start[0] == snapshots[-1][0]:
+            desc = f"There is not enough history of {profile.player_name} yet, it is recorded each time the profile refreshes."
+        else:
+            (started, first), (ended, last) = start, snapshots[-1]
+            change = last[index] - first[index]
+            desc = (
+                f"**{COLUMN_LABELS[column]}:** {format_value(first[index])} → {format_value(last[index])} "
+                f"({'+' if change >= 0 else ''}{format_value(change)})\n"
+                f"From {datetime.datetime.utcfromtimestamp(started):%Y-%m-%d %H:%M} to {datetime.datetime.utcfromtimestamp(ended):%Y-%m-%d %H:%M} UTC"
+            )
+
+        embed = self.bot.embed_util.get_embed(
+            title = f"{profile.player_name} {COLUMN_LABELS[column]} Progress",
+            desc = desc,
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+    @commands.guild_only()
+    @commands.command(name = "history", help = "Shows the last recorded values of a stat of a user's linked profile.", brief = "kills @User")
+    async def history(self, ctx, stat = "kills", user: discord.User = None):
+        """Command | History
+
+        Shows the last 10 snapshots of a stat of a linked profile,
+        with the change since the snapshot before each.
+
+        Args
+        ----------
+        stat - The stat to show, see `top`.
+        user - A discord.User class instance if given,
+            set to the message author it not given
+        """
+        column = await self.get_column(ctx, stat)
+        if column is None:
+            return
+        if not user:
+            user = ctx.author
+        profile = await self.get_linked_profile(ctx, user)
+        if profile is None:
+            return
+
+        index = COLUMN_INDEX[column]
+        lines = []
+        previous = None
+        # One more than shown, so the first line shown has a change as well.
+        for taken_at, values in await self.bot.data_manager.history.recent(profile.player_id, 11):
+            if previous is not None:
+                change = values[index] - previous
+                lines.append(
+                    f"`{datetime.datetime.utcfromtimestamp(taken_at):%Y-%m-%d %H:%M}` "
+                    f"{format_value(values[index])} ({'+' if change >= 0 else ''}{format_value(change)})"
+                )
+            previous = values[index]
+
+        embed = self.bot.embed_util.get_embed(
+            title = f"{profile.player_name} {COLUMN_LABELS[column]} History",
+            desc = "\n".join(lines[-10:]) or f"There is not enough history of {profile.player_name} yet, it is recorded each time the profile refreshes.",
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+    @tasks.loop(hours = 1)
+    async def history_compact(self):
+        await self.bot.data_manager.history.compact()
+
+    @history_compact.before_loop
+    async def before_history_compact(self):
+        await self.bot.wait_until_ready()
+
+def setup(bot):
+    """Setup
+
+    The function called by Discord.py when adding another file in a multi-file project.
+    """
+    bot.add_cog(HyperscapeHistory(bot))
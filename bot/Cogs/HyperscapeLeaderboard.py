@@ -2,6 +2,13 @@ import discord
 from discord.ext import commands, tasks
 import datetime
 
+from Resources.Aliases import BOARD_ARGUMENTS, did_you_mean
+from Resources.Enums import Stat, WeaponStat, HackStat
+from Resources.Fields import HACKS, WEAPONS
+from Resources.Leaderboard import BOARDS, BOARD_LABELS
+from Resources.Query import QueryCompiler, QueryError
+from Resources.StatMatrix import HACK_KILLS, WEAPON_KILLS
+
 """Cog | Hyper Scape Leaderboards
 
 This cog is put in place to manage and update the server leaderboards,
@@ -18,27 +25,300 @@ class HyperscapeLeaderboard(commands.Cog, name = "HyperscapeLeaderboard"):
     """
     def __init__(self, bot):
         self.bot = bot
+        self.queries = QueryCompiler()
         if not 'HyperscapeLeaderboard' in self.bot.data.keys():
             self.bot.data['HyperscapeLeaderboard'] = {}
         self.leaderboard_update.start()
         print(f"{self.bot.OK} {self.bot.TIMELOG()} Loaded Hyperscape Leaderboard Cog")
 
-    def cog_unload():
+    def cog_unload(self):
         self.leaderboard_update.cancel()
         print(f"{self.bot.OK} {self.bot.TIMELOG()} Unloaded Hyperscape Leaderboard Cog")
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Listener | Index Guilds
+
+        Index the linked members of every guild once the guilds are
+        chunked, so each guild's leaderboards can be built.
+        """
+        for guild in self.bot.guilds:
+            if not guild.chunked:
+                await guild.chunk()
+            self.bot.data_manager.index_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        if not guild.chunked:
+            await guild.chunk()
+        self.bot.data_manager.index_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.bot.data_manager.guild_leaderboards.remove_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.bot.data_manager.add_guild_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.bot.data_manager.guild_leaderboards.remove_member(member.guild.id, member.id)
+
+    def get_board(self, stat):
+        """Function | Find Board
+
+        Returns the name of the board for a stat, weapon or hack
+        searched for, or `None` if there is none.
+        """
+        member = BOARD_ARGUMENTS.get(stat)
+        return member.name if member else None
+
+    async def send_board_not_found(self, ctx, stat):
+        """Function | Board Not Found
+
+        Reply with the boards closest to the stat searched for,
+        and every stat, weapon and hack which can be ranked.
+        """
+        embed = self.bot.embed_util.get_embed(
+            title = "Leaderboard Not Found",
+            desc = f"{did_you_mean(BOARD_ARGUMENTS.suggest(stat))}\nPlease view valid leaderboard inputs below.".lstrip(),
+            fields = [
+                {
+                    "name": "Individual Stats",
+                    "value": "\n".join(f"`{i}`" for i in list(Stat.__dict__['_member_map_'])),
+                    "inline": True
+                },
+                {
+                    "name": "Weapon Kills",
+                    "value": "\n".join(f"`{i}`" for i in list(WeaponStat.__dict__['_member_map_'])),
+                    "inline": True
+                },
+                {
+                    "name": "Hack Kills",
+                    "value": "\n".join(f"`{i}`" for i in list(HackStat.__dict__['_member_map_'])),
+                    "inline": True
+                }
+            ]
+        )
+        await ctx.send(embed = embed)
+
     @commands.guild_only()
-    @commands.command(name = "SAMPLE", help = "Just a placeholder.", brief = "If parameters then examples here")
-    async def sample(self, ctx):
-        """Command | Sample
+    @commands.command(name = "leaderboard", aliases = ['lb'], help = "Shows the linked profiles in this server with the highest stat, or the most kills with a weapon or hack.\nAdd `global` to rank every linked profile.", brief = "kills global")
+    async def leaderboard(self, ctx, stat = "kills", scope = "server"):
+        """Command | Leaderboard
 
-        This is a template for a standard command.
+        Shows the top 10 linked profiles on a leaderboard, and the
+        rank of the command author's linked profile.
+
+        Args
+        ----------
+        stat - The stat to rank by, found in the Stat enum, or a weapon
+            or hack from the WeaponStat and HackStat enums to rank by its kills.
+        scope - `server` to rank the members of this server, or `global`
+            to rank every linked profile.
         """
-        pass
+        board = self.get_board(stat)
+        if board is None:
+            await self.send_board_not_found(ctx, stat)
+            return
+
+        if scope.lower() == "global":
+            leaderboards = self.bot.data_manager.leaderboards
+            title = f"Global {BOARD_LABELS[board]} Leaderboard"
+        else:
+            leaderboards = self.bot.data_manager.guild_leaderboards.get(ctx.guild.id)
+            title = f"{ctx.guild.name} {BOARD_LABELS[board]} Leaderboard"
+        if leaderboards is None:
+            embed = self.bot.embed_util.get_embed(
+                title = title,
+                desc = f"No members of this server have linked a profile yet, they can use `{self.bot.prefix}profile link Username` to get started."
+            )
+            await ctx.send(embed = embed)
+            return
+
+        profiles = self.bot.data['HyperscapeUsers']['profiles']
+        lines = []
+        for rank, key, score in leaderboards.top(board, 10):
+            profile = profiles.peek(key)
+            if profile:
+                lines.append(f"**{rank}.** {profile.player_name} - {BOARDS[board](profile)}")
+            else:
+                lines.append(f"**{rank}.** {key} - {score}")
+
+        name = self.bot.data['HyperscapeUsers']['discords'].get(ctx.author.id)
+        rank = leaderboards.rank(board, name.lower()) if name else None
+        fields = []
+        if rank:
+            fields.append({
+                "name": "Your Rank",
+                "value": f"{rank} of {leaderboards.size(board)}",
+                "inline": False
+            })
+
+        embed = self.bot.embed_util.get_embed(
+            title = title,
+            desc = "\n".join(lines) or "No linked profiles are ranked yet.",
+            fields = fields,
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+    @commands.guild_only()
+    @commands.command(name = "rank", help = "Shows where a user's linked profile ranks on a stat, in this server and globally.", brief = "kills @User")
+    async def rank(self, ctx, stat, user: discord.User = None):
+        """Command | Rank
+
+        Shows the rank and percentile of a linked profile on a
+        leaderboard, among the members of this server and globally.
+
+        Args
+        ----------
+        stat - The stat to rank by, see `leaderboard`.
+        user - A discord.User class instance if given,
+            set to the message author it not given
+        """
+        board = self.get_board(stat)
+        if board is None:
+            await self.send_board_not_found(ctx, stat)
+            return
+
+        if not user:
+            user = ctx.author
+
+        name = self.bot.data['HyperscapeUsers']['discords'].get(user.id)
+        if not name:
+            embed = self.bot.embed_util.get_embed(
+                title = "No Profile Registered",
+                desc = f"There are no stat profiles linked for {user.mention},\n but they can use `{self.bot.prefix}profile link Username` to get started."
+            )
+            await ctx.send(embed = embed)
+            return
+
+        key = name.lower()
+        fields = []
+        for title, leaderboards in (("Server Rank", self.bot.data_manager.guild_leaderboards.get(ctx.guild.id)), ("Global Rank", self.bot.data_manager.leaderboards)):
+            rank = leaderboards.rank(board, key) if leaderboards else None
+            fields.append({
+                "name": title,
+                "value": f"{rank} of {leaderboards.size(board)}\nPercentile: {leaderboards.percentile(board, key):.0f}" if rank else "Not ranked",
+                "inline": True
+            })
+
+        profile = self.bot.data['HyperscapeUsers']['profiles'].peek(key)
+        embed = self.bot.embed_util.get_embed(
+            title = f"{name} {BOARD_LABELS[board]} Rank",
+            desc = f"{BOARD_LABELS[board]}: {BOARDS[board](profile)}" if profile else None,
+            fields = fields,
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+    @commands.guild_only()
+    @commands.command(name = "serverstats", aliases = ['ss'], help = "Shows the average stats, favourite weapon and hack and best KD of the linked profiles in this server.", brief = "10")
+    async def serverstats(self, ctx, min_matches: int = 10):
+        """Command | Server Stats
+
+        Shows aggregates over the linked profiles of the members of this
+        server, computed from the stat matrix.
+
+        Args
+        ----------
+        min_matches - The fewest matches a profile needs to count for the best KD.
+        """
+        matrix = self.bot.data_manager.stat_matrix
+        members = matrix.select(self.bot.data_manager.guild_keys(ctx.guild.id))
+        if not members.any():
+            embed = self.bot.embed_util.get_embed(
+                title = f"{ctx.guild.name} Stats",
+                desc = f"No members of this server have linked a profile yet, they can use `{self.bot.prefix}profile link Username` to get started."
+            )
+            await ctx.send(embed = embed)
+            return
+
+        weapon, weapon_kills = matrix.best(WEAPON_KILLS, members)
+        hack, hack_kills = matrix.best(HACK_KILLS, members)
+        best_kd = matrix.top('kd', 1, matrix.mask(members, {'matches': min_matches}))
+        profiles = self.bot.data['HyperscapeUsers']['profiles']
+
+        fields = []
+        for column, label in (("kills", "Average Kills"), ("wins", "Average Wins"), ("kd", "Average KD"), ("damage_done", "Average Damage Done"), ("matches", "Average Matches"), ("revives", "Average Revives")):
+            mean = matrix.mean(column, members)
+            fields.append({
+                "name": label,
+                "value": f"{mean:,.2f}" if mean is not None else "No stats yet",
+                "inline": True
+            })
+        fields.append({
+            "name": "Favourite Weapon",
+            "value": f"{dict(WEAPONS)[weapon]} ({weapon_kills:,.0f} kills)",
+            "inline": True
+        })
+        fields.append({
+            "name": "Favourite Hack",
+            "value": f"{dict(HACKS)[hack]} ({hack_kills:,.0f} kills)",
+            "inline": True
+        })
+        if best_kd:
+            key, kd = best_kd[0]
+            profile = profiles.peek(key)
+            fields.append({
+                "name": f"Best KD ({min_matches}+ Matches)",
+                "value": f"{profile.player_name if profile else key} ({kd:.2f})",
+                "inline": True
+            })
+
+        embed = self.bot.embed_util.get_embed(
+            title = f"{ctx.guild.name} Stats",
+            desc = f"Across {int(members.sum())} linked profiles.",
+            fields = fields,
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
+
+    @commands.guild_only()
+    @commands.command(name = "top", help = "Lists linked profiles sorted by a stat, filtered by other stats or platform.\nStats of a weapon or hack are given as `protocol.kills`.\nAdd `limit N` to list more, `asc` to list the lowest first and `global` to include every linked profile.", brief = "kd where matches > 100 platform=pc limit 10")
+    async def top(self, ctx, *, query):
+        """Command | Top Query
+
+        Lists the linked profiles matching a query, sorted by a stat.
+        Queries are compiled once and cached, then run as vectorized
+        masks and a partial sort over the stat matrix, see './Resources/Query.py'.
+
+        Args
+        ----------
+        query - The query, e.g. `kd where matches > 100 limit 10`.
+        """
+        try:
+            compiled = self.queries.compile(query)
+        except QueryError as e:
+            embed = self.bot.embed_util.get_embed(
+                title = "Invalid Query",
+                desc = f"{e}\n\nFor example: `{self.bot.prefix}top kd where matches > 100 limit 10`",
+                author = ctx.author
+            )
+            await ctx.send(embed = embed)
+            return
+
+        matrix = self.bot.data_manager.stat_matrix
+        where = None if compiled.scope == "global" else matrix.select(self.bot.data_manager.guild_keys(ctx.guild.id))
+        profiles = self.bot.data['HyperscapeUsers']['profiles']
+        lines = []
+        for rank, (key, value) in enumerate(compiled.run(matrix, where), 1):
+            profile = profiles.peek(key)
+            value = f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+            lines.append(f"**{rank}.** {profile.player_name if profile else key} - {value}")
+
+        embed = self.bot.embed_util.get_embed(
+            title = f"Top: {' '.join(query.split())}",
+            desc = "\n".join(lines) or "No linked profiles match the query.",
+            author = ctx.author
+        )
+        await ctx.send(embed = embed)
 
     @tasks.loop(minutes = 2)
     async def leaderboard_update(self):
-        self.bot.data_manager.update_leaderboards()
+        await self.bot.data_manager.update_leaderboards()
 
     @leaderboard_update.before_loop
     async def before_leaderboard_update(self):
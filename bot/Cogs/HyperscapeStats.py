@@ -5,7 +5,10 @@ import discord
 from discord.ext import commands
 import datetime
 
+from Resources.Aliases import STAT_ARGUMENTS, did_you_mean
 from Resources.Enums import StatCategory, WeaponStat, HackStat, Stat, Platforms
+from Resources.Fields import STAT_LABELS
+from Resources.Views import MAIN_VIEW, VIEWS, render_fields
 
 """Cog | Hyperscape Stats
 
@@ -22,9 +25,6 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
     """
     def __init__(self, bot):
         self.bot = bot
-        if not 'HyperscapeUsers' in self.bot.data.keys():
-            self.bot.data['HyperscapeUsers'] = {"profiles":{}, "discords": {}}
-            self.bot.data_manager.save_data()
         print(f"{self.bot.OK} {self.bot.TIMELOG()} Loaded Hyperscape Stats Cog.")
 
     def cog_unload():
@@ -54,78 +54,22 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
         if user.id in self.bot.data['HyperscapeUsers']['discords']:
             # Get the cached profile information
             prof_name = self.bot.data['HyperscapeUsers']['discords'][user.id].lower()
-            profile = self.bot.data['HyperscapeUsers']['profiles'][prof_name]
-            updated = await self.bot.data_manager.update_user_cache(prof_name, profile.platform)
-            if not updated:
+            platform = self.bot.data['HyperscapeUsers']['profiles'][prof_name].platform
+            profile, refresh = await self.bot.data_manager.get_user_profile(prof_name, platform, "profile")
+            if not profile:
                 embed = self.bot.embed_util.get_embed(
                     title = "Failed to Find User",
-                    desc = f"User `{prof_name}` was not able to be found on the `{profile.platform}` platform, please try again."
+                    desc = f"User `{prof_name}` was not able to be found on the `{platform}` platform, please try again."
                 )
                 await ctx.send(embed = embed)
                 return
-            else:
-                profile = self.bot.data['HyperscapeUsers']['profiles'][prof_name]
 
             # Create a response showing basic user stats
-            embed = self.bot.embed_util.get_embed(
-                author_url = profile.url,
-                title = f"{profile.player_name}'s Stats Profile",
-                thumbnail = profile.avatar_url,
-                desc = f"*For more information on specific stats, use `{self.bot.prefix}stats`*",
-                fields = [
-                    {
-                        "name": "Kills",
-                        "value": profile.kills,
-                        "inline": True
-                    },
-                    {
-                        "name": "Assists",
-                        "value": profile.assists,
-                        "inline": True
-                    },
-                    {
-                        "name": "KD",
-                        "value": profile.kd,
-                        "inline": True
-                    },
-                    {
-                        "name": "Wins",
-                        "value": profile.wins,
-                        "inline": True
-                    },
-                    {
-                        "name": "Losses",
-                        "value": profile.losses,
-                        "inline": True
-                    },
-                    {
-                        "name": "Winrate",
-                        "value": profile.winrate,
-                        "inline": True
-                    },
-                    {
-                        "name": "Crown Wins",
-                        "value": profile.crown_wins,
-                        "inline": True
-                    },
-                    {
-                        "name": "Crown Pickups",
-                        "value": profile.crown_pickups,
-                        "inline": True
-                    },
-                    {
-                        "name": "Crown Success",
-                        "value": profile.crown_pickup_success_rate,
-                        "inline": True
-                    }
-                ]
-            )
-            embed.set_author(
-                name = user.name,
-                icon_url = user.avatar_url,
-                url = profile.avatar_url
-            )
-            await ctx.send(embed = embed)
+            build = lambda profile: self.get_profile_embed(user, profile)
+            embed = build(profile)
+            msg = await ctx.send(embed = embed)
+            if refresh:
+                self.bot.loop.create_task(self.revalidate(msg, embed, refresh, build))
 
         else:
             # If the user does not have a linked profile
@@ -174,7 +118,7 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
             await ctx.send(embed = embed)
         else:
             # Send profile search response
-            profile = self.bot.data['HyperscapeUsers']['profiles'][name.lower()]
+            profile = updated
 
             # Ask the user if the found profile is theirs
             embed = self.bot.embed_util.get_embed(
@@ -210,8 +154,7 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
                     await ctx.message.delete()
                     await msg.delete()
                 elif str(reaction.emoji) == '✅':
-                    self.bot.data['HyperscapeUsers']['discords'][ctx.author.id] = profile.player_name
-                    self.bot.data_manager.save_data()
+                    self.bot.data_manager.link_discord(ctx.author.id, profile)
                     await msg.clear_reactions()
                     embed = self.bot.embed_util.get_embed(
                         title = profile.player_name,
@@ -247,8 +190,8 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
             return
 
         # Get user profile
-        updated = await self.bot.data_manager.update_user_cache(name, platform)
-        if not updated:
+        profile, refresh = await self.bot.data_manager.get_user_profile(name, platform, "search")
+        if not profile:
             embed = self.bot.embed_util.get_embed(
                 title = "Failed to Find User",
                 desc = f"User `{name}` was not able to be found on the `{platform}` platform, please try again."
@@ -256,62 +199,10 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
             await ctx.send(embed = embed)
         else:
             # Send profile search response
-            profile = self.bot.data['HyperscapeUsers']['profiles'][name.lower()]
-            embed = self.bot.embed_util.get_embed(
-                author = profile.player_name,
-                author_url = profile.url,
-                thumbnail = profile.avatar_url,
-                title = "Stats Profile",
-                desc = f"*For more information on specific stats, use `{self.bot.prefix}stats`*",
-                fields = [
-                    {
-                        "name": "Kills",
-                        "value": profile.kills,
-                        "inline": True
-                    },
-                    {
-                        "name": "Assists",
-                        "value": profile.assists,
-                        "inline": True
-                    },
-                    {
-                        "name": "KD",
-                        "value": profile.kd,
-                        "inline": True
-                    },
-                    {
-                        "name": "Wins",
-                        "value": profile.wins,
-                        "inline": True
-                    },
-                    {
-                        "name": "Losses",
-                        "value": profile.losses,
-                        "inline": True
-                    },
-                    {
-                        "name": "Winrate",
-                        "value": profile.winrate,
-                        "inline": True
-                    },
-                    {
-                        "name": "Crown Wins",
-                        "value": profile.crown_wins,
-                        "inline": True
-                    },
-                    {
-                        "name": "Crown Pickups",
-                        "value": profile.crown_pickups,
-                        "inline": True
-                    },
-                    {
-                        "name": "Crown Success",
-                        "value": profile.crown_pickup_success_rate,
-                        "inline": True
-                    }
-                ]
-            )
-            await ctx.send(embed = embed)
+            embed = self.get_search_embed(profile)
+            msg = await ctx.send(embed = embed)
+            if refresh:
+                self.bot.loop.create_task(self.revalidate(msg, embed, refresh, self.get_search_embed))
 
     @commands.guild_only()
     @commands.group(name = "stat", aliases = ['stats'], help = "Get information on specific stats for a user.")
@@ -360,23 +251,14 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
             )
             await ctx.send(embed = embed)
         else:
-            try:
-                # Try to find a category for the user input
-                try:
-                    category = StatCategory(category.lower())
-                except:
-                    try:
-                        category = Stat(category.lower())
-                    except:
-                        try:
-                            category = WeaponStat(category.lower())
-                        except:
-                            category = HackStat(category.lower())
-            except:
-                # If the category does not exist, return an error
+            # Find the category, stat, weapon or hack for the user input
+            searched = category
+            category = STAT_ARGUMENTS.get(searched)
+            if category is None:
+                # If the category does not exist, return an error with the closest matches
                 embed = self.bot.embed_util.get_embed(
                     title = "Category Not Found",
-                    desc = "Please view valid category inputs below.",
+                    desc = f"{did_you_mean(STAT_ARGUMENTS.suggest(searched))}\nPlease view valid category inputs below.".lstrip(),
                     fields = [
                         {
                             "name": "Stat Categorys",
@@ -412,44 +294,22 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
             if user.id in self.bot.data['HyperscapeUsers']['discords']:
                 # Get the cached profile information
                 prof_name = self.bot.data['HyperscapeUsers']['discords'][user.id].lower()
-                profile = self.bot.data['HyperscapeUsers']['profiles'][prof_name]
-                updated = await self.bot.data_manager.update_user_cache(prof_name, profile.platform)
-                if not updated:
+                platform = self.bot.data['HyperscapeUsers']['profiles'][prof_name].platform
+                profile, refresh = await self.bot.data_manager.get_user_profile(prof_name, platform, "stat")
+                if not profile:
                     embed = self.bot.embed_util.get_embed(
                         title = "Failed to Find User",
-                        desc = f"User `{prof_name}` was not able to be found on the `{profile.platform}` platform, please try again."
+                        desc = f"User `{prof_name}` was not able to be found on the `{platform}` platform, please try again."
                     )
                     await ctx.send(embed = embed)
                     return
-                else:
-                    profile = self.bot.data['HyperscapeUsers']['profiles'][prof_name]
 
                 # return stat results
-                if type(category) == StatCategory:
-                    embed = self.bot.embed_util.get_embed(
-                        title = f"{category.name.capitalize()} Stats",
-                        thumbnail = profile.avatar_url,
-                        fields = self.bot.data_manager.get_stat_category_fields(category.name, profile),
-                        author_url = profile.url
-                    )
-                elif type(category) == Stat:
-                    embed = self.bot.embed_util.get_embed(
-                        title = f"{' '.join(i.capitalize() for i in category.name.split('_'))} Stat",
-                        thumbnail = profile.avatar_url,
-                        desc = getattr(profile, category.name),
-                        author_url = profile.url
-                    )
-                elif type(category) == WeaponStat:
-                    embed = self.bot.data_manager.get_weapon_stat_embed(category.name, profile)
-                elif type(category) == HackStat:
-                    embed = self.bot.data_manager.get_hack_stat_embed(category.name, profile)
-
-                embed.set_author(
-                    name = user.name,
-                    icon_url = user.avatar_url,
-                    url = profile.url
-                )
-                await ctx.send(embed = embed)
+                build = lambda profile: self.get_stat_embed(user, category, profile)
+                embed = build(profile)
+                msg = await ctx.send(embed = embed)
+                if refresh:
+                    self.bot.loop.create_task(self.revalidate(msg, embed, refresh, build))
             else:
                 # If the user does not have a linked profile
                 embed = self.bot.embed_util.get_embed(
@@ -458,6 +318,112 @@ class HyperscapeStats(commands.Cog, name = "Hyperscape Stats"):
                 )
                 await ctx.send(embed = embed)
 
+    def get_profile_embed(self, user, profile):
+        """Function | Profile Embed
+
+        Create the response for the `profile` command.
+
+        Args
+        ----------
+        user - The discord.User the profile is linked to.
+        profile - An instance of the Profile class found in './Resources/APISession.py'
+        """
+        embed = self.bot.embed_util.render_profile(profile, "profile", lambda: self.bot.embed_util.get_embed(
+            author_url = profile.url,
+            title = f"{profile.player_name}'s Stats Profile",
+            thumbnail = profile.avatar_url,
+            desc = f"*For more information on specific stats, use `{self.bot.prefix}stats`*",
+            fields = render_fields(MAIN_VIEW, profile)
+        ))
+        embed.set_author(
+            name = user.name,
+            icon_url = user.avatar_url,
+            url = profile.avatar_url
+        )
+        return embed
+
+    def get_search_embed(self, profile):
+        """Function | Search Embed
+
+        Create the response for the `search` command.
+
+        Args
+        ----------
+        profile - An instance of the Profile class found in './Resources/APISession.py'
+        """
+        return self.bot.embed_util.render_profile(profile, "search", lambda: self.bot.embed_util.get_embed(
+            author = profile.player_name,
+            author_url = profile.url,
+            thumbnail = profile.avatar_url,
+            title = "Stats Profile",
+            desc = f"*For more information on specific stats, use `{self.bot.prefix}stats`*",
+            fields = render_fields(MAIN_VIEW, profile)
+        ))
+
+    def get_stat_embed(self, user, category, profile):
+        """Function | Stat Embed
+
+        Create the response for the `stat` command.
+
+        Args
+        ----------
+        user - The discord.User the profile is linked to.
+        category - The StatCategory, Stat, WeaponStat or HackStat searched.
+        profile - An instance of the Profile class found in './Resources/APISession.py'
+        """
+        embed = self.bot.embed_util.render_profile(profile, ("stat", category), lambda: self.build_stat_embed(category, profile))
+        embed.set_author(
+            name = user.name,
+            icon_url = user.avatar_url,
+            url = profile.url
+        )
+        return embed
+
+    def build_stat_embed(self, category, profile):
+        """Function | Build Stat Embed
+
+        Create the part of the `stat` response which depends only on the
+        profile, cached by `get_stat_embed`.
+        """
+        if type(category) == Stat:
+            return self.bot.embed_util.get_embed(
+                title = f"{STAT_LABELS[category.name]} Stat",
+                thumbnail = profile.avatar_url,
+                desc = getattr(profile, category.name),
+                author_url = profile.url
+            )
+        view = VIEWS[category]
+        embed = self.bot.embed_util.get_embed(
+            title = view.title,
+            thumbnail = profile.avatar_url,
+            fields = render_fields(view, profile),
+            author_url = profile.url
+        )
+        return embed
+
+    async def revalidate(self, msg, embed, refresh, build):
+        """Function | Revalidate Response
+
+        Wait for a background refresh of the profile a response was
+        created from, and edit the response in place if the stats changed.
+
+        Args
+        ----------
+        msg - The discord.Message which was sent.
+        embed - The discord.Embed the message was sent with.
+        refresh - The task refreshing the profile.
+        build - A function creating the response embed from a profile.
+        """
+        try:
+            profile = await refresh
+        except Exception as e:
+            print(f"{self.bot.WARN} {self.bot.TIMELOG()} Background profile refresh failed: {e}")
+            return
+
+        if profile:
+            new_embed = build(profile)
+            if new_embed.to_dict() != embed.to_dict():
+                await msg.edit(embed = new_embed)
 
 def setup(bot):
     """Setup
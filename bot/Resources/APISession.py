@@ -1,174 +1,631 @@
 import asyncio
 import datetime
 import json
+import random
+import sys
+import time
+import zlib
+from collections import Counter, deque
 
 import aiohttp
 import requests
 
+from Resources.Concurrency import INTERACTIVE, AdaptiveLimiter, CircuitBreaker, RateLimited, RateLimiter, SingleFlight
+from Resources.Fields import STAT_FIELDS, WEAPON_FIELDS, HACK_FIELDS, WEAPONS, HACKS, decode_profile, decode_weapon, decode_hack
+
+# The stats of a profile in the order they are stored: (attribute, API key).
+STATS = tuple((field.attr, field.key) for field in STAT_FIELDS)
+
 class WeaponStat:
-    def __init__(self, options, name):
-        self.name = name
+    """Class | Weapon Stat
 
-        self.kills = options.get('kills')
-        self.damage = options.get('damage')
-        self.headshot_damage = options.get('headshot_damage')
-        self.fusions = options.get('fusions')
-        self.hs_accuracy = options.get('hs_accuracy')
+    The stats of a single weapon.
+
+    Profiles store weapon stats in a fixed array, and create
+    one of these whenever a weapon is accessed.
+    """
+    __slots__ = ('name', 'kills', 'damage', 'headshot_damage', 'fusions', 'hs_accuracy')
+
+    # The API keys of the stats, in the order they are stored.
+    KEYS = tuple(field.key for field in WEAPON_FIELDS)
+    decode = staticmethod(decode_weapon)
 
-class HackStat:
     def __init__(self, options, name):
+        self.set_values(name, self.decode(options or {}))
+
+    @classmethod
+    def from_values(cls, name, values):
+        stat = cls.__new__(cls)
+        stat.set_values(name, values)
+        return stat
+
+    def set_values(self, name, values):
         self.name = name
+        self.kills, self.damage, self.headshot_damage, self.fusions, self.hs_accuracy = values
+
+    def values(self):
+        return (self.kills, self.damage, self.headshot_damage, self.fusions, self.hs_accuracy)
+
+    def __getstate__(self):
+        return self.name, self.values()
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Pickled before stats were slotted.
+            state = state['name'], [state.get(key) for key in ('kills', 'damage', 'headshot_damage', 'fusions', 'hs_accuracy')]
+        self.set_values(*state)
+
+class HackStat(WeaponStat):
+    """Class | Hack Stat
+
+    The stats of a single hack.
 
-        self.kills = options.get('kills')
-        self.damage = options.get('damage')
-        self.headshot_damage = options.get('headshot_damage')
-        self.fusions = options.get('fusions')
-        self.hs_accuracy = options.get('headshot_accuracy')
+    Profiles store hack stats in a fixed array, and create
+    one of these whenever a hack is accessed.
+    """
+    __slots__ = ()
+
+    KEYS = tuple(field.key for field in HACK_FIELDS)
+    decode = staticmethod(decode_hack)
 
 class Profile:
+    """Class | Profile
+
+    A Hyper Scape player's stats profile, as returned by the API.
+
+    To keep the many cached profiles small in memory and when saved,
+    profiles are slotted: stats are stored in a single fixed layout tuple,
+    and weapon/hack stats in flat tuples of five values each. Every stat
+    is still available as an attribute, e.g. `profile.kills` or
+    `profile.protocol.kills`.
+
+    Values are read by the decoder built from the field table in
+    './Resources/Fields.py', missing sections of the response are
+    given the fields' default values.
+
+    Args
+    ----------
+    options - The decoded JSON response of the API's player endpoint.
+    """
+    __slots__ = (
+        'found', 'player_id', 'player_user', 'player_name', 'platform',
+        'profile_verified', 'profile_visitors', 'refresh_utime', 'is_premium',
+        '_stats', '_weapons', '_hacks'
+    )
+
+    # Identifies the order of stored stats, so saved profiles from an older layout are recognized.
+    LAYOUT = zlib.crc32(" ".join(attr for attr, key in STATS).encode())
+
     def __init__(self, options):
         self.found = options.get('found', False)
 
         if self.found:
-            self.player = options.get('player')
-            self.player_id = self.player.get('p_id')
-            self.player_user = self.player.get('p_user')
-            self.player_name = self.player.get('p_name')
-            self.platform = self.player.get('p_platform')
-
-            self.profile_verified = options.get('custom').get('verified')
-            self.profile_visitors = options.get('custom').get('visitors')
-
-            self.last_refresh = datetime.datetime.fromtimestamp(options.get('refresh').get('utime'))
-
-            stats = options.get('data').get('stats')
-
-            self.wins = stats.get('wins')
-            self.crown_wins = stats.get('crown_wins')
-            self.damage = stats.get('damage')
-            self.assists = stats.get('assists')
-            self.matches = stats.get('matches')
-            self.chests_broken = stats.get('chests_broken')
-            self.crown_pickups = stats.get('crown_pickups')
-            self.damage_done = stats.get('damage_done')
-            self.kills = stats.get('kills')
-            self.fusions = stats.get('fusions')
-            self.last_rank = stats.get('last_rank')
-            self.revives = stats.get('revives')
-            self.time_played = stats.get('time_played')
-            self.solo_crown_wins = stats.get('solo_crown_wins')
-            self.squad_crown_wins = stats.get('squad_crown_wins')
-            self.solo_last_rank = stats.get('solo_last_rank')
-            self.squad_last_rank = stats.get('squad_last_rank')
-            self.solo_time_played = stats.get('solo_time_played')
-            self.squad_time_played = stats.get('squad_time_played')
-            self.solo_matches = stats.get('solo_matches')
-            self.squad_matches = stats.get('squad_matches')
-            self.solo_wins = stats.get('solo_wins')
-            self.squad_wins = stats.get('squad_wins')
-            self.careerbest_fused_to_max = stats.get('careerbest_fused_to_max')
-            self.careerbest_chests = stats.get('careerbest_chests')
-            self.careerbest_shockwaved = stats.get('careerbest_shockwaved')
-            self.careerbest_damage_done = stats.get('careerbest_damage_done')
-            self.careerbest_revealed = stats.get('careerbest_revealed')
-            self.careerbest_assists = stats.get('careerbest_assists')
-            self.careerbest_damage_shielded = stats.get('careerbest_shielded')
-            self.careerbest_long_range_final_blows = stats.get('careerbest_long_range_final_blows')
-            self.careerbest_short_range_final_blows = stats.get('careerbest_short_range_final_blows')
-            self.careerbest_kills = stats.get('careerbest_kills')
-            self.careerbest_item_fused = stats.get('careerbest_item_fused')
-            self.careerbest_critical_damage = stats.get('careerbest_critical_damage')
-            self.careerbest_survival_time = stats.get('careerbest_survival_time')
-            self.careerbest_healed = stats.get('careerbest_healed')
-            self.careerbest_revives = stats.get('careerbest_revives')
-            self.careerbest_snare_triggered = stats.get('careerbest_snare_triggered')
-            self.careerbest_mines_triggered = stats.get('careerbest_mines_triggered')
-            self.weapon_headshot_damage = stats.get('weapon_headshot_damage')
-            self.weapon_body_damage = stats.get('weapon_body_damage')
-            self.damage_by_items = stats.get('damage_by_items')
-            self.avg_kills_per_match = stats.get('avg_kills_per_match')
-            self.avg_dmg_per_kill = stats.get('avg_dmg_per_kill')
-            self.losses = stats.get('losses')
-            self.solo_losses = stats.get('solo_losses')
-            self.squad_losses = stats.get('squad_losses')
-            self.winrate = stats.get('winrate')
-            self.solo_winrate = stats.get('solo_winrate')
-            self.squad_winrate = stats.get('squad_winrate')
-            self.crown_pickup_success_rate = stats.get('crown_pick_success_rate')
-            self.kd = stats.get('kd')
-            self.headshot_accuracy = stats.get('headshot_accuracy')
-
-            weapons = options.get('data').get('weapons')
-            self.dragonfly = WeaponStat(weapons.get('Dragon Fly'), 'Dragon Fly')
-            self.mammoth = WeaponStat(weapons.get('Mammoth MK1'), 'Mammoth MK1')
-            self.ripper = WeaponStat(weapons.get('The Ripper'), 'The Ripper')
-            self.dtap = WeaponStat(weapons.get('D-Tap'), 'D-Tap')
-            self.harpy = WeaponStat(weapons.get('Harpy'), 'Harpy')
-            self.komodo = WeaponStat(weapons.get('Komodo'), 'Komodo')
-            self.hexfire = WeaponStat(weapons.get('Hexfire'), 'Hexfire')
-            self.riot = WeaponStat(weapons.get('Riot One'), 'Riot One')
-            self.salvo = WeaponStat(weapons.get('Salvo EPL'), 'Salvo EPL')
-            self.skybreaker = WeaponStat(weapons.get('Skybreaker'), 'Skybreaker')
-            self.protocol = WeaponStat(weapons.get('Protocol V'), 'Protocol V')
-
-            hacks = options.get('data').get('hacks')
-            self.mine = HackStat(hacks.get('Mine'), 'Mine')
-            self.slam = HackStat(hacks.get('Slam'), 'Slam')
-            self.shockwave = HackStat(hacks.get('Shockwave'), 'Shockwave')
-            self.wall = HackStat(hacks.get('Wall'), 'Wall')
-            self.heal = HackStat(hacks.get('Heal'), 'Heal')
-            self.reveal = HackStat(hacks.get('Reveal'), 'Reveal')
-            self.teleport = HackStat(hacks.get('Teleport'), 'Teleport')
-            self.ball = HackStat(hacks.get('Ball'), 'Ball')
-            self.invis = HackStat(hacks.get('Invisibility'), 'Invisibility')
-            self.armor = HackStat(hacks.get('Armor'), 'Armor')
-            self.magnet = HackStat(hacks.get('Magnet'), 'Magnet')
-
-            self.avatar_url = f"https://ubisoft-avatars.akamaized.net/{self.player_id}/default_146_146.png"
-            self.url = f"https://tabstats.com/hyperscape/player/{self.player_name.lower()}/{self.player_id}"
-
-            self.is_premium = options.get('social').get('is_premium')
+            (self.player_id, self.player_user, self.player_name, platform,
+            self.profile_verified, self.profile_visitors, self.refresh_utime, self.is_premium,
+            self._stats, self._weapons, self._hacks) = decode_profile(options)
+            self.platform = sys.intern(platform)
+
+    @property
+    def last_refresh(self):
+        return datetime.datetime.fromtimestamp(self.refresh_utime, datetime.timezone.utc)
+
+    @property
+    def refresh_age(self):
+        """How long ago the profile was last refreshed upstream, as a timedelta."""
+        # Both are seconds since the epoch, so the local timezone doesn't matter.
+        return datetime.timedelta(seconds = time.time() - self.refresh_utime)
+
+    @property
+    def weapon_damage(self):
+        """The damage done with weapons, to the head and body."""
+        return self.weapon_headshot_damage + self.weapon_body_damage
+
+    @property
+    def stat_values(self):
+        """The stats in a tuple, in the order of `STAT_FIELDS`."""
+        return self._stats
+
+    @property
+    def weapon_values(self):
+        """The stats of every weapon in a flat tuple, in the order of `WEAPONS` and then `WEAPON_FIELDS`."""
+        return self._weapons
+
+    @property
+    def hack_values(self):
+        """The stats of every hack in a flat tuple, in the order of `HACKS` and then `HACK_FIELDS`."""
+        return self._hacks
+
+    def values(self):
+        """Returns every stat in a flat tuple: the stats, then each weapon's and each hack's five stats."""
+        return self._stats + self._weapons + self._hacks
+
+    @property
+    def player(self):
+        return {
+            'p_id': self.player_id,
+            'p_user': self.player_user,
+            'p_name': self.player_name,
+            'p_platform': self.platform
+        }
+
+    @property
+    def avatar_url(self):
+        return f"https://ubisoft-avatars.akamaized.net/{self.player_id}/default_146_146.png"
+
+    @property
+    def url(self):
+        return f"https://tabstats.com/hyperscape/player/{self.player_name.lower()}/{self.player_id}"
+
+    def __getstate__(self):
+        if not self.found:
+            return (self.LAYOUT, False)
+        return (
+            self.LAYOUT, True, self.player_id, self.player_user, self.player_name, self.platform,
+            self.profile_verified, self.profile_visitors, self.refresh_utime, self.is_premium,
+            self._stats, self._weapons, self._hacks
+        )
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            self.set_legacy_state(state)
+            return
+
+        self.found = state[1]
+        if self.found:
+            (self.player_id, self.player_user, self.player_name, self.platform,
+            self.profile_verified, self.profile_visitors, self.refresh_utime, self.is_premium,
+            self._stats, self._weapons, self._hacks) = state[2:]
+            self.platform = sys.intern(self.platform)
+            if state[0] != self.LAYOUT:
+                # Saved with a different stat layout, so drop the stats and let the profile be refreshed.
+                self._stats = (None,) * len(STATS)
+                self.refresh_utime = 0
+
+    def set_legacy_state(self, state):
+        """Restore a profile pickled before profiles were slotted, when attributes were in a dict."""
+        self.found = state.get('found', False)
+        if self.found:
+            self.player_id = state['player_id']
+            self.player_user = state['player_user']
+            self.player_name = state['player_name']
+            self.platform = sys.intern(state['platform'])
+            self.profile_verified = state['profile_verified']
+            self.profile_visitors = state['profile_visitors']
+            self.refresh_utime = state['last_refresh'].timestamp()
+            self.is_premium = state['is_premium']
+            self._stats = tuple([state.get(attr) for attr, key in STATS])
+            missing = (None,) * 5
+            self._weapons = tuple([value for attr, name in WEAPONS for value in (state[attr].values() if attr in state else missing)])
+            self._hacks = tuple([value for attr, name in HACKS for value in (state[attr].values() if attr in state else missing)])
+            if not all(attr in state for attr, name in WEAPONS + HACKS):
+                # Saved before weapon and hack stats existed, so let the profile be refreshed.
+                self.refresh_utime = 0
+
+# Named accessors for the stored stats, weapons and hacks.
+def _stat_property(index):
+    return property(lambda self: self._stats[index])
+
+def _array_property(array, cls, index, name):
+    return property(lambda self: cls.from_values(name, getattr(self, array)[index * 5:index * 5 + 5]))
+
+for index, (attr, key) in enumerate(STATS):
+    setattr(Profile, attr, _stat_property(index))
+for index, (attr, name) in enumerate(WEAPONS):
+    setattr(Profile, attr, _array_property('_weapons', WeaponStat, index, name))
+for index, (attr, name) in enumerate(HACKS):
+    setattr(Profile, attr, _array_property('_hacks', HackStat, index, name))
+
+API_URL = "https://hypers.apitab.com"
+
+class APIError(Exception):
+    """Class | API Error
+
+    Raised when a request to the Hyper Scape API could not be made.
+    The message is suitable to show to users.
+    """
+
+class APIBusy(APIError):
+    """Class | API Busy
+
+    Raised when a request was rejected by the rate limiter, because
+    it would have waited too long to be sent.
+    """
+
+class APIUnavailable(APIError):
+    """Class | API Unavailable
+
+    Raised when a request was refused because the circuit breaker is
+    open, after the API failed too many times in a row.
+    """
+
+# How often the API allows a profile to be refreshed.
+REFRESH_INTERVAL = datetime.timedelta(minutes = 10)
+
+# The most seconds each kind of request may take, and whether it is safe to retry.
+TIMEOUTS = {'search': 5, 'player': 5, 'update': 15}
+IDEMPOTENT = {'search', 'player'}
 
 class APISession:
-    def __init__(self):
-        pass
+    """Class | API Session
+
+    Owns the single pooled HTTP session used for every request to
+    the Hyper Scape stats API, so that connections, DNS lookups and
+    TLS handshakes are reused between lookups instead of being paid
+    for on every command.
+
+    The session is created on bot startup by `start` and must be
+    closed with `close` when the bot shuts down.
+
+    Identical requests of the same priority made while one is already
+    in flight are coalesced into it, see `inflight.stats()` for the
+    savings. Requests of different priorities are not, so that an
+    interactive command never waits in the background lane.
+
+    Every request sent upstream first waits for the rate limiter.
+    Requests take a `priority`, either `INTERACTIVE` for commands or
+    `BACKGROUND` for work nobody is waiting on, see `limiter.stats()`.
+
+    Each kind of request has its own timeout. Searches and profile
+    reads are retried after timeouts, connection errors and server
+    errors, waiting a random time up to an exponentially growing backoff
+    between attempts. Updates are not retried, as they are not
+    idempotent. Failures raise `APIError`, and once the API keeps
+    failing the circuit breaker refuses requests straight away with
+    `APIUnavailable`, see `breaker.stats()`.
+
+    How many requests are in flight at once is limited by an adaptive
+    limit, which grows while the API answers quickly and shrinks as
+    soon as it slows down or fails, see `concurrency.stats()`.
+
+    Refreshing a profile asks the API to update it and then polls the
+    profile until it has been updated upstream, see `refresh_player_by_id`.
+
+    Args
+    ----------
+    keepalive - Seconds an idle connection is kept open for reuse.
+    limit_per_host - Maximum simultaneous connections to the API host.
+    dns_cache_ttl - Seconds a resolved DNS entry for the API host is cached.
+    limiter - The RateLimiter requests wait for, by default 5 requests per second.
+    breaker - The CircuitBreaker guarding the API.
+    concurrency - The AdaptiveLimiter of requests in flight.
+    hedging - Whether idempotent requests are hedged, see `_hedged_get`.
+    hedge_rate - The most hedges sent per request, e.g. 0.1 for one in ten.
+    hedge_min_samples - How many latencies of a kind of request are
+        recorded before its requests are hedged.
+    timeouts - A dict of the timeout in seconds of each kind of request.
+    retries - How many times an idempotent request is retried.
+    backoff_base - Seconds of backoff before the first retry, doubling each retry.
+    backoff_cap - The most seconds of backoff before a retry.
+    refresh_deadline - The most seconds a refresh polls for the updated profile.
+    refresh_poll_base - Seconds before the first poll of a refresh, doubling each poll.
+    refresh_poll_cap - The most seconds between polls of a refresh.
+    """
+    def __init__(self, keepalive = 30, limit_per_host = 10, dns_cache_ttl = 300, limiter = None, breaker = None,
+                 concurrency = None, timeouts = None, retries = 2, backoff_base = 0.5, backoff_cap = 4,
+                 hedging = False, hedge_rate = 0.1, hedge_min_samples = 20, refresh_deadline = 20,
+                 refresh_poll_base = 1, refresh_poll_cap = 5):
+        self.keepalive = keepalive
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.session = None
+        self.inflight = SingleFlight()
+        self.limiter = limiter or RateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.concurrency = concurrency or AdaptiveLimiter(maximum = limit_per_host)
+        self.timeouts = timeouts or TIMEOUTS
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedging = hedging
+        self.hedge_rate = hedge_rate
+        self.hedge_min_samples = hedge_min_samples
+        self.refresh_deadline = refresh_deadline
+        self.refresh_poll_base = refresh_poll_base
+        self.refresh_poll_cap = refresh_poll_cap
+
+        # Recent latencies of successful requests, by kind.
+        self.latencies = {}
+        # Hedges are paid for from a budget which every request adds `hedge_rate` to.
+        self.hedge_budget = 0
+
+        self.attempts = Counter()
+        self.failures = Counter()
+        self.hedges = Counter()
+        self.hedge_wins = Counter()
+        # How refreshes ended, "updated" or "timed out".
+        self.refreshes = Counter()
+
+    async def start(self):
+        """Function | Start Session
+
+        Create the pooled HTTP session if it does not exist yet
+        (or was closed), and return it.
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host = self.limit_per_host,
+                keepalive_timeout = self.keepalive,
+                use_dns_cache = True,
+                ttl_dns_cache = self.dns_cache_ttl
+            )
+            self.session = aiohttp.ClientSession(connector = connector)
+        return self.session
+
+    async def warm_up(self):
+        """Function | Warm Up Connection
+
+        Open a connection to the API host ahead of the first command,
+        so the DNS lookup and TLS handshake are already done when
+        a user asks for stats.
+
+        Returns whether the API host could be reached.
+        """
+        session = await self.start()
+        try:
+            async with session.head(API_URL):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+        return True
+
+    async def close(self):
+        """Function | Close Session
+
+        Close the pooled HTTP session and every connection it holds.
+        """
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
 
     async def get_profile(self, username, platform = "uplay"):
-        async with aiohttp.ClientSession() as session:
-            id = await self.search_user_by_name(session, username, platform)
-            if not id:
+        id = await self.search_user_by_name(username, platform)
+        if not id:
+            return None
+        profile = await self.get_profile_by_id(id)
+        if profile and profile.found:
+            if profile.refresh_age > REFRESH_INTERVAL:
+                profile = await self.refresh_player_by_id(id, profile.refresh_utime) or profile
+            return profile
+        else:
+            return None
+
+    async def search_user_by_name(self, username, platform = "uplay", priority = INTERACTIVE):
+        players = await self.search_players(username, platform, priority)
+        if not players:
+            return None
+        return next(iter(players))
+
+    async def search_players(self, username, platform = "uplay", priority = INTERACTIVE):
+        """Function | Search Players
+
+        Search for players by name, returning a dict of the ID and name
+        of every player found, best match first. The dict is empty if
+        nobody was found, and `None` is returned if the search failed.
+        """
+        key = ('search', platform, username.lower(), priority)
+        return await self.inflight.do(key, self._search_players, username, platform, priority)
+
+    async def get_profile_by_id(self, id, priority = INTERACTIVE):
+        return await self.inflight.do(('player', id, priority), self._get_profile_by_id, id, priority)
+
+    async def update_player_by_id(self, id, priority = INTERACTIVE):
+        return await self.inflight.do(('update', id, priority), self._update_player_by_id, id, priority)
+
+    async def refresh_player_by_id(self, id, since = 0, priority = INTERACTIVE):
+        """Function | Refresh Player
+
+        Ask the API to update a player's profile, then poll the profile
+        with a growing delay until it was refreshed after `since`, or
+        `refresh_deadline` seconds have passed.
+
+        Returns the latest profile, which is still the stale one if the
+        update did not finish in time, or `None` if it could not be found.
+
+        Concurrent refreshes of the same player and priority share a
+        single refresh.
+
+        Args
+        ----------
+        id - The ID of the player's profile.
+        since - The `refresh_utime` of the profile already known.
+        priority - The rate limiter lane of the API requests.
+        """
+        return await self.inflight.do(('refresh', id, priority), self._refresh_player_by_id, id, since, priority)
+
+    async def _refresh_player_by_id(self, id, since, priority):
+        await self.update_player_by_id(id, priority)
+        deadline = time.monotonic() + self.refresh_deadline
+        delay = self.refresh_poll_base
+        while True:
+            # The update finishes upstream some time after it was asked for, so never poll straight away.
+            await asyncio.sleep(max(0, min(delay, deadline - time.monotonic())))
+            profile = await self.get_profile_by_id(id, priority)
+            if not (profile and profile.found):
                 return None
-            profile = await self.get_profile_by_id(session, id)
-            if profile.found:
-                if profile.last_refresh < datetime.datetime.now() - datetime.timedelta(minutes = 10):
-                    await self.update_player_by_id(session, id)
-                    profile = await self.get_profile_by_id(session, id)
+            if profile.refresh_utime > since:
+                self.refreshes["updated"] += 1
+                return profile
+            if time.monotonic() >= deadline:
+                self.refreshes["timed out"] += 1
                 return profile
+            delay = min(self.refresh_poll_cap, delay * 2)
+
+    async def _wait_turn(self, priority):
+        """Wait for the rate limiter to allow a request of the priority."""
+        try:
+            await self.limiter.acquire(priority)
+        except RateLimited as e:
+            raise APIBusy(f"The Hyper Scape API is busy, please try again in {e.wait:.0f} seconds.") from e
+
+    async def _get(self, kind, path, priority):
+        """Function | API Request
+
+        Send a GET request to the API, retrying idempotent requests
+        which time out or fail upstream.
+
+        Returns the decoded JSON response, or `None` if the API
+        responded with 404 Not Found.
+
+        Args
+        ----------
+        kind - The kind of request, one of the keys of `timeouts`.
+        path - The path of the request on the API.
+        priority - The rate limiter lane of the request.
+        """
+        attempts = 1 + (self.retries if kind in IDEMPOTENT else 0)
+        for attempt in range(attempts):
+            ticket = self.breaker.allow()
+            if ticket is None:
+                raise APIUnavailable("The Hyper Scape API is not responding, please try again later.")
+            try:
+                await self._wait_turn(priority)
+            except (APIBusy, asyncio.CancelledError):
+                # Nothing was sent, so a trial request may be tried again.
+                self.breaker.release(ticket)
+                raise
+
+            try:
+                await self.concurrency.acquire()
+            except asyncio.CancelledError:
+                self.breaker.release(ticket)
+                raise
+
+            session = await self.start()
+            self.attempts[kind] += 1
+            start = time.monotonic()
+            # Whether the request failed upstream, `None` while it has no outcome.
+            failed = None
+            try:
+                async with session.get(f"{API_URL}{path}", timeout = aiohttp.ClientTimeout(total = self.timeouts[kind])) as r:
+                    if r.status == 200:
+                        res = await r.json(content_type = None)
+                        failed = False
+                        self.breaker.record_success(ticket)
+                        self.latencies.setdefault(kind, deque(maxlen = 200)).append(time.monotonic() - start)
+                        return res
+                    if r.status == 404:
+                        failed = False
+                        self.breaker.record_success(ticket)
+                        return None
+                    # Only rate limiting and server errors are worth trying again.
+                    retry = failed = r.status == 429 or r.status >= 500
+                    error = APIError(f"The Hyper Scape API responded with an error ({r.status}), please try again later.")
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                retry = failed = True
+                error = APIError("The Hyper Scape API could not be reached, please try again later.")
+            except asyncio.CancelledError:
+                self.breaker.release(ticket)
+                raise
+            finally:
+                self.concurrency.release(None if failed is None else time.monotonic() - start, bool(failed))
+
+            self.failures[kind] += 1
+            if retry:
+                self.breaker.record_failure(ticket)
             else:
-                return None
+                self.breaker.release(ticket)
+            if not retry or attempt == attempts - 1:
+                raise error
+            # Full jitter, so that retries from many commands are spread out.
+            await asyncio.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
 
-    async def search_user_by_name(self, session, username, platform = "uplay"):
-        async with session.get(f"https://hypers.apitab.com/search/{platform}/{username}") as r:
-            if r.status == 200:
-                res = await r.json()
-                if type(res['players']) == dict:
-                    top_res = list(res['players'].keys())[0]
-                else:
-                    return None
-                return top_res
-
-    async def get_profile_by_id(self, session, id):
-        async with session.get(f"https://hypers.apitab.com/player/{id}?u=89031276") as r:
-            if r.status == 200:
-                res = await r.json()
-                return Profile(res)
-
-    async def update_player_by_id(self, session, id):
-        async with session.get(f"https://hypers.apitab.com/update/{id}?u=89031276") as r:
-            pass
+    def hedge_delay(self, kind):
+        """Function | Hedge Delay
+
+        Returns how many seconds to wait for a request of the kind before
+        hedging it: the 95th percentile of its recent latencies. Returns
+        `None` if too few latencies have been recorded yet.
+        """
+        latencies = self.latencies.get(kind, ())
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        return sorted(latencies)[int(len(latencies) * 0.95)]
+
+    async def _hedged_get(self, kind, path, priority):
+        """Function | Hedged API Request
+
+        Send a request like `_get`, but if it has not been answered
+        within the 95th percentile latency of its kind, send a duplicate.
+        Whichever answers first is used, and the other is cancelled, so
+        an occasional slow response doesn't hold up a command.
+
+        Only idempotent requests are hedged, and only while hedging is
+        enabled, the circuit breaker is closed and the hedge budget
+        allows it, so hedging can't add much load when the API is struggling.
+        """
+        self.hedge_budget = min(10, self.hedge_budget + self.hedge_rate)
+        delay = self.hedge_delay(kind)
+        if not self.hedging or not kind in IDEMPOTENT or delay is None:
+            return await self._get(kind, path, priority)
+
+        first = asyncio.ensure_future(self._get(kind, path, priority))
+        second = None
+        try:
+            done, pending = await asyncio.wait({first}, timeout = delay)
+            if done or self.hedge_budget < 1 or self.breaker.state != CircuitBreaker.CLOSED:
+                return await first
+
+            self.hedge_budget -= 1
+            self.hedges[kind] += 1
+            second = asyncio.ensure_future(self._get(kind, path, priority))
+            pending = {first, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+                answered = [request for request in done if request.exception() is None]
+                if answered or not pending:
+                    # A failed request only loses if the other can still answer.
+                    request = answered[0] if answered else done.pop()
+                    if request is second:
+                        self.hedge_wins[kind] += 1
+                    return request.result()
+        finally:
+            for request in (first, second):
+                if request is not None and not request.done():
+                    request.cancel()
+
+    async def _search_players(self, username, platform, priority):
+        res = await self._hedged_get('search', f"/search/{platform}/{username}", priority)
+        if res is not None and type(res.get('players')) == dict:
+            return {
+                id: player.get('p_name') if isinstance(player, dict) else None
+                for id, player in res['players'].items()
+            }
+        return {}
+
+    async def _get_profile_by_id(self, id, priority):
+        res = await self._hedged_get('player', f"/player/{id}?u=89031276", priority)
+        if res is not None:
+            return Profile(res)
+
+    async def _update_player_by_id(self, id, priority):
+        await self._get('update', f"/update/{id}?u=89031276", priority)
+
+    def stats(self):
+        """Function | Request Statistics
+
+        Returns a dict per kind of request with the number of attempts
+        sent upstream, how many of them failed, how many were hedges and
+        how many hedges answered first, and the current hedge delay.
+        """
+        return {
+            kind: {
+                "attempts": self.attempts[kind],
+                "failures": self.failures[kind],
+                "hedges": self.hedges[kind],
+                "hedge wins": self.hedge_wins[kind],
+                "hedge delay": self.hedge_delay(kind)
+            }
+            for kind in self.attempts
+        }
 
 if __name__ == "__main__":
+    async def main(username):
+        api = APISession()
+        try:
+            return await api.get_profile(username)
+        finally:
+            await api.close()
+
     username = input("Input the username you would like to search: ")
-    api = APISession()
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(api.get_profile(username))
+    loop.run_until_complete(main(username))
@@ -0,0 +1,141 @@
+"""Resource | Aliases
+
+This file hosts the index resolving the stat, category, weapon and
+hack names users type to their enum members in a single dict lookup,
+and suggesting the closest names when nothing matches. More details
+provided for each.
+"""
+from collections import Counter
+
+from Resources.Enums import HackStat, Stat, StatCategory, WeaponStat
+
+def trigrams(text):
+    """Returns the set of three letter runs of a text, padded so short texts have some."""
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def edit_distance(first, second, limit):
+    """Function | Edit Distance
+
+    Returns the number of single letter insertions, deletions,
+    substitutions and swaps of neighbouring letters turning one text
+    into the other, and into the closest start of the other, each
+    `limit + 1` once it is known to be over `limit`.
+
+    Only the letters within `limit` of the diagonal are compared,
+    as any other alignment is over the limit anyway.
+    """
+    over = limit + 1
+    if len(first) - len(second) > limit:
+        return over, over
+    whole = len(second) - len(first) <= limit
+    # Letters past this can't be reached within the limit.
+    second = second[:len(first) + limit]
+    size = len(second)
+    before, previous = None, [j if j <= limit else over for j in range(size + 1)]
+    for i in range(1, len(first) + 1):
+        letter = first[i - 1]
+        current = [over] * (size + 1)
+        if i <= limit:
+            current[0] = i
+        lowest = current[0]
+        for j in range(max(1, i - limit), min(size, i + limit) + 1):
+            distance = previous[j - 1] + (letter != second[j - 1])
+            if previous[j] < distance:
+                distance = previous[j] + 1
+            if current[j - 1] < distance:
+                distance = current[j - 1] + 1
+            if before and j > 1 and letter == second[j - 2] and first[i - 2] == second[j - 1] and before[j - 2] < distance:
+                distance = before[j - 2] + 1
+            current[j] = distance
+            if distance < lowest:
+                lowest = distance
+        if lowest > limit:
+            return over, over
+        before, previous = previous, current
+    return min(previous[-1], over) if whole else over, min(min(previous), over)
+
+class AliasIndex:
+    """Class | Alias Index
+
+    Maps every value of the given enums, lowercased, to a tuple of the
+    enum and its member, so resolving a name is a single dict lookup.
+    When enums share a value, the enum given first wins.
+
+    Names which don't resolve can be matched against every value by
+    their trigrams, and the closest checked by edit distance, to
+    suggest what was meant.
+
+    Args
+    ----------
+    enums - The enums to index, in order of priority.
+    """
+    def __init__(self, enums):
+        self.enums = enums
+        self.aliases = {}
+        for enum in enums:
+            for value, member in enum._value2member_map_.items():
+                self.aliases.setdefault(str(value).lower(), (enum, member))
+        # The aliases containing each trigram.
+        self.trigrams = {}
+        for alias in self.aliases:
+            for trigram in trigrams(alias):
+                self.trigrams.setdefault(trigram, []).append(alias)
+
+    def __contains__(self, name):
+        return name.lower() in self.aliases
+
+    def lookup(self, name):
+        """Returns the (enum, member) of a name, or `None` if no enum has it."""
+        return self.aliases.get(name.lower())
+
+    def get(self, name):
+        """Returns the member of a name, or `None` if no enum has it."""
+        found = self.aliases.get(name.lower())
+        return found[1] if found else None
+
+    def suggest(self, name, count = 3, candidates = 6):
+        """Function | Suggest Names
+
+        Returns up to `count` names of members the name may have been
+        meant as, closest first. Only the aliases sharing the most
+        trigrams with the name are checked by edit distance, and kept if
+        they are at most a third of the name's length (and at least 1)
+        away. Names of three letters or more also keep aliases whose
+        start is that close, ranked after those a letter further away.
+        """
+        name = name.lower()
+        grams = trigrams(name)
+        shared = Counter()
+        for trigram in grams:
+            shared.update(self.trigrams.get(trigram, ()))
+        limit = max(1, len(name) // 3)
+
+        found = []
+        for alias, common in shared.most_common(candidates):
+            if common * 3 < len(grams):
+                break
+            distance, start = edit_distance(name, alias, limit)
+            if distance <= limit:
+                found.append((distance, len(alias), alias))
+            elif start <= limit and len(name) >= 3:
+                # Close to the start of a longer alias, e.g. `hedshot` for `headshot_accuracy`.
+                found.append((start + 1, len(alias), alias))
+
+        suggestions = []
+        for distance, length, alias in sorted(found):
+            enum, member = self.aliases[alias]
+            if not member.name in suggestions:
+                suggestions.append(member.name)
+        return suggestions[:count]
+
+# The arguments of `stat`, of the leaderboard commands, and the weapons and hacks of queries.
+STAT_ARGUMENTS = AliasIndex((StatCategory, Stat, WeaponStat, HackStat))
+BOARD_ARGUMENTS = AliasIndex((Stat, WeaponStat, HackStat))
+WEAPON_ARGUMENTS = AliasIndex((WeaponStat, HackStat))
+
+def did_you_mean(suggestions):
+    """Returns a line suggesting names, or an empty string if there are none."""
+    if not suggestions:
+        return ""
+    return "Did you mean " + " or ".join(f"`{name}`" for name in suggestions) + "?"
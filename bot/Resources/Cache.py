@@ -0,0 +1,499 @@
+"""Resource | Caches
+
+This file hosts the in-memory caches used to keep data
+from the Hyper Scape API around between commands. More
+details provided for each.
+"""
+import copy
+import hashlib
+import math
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """Class | LRU Cache
+
+    A mapping holding at most `max_size` entries, evicting the least
+    recently used entry once it is full. Entries also expire `ttl`
+    seconds after they were stored.
+
+    Wall clock time is used for expiry, so that entries keep their
+    age when the cache is saved and loaded again after a restart.
+
+    Args
+    ----------
+    max_size - The maximum number of entries to hold.
+    ttl - Seconds an entry is kept after being stored, `None` to keep
+        entries until they are evicted by size.
+    """
+    def __init__(self, max_size = 1000, ttl = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _lookup(self, key):
+        """Find the (stored_at, value) entry for a key, dropping it if expired."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            if self._expired(entry[0]):
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+        return entry
+
+    def get(self, key, default = None):
+        """Function | Cache Read
+
+        Returns the value stored for the key, or `default` if it is
+        missing or expired. Counts towards the hit/miss statistics.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, key, default = None):
+        """Function | Cache Peek
+
+        Returns the value stored for the key, or `default` if it is
+        missing or expired, without marking it as recently used or
+        counting towards the hit/miss statistics.
+        """
+        entry = self.entries.get(key)
+        if entry is None or self._expired(entry[0]):
+            return default
+        return entry[1]
+
+    def __getitem__(self, key):
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        return entry[1]
+
+    def __setitem__(self, key, value):
+        self.entries[key] = (time.time(), value)
+        self.entries.move_to_end(key)
+        self.trim()
+
+    def __delitem__(self, key):
+        del self.entries[key]
+
+    def __contains__(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and not self._expired(entry[0])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def pop(self, key, default = None):
+        entry = self.entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def items(self):
+        return [(key, entry[1]) for key, entry in self.entries.items()]
+
+    def values(self):
+        return [entry[1] for entry in self.entries.values()]
+
+    def copy(self):
+        """Function | Copy Cache
+
+        Returns a copy of the cache which can be changed (or pickled)
+        independently of the original. Values are shared, not copied.
+        """
+        cache = copy.copy(self)
+        cache.entries = self.entries.copy()
+        return cache
+
+    def trim(self):
+        """Function | Enforce Limits
+
+        Drop expired entries from the least recently used end, then
+        evict entries until the cache is within `max_size`.
+        """
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if not self._expired(entry[0]):
+                break
+            del self.entries[key]
+            self.expirations += 1
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+    def stats(self):
+        """Function | Cache Statistics
+
+        Returns a dict of the hit, miss, eviction and expiry counts
+        along with the current size of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self)
+        }
+
+class ProfileCache(LRUCache):
+    """Class | Profile Cache
+
+    The cache of Hyper Scape profiles, keyed by lowercased player name.
+
+    Profiles which are pinned (those linked to a Discord user) are held
+    separately, never evicted and never expire. Every other profile,
+    such as those looked up through `search`, is subject to the
+    LRU size limit and TTL.
+
+    A `loader` can be set to read profiles which are not in memory from
+    storage. It is called with the key, and returns a tuple of the time
+    the profile was stored and the profile, or `None`.
+
+    Args
+    ----------
+    max_size - The maximum number of unpinned profiles to hold.
+    ttl - Seconds an unpinned profile is kept after being stored.
+    """
+    def __init__(self, max_size = 500, ttl = None):
+        super().__init__(max_size, ttl)
+        self.pinned = set()
+        self.pinned_entries = {}
+        self.loader = None
+        self.loads = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['loader'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('loader', None)
+        self.__dict__.setdefault('loads', 0)
+
+    def _lookup(self, key):
+        entry = self.pinned_entries.get(key)
+        if entry is not None:
+            return entry
+        entry = super()._lookup(key)
+        if entry is None and self.loader is not None:
+            entry = self.load(key)
+        return entry
+
+    def load(self, key):
+        """Function | Load Profile
+
+        Read the profile for the key from storage into the cache.
+        Returns the (stored_at, profile) entry, or `None`.
+        """
+        entry = self.loader(key)
+        if entry is None:
+            return None
+        if key in self.pinned:
+            self.pinned_entries[key] = entry
+        elif self._expired(entry[0]):
+            return None
+        else:
+            self.entries[key] = entry
+            self.trim()
+        self.loads += 1
+        return entry
+
+    def peek(self, key, default = None):
+        entry = self.pinned_entries.get(key)
+        if entry is not None:
+            return entry[1]
+        return super().peek(key, default)
+
+    def __setitem__(self, key, value):
+        if key in self.pinned:
+            self.pinned_entries[key] = (time.time(), value)
+        else:
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        if key in self.pinned_entries:
+            del self.pinned_entries[key]
+        else:
+            super().__delitem__(key)
+
+    def __contains__(self, key):
+        return key in self.pinned_entries or super().__contains__(key) or (self.loader is not None and self.load(key) is not None)
+
+    def __len__(self):
+        return len(self.pinned_entries) + len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.pinned_entries) + list(self.entries))
+
+    def pop(self, key, default = None):
+        entry = self.pinned_entries.pop(key, None)
+        if entry is not None:
+            return entry[1]
+        return super().pop(key, default)
+
+    def items(self):
+        return [(key, entry[1]) for key, entry in self.pinned_entries.items()] + super().items()
+
+    def values(self):
+        return [entry[1] for entry in self.pinned_entries.values()] + super().values()
+
+    def copy(self):
+        cache = super().copy()
+        cache.pinned = set(self.pinned)
+        cache.pinned_entries = dict(self.pinned_entries)
+        return cache
+
+    def pin(self, key):
+        """Function | Pin Profile
+
+        Keep the profile for the key from being evicted or expiring.
+        The key may be pinned before its profile is cached.
+        """
+        self.pinned.add(key)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.pinned_entries[key] = entry
+
+    def unpin(self, key):
+        """Function | Unpin Profile
+
+        Return the profile for the key to the LRU part of the cache,
+        as the most recently used entry.
+        """
+        self.pinned.discard(key)
+        entry = self.pinned_entries.pop(key, None)
+        if entry is not None:
+            self.entries[key] = entry
+            self.trim()
+
+    def set_pinned(self, keys):
+        """Function | Replace Pinned Set
+
+        Pin exactly the given keys, unpinning any others.
+        """
+        keys = set(keys)
+        for key in self.pinned - keys:
+            self.unpin(key)
+        for key in keys - self.pinned:
+            self.pin(key)
+
+    def stats(self):
+        stats = super().stats()
+        stats["pinned"] = len(self.pinned_entries)
+        stats["loads"] = self.loads
+        return stats
+
+class BloomFilter:
+    """Class | Bloom Filter
+
+    A compact, fixed size set of keys. It never misses a key that was
+    added, but may claim to hold a key that was not (a false positive),
+    at about `error_rate` once `capacity` keys have been added.
+
+    Args
+    ----------
+    capacity - The number of keys the filter is sized for.
+    error_rate - The false positive rate once `capacity` keys are added.
+    """
+    def __init__(self, capacity = 10000, error_rate = 0.01):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, key):
+        # Double hashing, deriving every index from the two halves of one digest.
+        digest = hashlib.blake2b(repr(key).encode(), digest_size = 16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for index in self._indexes(key):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(key))
+
+    def fill_ratio(self):
+        """Function | Fill Ratio
+
+        Returns the fraction of bits which are set. The false positive
+        rate is about this ratio to the power of the number of hashes.
+        """
+        return bin(int.from_bytes(self.bits, 'little')).count('1') / self.size
+
+class NegativeCache:
+    """Class | Negative Cache
+
+    Remembers keys which were looked up and found not to exist, so the
+    lookup does not have to be repeated, e.g. names a search found no
+    player for.
+
+    Keys are held in two Bloom filters, so the cache stays the same small
+    size no matter how many keys are added. New keys go into the current
+    filter, which replaces the previous one every `ttl / 2` seconds, or
+    as soon as it is full. Keys are therefore remembered for at most `ttl`
+    seconds, and the false positive rate never grows past `error_rate`.
+
+    A false positive makes a key that exists look missing. They are
+    counted whenever a key the cache holds is confirmed to exist.
+
+    Args
+    ----------
+    capacity - The number of keys each filter is sized for.
+    error_rate - The false positive rate of a full filter.
+    ttl - The most seconds a key is remembered for.
+    """
+    def __init__(self, capacity = 10000, error_rate = 0.01, ttl = 300):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.ttl = ttl
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.rotated_at = time.monotonic()
+
+        self.checks = 0
+        self.hits = 0
+        self.false_positives = 0
+        self.rotations = 0
+
+    def rotate(self):
+        """Function | Rotate Filters
+
+        Replace the previous filter with the current one, forgetting
+        the keys of the previous filter, and start a new current filter.
+        """
+        self.previous = self.current
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.rotated_at = time.monotonic()
+        self.rotations += 1
+
+    def _expire(self):
+        if time.monotonic() - self.rotated_at >= self.ttl / 2:
+            self.rotate()
+            if time.monotonic() - self.rotated_at >= self.ttl / 2:
+                self.rotate()
+
+    def _holds(self, key):
+        self._expire()
+        return key in self.current or key in self.previous
+
+    def add(self, key):
+        """Function | Add Missing Key
+
+        Remember that the key was found not to exist.
+        """
+        self._expire()
+        if self.current.count >= self.capacity:
+            self.rotate()
+        self.current.add(key)
+
+    def __contains__(self, key):
+        self.checks += 1
+        if self._holds(key):
+            self.hits += 1
+            return True
+        return False
+
+    def confirm(self, key):
+        """Function | Confirm Key Exists
+
+        Called when a key is known to exist. Counts a false positive if
+        the cache would have claimed the key does not exist.
+        """
+        if self._holds(key):
+            self.false_positives += 1
+
+    def stats(self):
+        """Function | Negative Cache Statistics
+
+        Returns a dict of the check, hit, false positive and rotation
+        counts, along with how full the current filter is.
+        """
+        return {
+            "checks": self.checks,
+            "hits": self.hits,
+            "false positives": self.false_positives,
+            "rotations": self.rotations,
+            "size": self.current.count,
+            "fill ratio": f"{self.current.fill_ratio():.2%}"
+        }
+
+class RenderCache(LRUCache):
+    """Class | Render Cache
+
+    An LRUCache of rendered responses, e.g. the payloads of embeds,
+    so a response shown again for an unchanged profile is not rebuilt.
+
+    Keys should include everything the response is rendered from, such
+    as the profile's player ID and refresh time and the embed settings,
+    so a changed profile or setting is simply a new key and stale
+    renders are never read, only evicted.
+
+    The time spent rendering on misses and reading on hits is counted,
+    so the time saved by the cache can be estimated.
+
+    Args
+    ----------
+    max_size - The maximum number of renders to hold.
+    """
+    def __init__(self, max_size = 1000):
+        super().__init__(max_size)
+        self.render_time = 0
+        self.hit_time = 0
+
+    def render(self, key, build, thaw = None):
+        """Function | Cached Render
+
+        Returns the render stored for the key, or calls `build` to
+        render it and stores the result. `thaw`, if given, is applied
+        to the stored render before it is returned, e.g. to build an
+        object that can be changed without changing the stored render.
+        """
+        start = time.perf_counter()
+        rendered = self.get(key)
+        if rendered is None:
+            rendered = build()
+            self[key] = rendered
+            result = thaw(rendered) if thaw else rendered
+            self.render_time += time.perf_counter() - start
+        else:
+            result = thaw(rendered) if thaw else rendered
+            self.hit_time += time.perf_counter() - start
+        return result
+
+    def stats(self):
+        """Function | Render Cache Statistics
+
+        Returns the LRUCache statistics, the hit ratio, the average
+        time of a render and of a hit, and the estimated time saved.
+        """
+        stats = super().stats()
+        lookups = self.hits + self.misses
+        average_render = self.render_time / self.misses if self.misses else 0
+        average_hit = self.hit_time / self.hits if self.hits else 0
+        stats["hit ratio"] = f"{self.hits / lookups if lookups else 0:.2%}"
+        stats["render"] = f"{average_render * 1000:.3f} ms"
+        stats["hit"] = f"{average_hit * 1000:.3f} ms"
+        stats["saved"] = f"{max(0, average_render * self.hits - self.hit_time) * 1000:.1f} ms"
+        return stats
@@ -0,0 +1,511 @@
+"""Resource | Concurrency
+
+This file hosts classes which control how much concurrent
+work is sent upstream to the Hyper Scape API. More details
+provided for each.
+"""
+import asyncio
+import time
+from collections import Counter, deque
+
+# Priority lanes of the rate limiter, interactive commands go ahead of background work.
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITIES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+class SingleFlight:
+    """Class | Single Flight
+
+    Coalesces concurrent calls which share a key, so that only the
+    first caller does the work, and every other caller which arrives
+    while it is still running awaits that same result instead of
+    repeating the work.
+
+    Keys are tuples, the first element of which is the kind of work
+    being done (e.g. `search` or `player`), used for the counters.
+    """
+    def __init__(self):
+        self.inflight = {}
+        self.calls = Counter()
+        self.coalesced = Counter()
+
+    async def do(self, key, func, *args, **kwargs):
+        """Function | Run Once Per Key
+
+        Run `func(*args, **kwargs)` unless a call with the same key
+        is already in flight, in which case wait for that one instead.
+
+        Args
+        ----------
+        key - A hashable tuple identifying the work, kind first.
+        func - The coroutine function doing the work.
+        """
+        self.calls[key[0]] += 1
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            self.inflight[key] = future
+            future.add_done_callback(lambda f: self._finish(key, f))
+        else:
+            self.coalesced[key[0]] += 1
+
+        # Shielded so that one caller giving up does not cancel the work for the others.
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        # Mark any exception as retrieved, in case every caller has since given up.
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self):
+        """Function | Coalescing Statistics
+
+        Returns a dict per kind of work with the number of calls made
+        and how many of them were coalesced into an earlier call.
+        """
+        return {
+            kind: {
+                "calls": self.calls[kind],
+                "coalesced": self.coalesced[kind]
+            }
+            for kind in self.calls
+        }
+
+class RateLimited(Exception):
+    """Class | Rate Limited
+
+    Raised when a request would have to wait for the rate limiter
+    longer than its lane allows.
+
+    Args
+    ----------
+    wait - The estimated number of seconds the request would have waited.
+    """
+    def __init__(self, wait):
+        super().__init__(f"Request would wait {wait:.1f}s for the rate limit.")
+        self.wait = wait
+
+class RateLimiter:
+    """Class | Rate Limiter
+
+    A token bucket limiting how many requests are sent upstream, allowing
+    `rate` requests per second on average, in bursts of up to `burst`.
+
+    Requests which find the bucket empty queue in their priority lane.
+    Whenever a token becomes available it goes to the oldest request of
+    the highest priority lane, so interactive commands are never stuck
+    behind background work.
+
+    A request whose estimated wait is longer than the `max_wait` of its
+    lane is rejected straight away with `RateLimited`, rather than
+    leaving the command hanging. Since higher priority requests can
+    still overtake a queued one, every queued request also has a
+    deadline of `max_wait` seconds, and is rejected with `RateLimited`
+    if it has not been granted a token by then.
+
+    Args
+    ----------
+    rate - The average number of requests allowed per second.
+    burst - The most requests allowed at once after a quiet period.
+    max_wait - A dict of the most seconds a request of each priority may wait.
+    """
+    def __init__(self, rate = 5, burst = 10, max_wait = None):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait or {INTERACTIVE: 5, BACKGROUND: 60}
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lanes = {priority: deque() for priority in sorted(PRIORITIES)}
+        self.wakeup = None
+
+        self.granted = Counter()
+        self.rejected = Counter()
+        self.waited = Counter()
+        self.longest_wait = Counter()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _ahead(self, priority):
+        """Returns how many queued requests would be served before a new one of the priority."""
+        return sum(len(lane) for lane_priority, lane in self.lanes.items() if lane_priority <= priority)
+
+    async def acquire(self, priority = INTERACTIVE):
+        """Function | Acquire Token
+
+        Wait until a request of the given priority may be sent.
+
+        Raises `RateLimited` if the request would wait longer than its
+        lane's `max_wait`, or is still queued once it has waited that long.
+
+        Args
+        ----------
+        priority - Either `INTERACTIVE` or `BACKGROUND`.
+        """
+        self._refill()
+        ahead = self._ahead(priority)
+        if ahead == 0 and self.tokens >= 1:
+            self.tokens -= 1
+            self.granted[priority] += 1
+            return
+
+        wait = (ahead + 1 - self.tokens) / self.rate
+        if wait > self.max_wait[priority]:
+            self.rejected[priority] += 1
+            raise RateLimited(wait)
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self.lanes[priority].append(waiter)
+        self._schedule()
+        deadline = asyncio.get_running_loop().call_later(self.max_wait[priority], self._expire, priority, waiter)
+        try:
+            await waiter
+        except RateLimited:
+            self.rejected[priority] += 1
+            raise
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Granted just as it was cancelled, so hand the token back.
+                self.tokens += 1
+                self._schedule()
+            elif waiter in self.lanes[priority]:
+                # Still queued, so stop it counting towards the wait of later requests.
+                self.lanes[priority].remove(waiter)
+            raise
+        finally:
+            deadline.cancel()
+
+        waited = time.monotonic() - start
+        self.granted[priority] += 1
+        self.waited[priority] += waited
+        self.longest_wait[priority] = max(self.longest_wait[priority], waited)
+
+    def _expire(self, priority, waiter):
+        """Reject a request which is still queued at its deadline."""
+        if waiter.done():
+            return
+        lane = self.lanes[priority]
+        position = lane.index(waiter)
+        lane.remove(waiter)
+        self._refill()
+        wait = (self._ahead(priority - 1) + position + 1 - self.tokens) / self.rate
+        waiter.set_exception(RateLimited(max(0, wait)))
+
+    def _schedule(self):
+        if self.wakeup is None and any(self.lanes.values()):
+            delay = max(0, (1 - self.tokens) / self.rate)
+            self.wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        """Hand out every available token, highest priority lane first."""
+        self.wakeup = None
+        self._refill()
+        for lane in self.lanes.values():
+            while lane and self.tokens >= 1:
+                waiter = lane.popleft()
+                if not waiter.done():
+                    self.tokens -= 1
+                    waiter.set_result(None)
+        self._schedule()
+
+    def stats(self):
+        """Function | Rate Limiter Statistics
+
+        Returns a dict per priority lane with the number of requests
+        queued now, granted and rejected, and their average and
+        longest wait in seconds.
+        """
+        return {
+            name: {
+                "queued": len(self.lanes[priority]),
+                "granted": self.granted[priority],
+                "rejected": self.rejected[priority],
+                "average wait": self.waited[priority] / self.granted[priority] if self.granted[priority] else 0,
+                "longest wait": self.longest_wait[priority]
+            }
+            for priority, name in PRIORITIES.items()
+        }
+
+class CircuitBreaker:
+    """Class | Circuit Breaker
+
+    Stops requests being sent upstream while the upstream is failing,
+    so that commands fail fast instead of each waiting out timeouts.
+
+    The breaker starts `closed`, letting every request through. After
+    `failure_threshold` failures in a row it trips `open`, and every
+    request is refused. Once `reset_timeout` seconds have passed it is
+    `half-open`: a single trial request is let through, closing the
+    breaker again if it succeeds, or opening it for another
+    `reset_timeout` seconds if it fails.
+
+    `allow` gives every request a ticket, which is handed back with its
+    outcome. Only the ticket of the current trial request can close or
+    reopen the breaker, so requests which were already in flight when
+    it tripped cannot end the trial or close the breaker late.
+
+    Args
+    ----------
+    failure_threshold - How many failures in a row trip the breaker.
+    reset_timeout - Seconds the breaker stays open before a trial request.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    # The ticket of requests let through while the breaker is closed.
+    PASS = object()
+
+    def __init__(self, failure_threshold = 5, reset_timeout = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # The ticket of the trial request in flight, if any.
+        self.trial = None
+
+        self.trips = 0
+        self.refused = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _is_trial(self, ticket):
+        return ticket is not None and ticket is self.trial
+
+    def allow(self):
+        """Function | Allow Request
+
+        Returns a ticket if a request may be sent now, or `None` if it
+        is refused. In the `half-open` state only one trial request is
+        allowed at a time. The ticket must be passed to
+        `record_success`, `record_failure` or `release` once the
+        request is over.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return self.PASS
+        if state == self.HALF_OPEN and self.trial is None:
+            self.trial = object()
+            return self.trial
+        self.refused += 1
+        return None
+
+    def _trip(self):
+        self.trips += 1
+        self.opened_at = time.monotonic()
+
+    def record_success(self, ticket):
+        """Function | Record Success
+
+        Closes the breaker if the request was the trial. A success from
+        a request sent before the breaker tripped only resets the
+        failures in a row while the breaker is still closed.
+
+        Args
+        ----------
+        ticket - The ticket `allow` gave the request.
+        """
+        if self._is_trial(ticket):
+            self.trial = None
+            self.opened_at = None
+            self.failures = 0
+        elif self.opened_at is None:
+            self.failures = 0
+
+    def record_failure(self, ticket):
+        """Function | Record Failure
+
+        Reopens the breaker if the request was the trial, or trips it
+        if it is closed and `failure_threshold` requests failed in a
+        row. Failures of requests sent before the breaker tripped are
+        otherwise ignored.
+
+        Args
+        ----------
+        ticket - The ticket `allow` gave the request.
+        """
+        if self._is_trial(ticket):
+            self.trial = None
+            self.failures += 1
+            self._trip()
+        elif self.opened_at is None:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self._trip()
+
+    def release(self, ticket):
+        """Function | Release Trial
+
+        End a request which neither succeeded nor failed upstream,
+        e.g. because it was cancelled. If it was the trial, another
+        can be tried.
+
+        Args
+        ----------
+        ticket - The ticket `allow` gave the request.
+        """
+        if self._is_trial(ticket):
+            self.trial = None
+
+    def stats(self):
+        """Function | Circuit Breaker Statistics
+
+        Returns a dict of the current state, the failures in a row, how
+        often the breaker tripped, and how many requests it refused.
+        """
+        state = self.state
+        stats = {
+            "state": state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "refused": self.refused
+        }
+        if state == self.OPEN:
+            stats["retry in"] = self.reset_timeout - (time.monotonic() - self.opened_at)
+        return stats
+
+class AdaptiveLimiter:
+    """Class | Adaptive Concurrency Limiter
+
+    Limits how many requests are in flight upstream at once, adapting
+    the limit to how the upstream is coping (AIMD).
+
+    The latency and success of every request is recorded. After each
+    `window` requests, if the average latency and the error rate were
+    within their targets and the limit was reached at some point, the
+    limit grows by `increase`. If either target was missed, the limit
+    is multiplied by `decrease`. The limit therefore creeps up while
+    the upstream is healthy, and backs off quickly when it degrades.
+    Requests already in flight when the limit is decreased are not
+    recorded, so one slow spell only decreases the limit once.
+
+    Every change of the limit is kept in `history`, as a tuple of the
+    time of the change and the new limit.
+
+    Args
+    ----------
+    initial - The limit to start with.
+    minimum - The lowest the limit can go.
+    maximum - The highest the limit can go.
+    latency_target - The highest average latency in seconds to grow the limit at.
+    error_target - The highest error rate to grow the limit at.
+    window - How many requests are recorded between adjustments.
+    increase - How much the limit grows by.
+    decrease - The factor the limit shrinks by.
+    history - How many changes of the limit to remember.
+    """
+    def __init__(self, initial = 4, minimum = 1, maximum = 10, latency_target = 1.0, error_target = 0.1,
+                 window = 10, increase = 1, decrease = 0.5, history = 50):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.error_target = error_target
+        self.window = window
+        self.increase = increase
+        self.decrease = decrease
+
+        self.inflight = 0
+        self.stale = 0
+        self.waiters = deque()
+        self.samples = []
+        self.saturated = False
+        self.history = deque([(time.time(), initial)], maxlen = history)
+
+        self.increases = 0
+        self.decreases = 0
+        self.last_latency = 0
+        self.last_error_rate = 0
+
+    async def acquire(self):
+        """Function | Acquire Slot
+
+        Wait until fewer requests than the limit are in flight. Every
+        call must be followed by a call to `release`.
+        """
+        if self.inflight >= int(self.limit) or self.waiters:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Handed a slot just as it was cancelled, so pass it on.
+                    self.inflight -= 1
+                    self._wake()
+                raise
+        else:
+            self.inflight += 1
+        if self.inflight >= int(self.limit):
+            self.saturated = True
+
+    def release(self, latency = None, failed = False):
+        """Function | Release Slot
+
+        Free the slot of a finished request, recording how long it took
+        and whether it failed upstream. Requests which were cancelled
+        are released with no latency, and not recorded.
+        """
+        self.inflight -= 1
+        if self.stale:
+            # Sent before the limit was last decreased, so it says nothing about the new limit.
+            self.stale -= 1
+        elif latency is not None:
+            self.samples.append((latency, failed))
+            if len(self.samples) >= self.window:
+                self._adjust()
+        self._wake()
+
+    def _wake(self):
+        while self.waiters and self.inflight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def _adjust(self):
+        self.last_latency = sum(latency for latency, failed in self.samples) / len(self.samples)
+        self.last_error_rate = sum(failed for latency, failed in self.samples) / len(self.samples)
+        self.samples = []
+
+        limit = self.limit
+        if self.last_latency > self.latency_target or self.last_error_rate > self.error_target:
+            limit = max(self.minimum, limit * self.decrease)
+            self.decreases += 1
+            self.stale = self.inflight
+        elif self.saturated:
+            # Only grow while the limit is what holds requests back.
+            limit = min(self.maximum, limit + self.increase)
+            self.increases += 1
+        self.saturated = False
+
+        if int(limit) != int(self.limit):
+            self.history.append((time.time(), int(limit)))
+        self.limit = limit
+
+    def stats(self):
+        """Function | Concurrency Statistics
+
+        Returns a dict of the current limit, the requests in flight and
+        waiting, the average latency and error rate of the last window,
+        and how often the limit was increased and decreased.
+        """
+        return {
+            "limit": int(self.limit),
+            "in flight": self.inflight,
+            "waiting": len(self.waiters),
+            "latency": self.last_latency,
+            "error rate": self.last_error_rate,
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
@@ -3,12 +3,24 @@
 This class manages all of the loading and
 saving of the config, permissions, and data.
 """
-import pickle
+import asyncio
 import os
-import aiohttp
 from discord import Color
 from colorama import Fore
 import datetime
+from collections import namedtuple
+
+from Resources.Cache import LRUCache, NegativeCache, ProfileCache
+from Resources.APISession import REFRESH_INTERVAL, APIError
+from Resources.History import HistoryStore
+from Resources.Leaderboard import GuildLeaderboards, Leaderboards
+from Resources.Permissions import compile_permissions
+from Resources.StatMatrix import StatMatrix
+from Resources.Concurrency import BACKGROUND, INTERACTIVE, CircuitBreaker, SingleFlight
+from Resources.Storage import JournalStorage, PickleStorage, SQLiteStorage
+
+# How stale a cached profile a command will answer with, and whether to refresh it in the background.
+FreshnessPolicy = namedtuple('FreshnessPolicy', ['max_staleness', 'revalidate'])
 
 class DataManager:
     """Class | Data Manager
@@ -24,6 +36,13 @@ class DataManager:
     """
     def __init__(self, bot):
         self.bot = bot
+        self.inflight = SingleFlight()
+        self.storage = None
+        self.not_found = None
+        self.leaderboards = None
+        self.guild_leaderboards = None
+        self.stat_matrix = None
+        self.history = None
 
     def load_config(self):
         """Setup | Bot Config
@@ -44,12 +63,88 @@ class DataManager:
         self.bot.online_message      = config['Online Message']
         self.bot.restarting_message  = config['Restarting Message']
         self.bot.data_file           = os.path.abspath(config['Data File'])
+        self.bot.save_delay          = config['Save Delay']
+        self.bot.storage_backend     = config['Storage']
+        self.bot.database_file       = os.path.abspath(config['Database File'])
+        self.bot.journal_max_size    = config['Journal']['Max Size']
+        self.bot.journal_compact_interval = config['Journal']['Compact Interval']
+
+        # History Settings
+        self.bot.history_file        = os.path.abspath(config['History']['File'])
+        self.bot.history_full_resolution = config['History']['Full Resolution']
+        self.bot.history_hourly_until = config['History']['Hourly Until']
+        self.bot.history_keyframe_interval = config['History']['Keyframe Interval']
         self.bot.show_game_status    = config['Game Status']['Active']
         self.bot.game_to_show        = config['Game Status']['Game']
         self.bot.log_channel_id      = config['Log Channel']
         self.bot.broken_user_id      = config['Broken User ID']
         self.bot.invite_link         = config['Server Invite']
 
+        # API Settings
+        self.bot.api_keepalive       = config['API Settings']['Keep Alive']
+        self.bot.api_limit_per_host  = config['API Settings']['Connections Per Host']
+        self.bot.api_dns_cache_ttl   = config['API Settings']['DNS Cache TTL']
+        self.bot.api_warm_up         = config['API Settings']['Warm Up']
+
+        # Rate Limit Settings
+        self.bot.api_rate            = config['Rate Limit']['Requests Per Second']
+        self.bot.api_burst           = config['Rate Limit']['Burst']
+        self.bot.api_max_wait        = {
+            INTERACTIVE: config['Rate Limit']['Max Wait']['Interactive'],
+            BACKGROUND: config['Rate Limit']['Max Wait']['Background']
+        }
+
+        # Request Settings
+        self.bot.api_timeouts        = {kind.lower(): timeout for kind, timeout in config['Request Settings']['Timeouts'].items()}
+        self.bot.api_retries         = config['Request Settings']['Retries']
+        self.bot.api_backoff_base    = config['Request Settings']['Backoff Base']
+        self.bot.api_backoff_cap     = config['Request Settings']['Backoff Cap']
+        self.bot.api_failure_threshold = config['Request Settings']['Failure Threshold']
+        self.bot.api_reset_timeout   = config['Request Settings']['Reset Timeout']
+
+        # Refresh Polling Settings
+        self.bot.api_refresh_deadline = config['Refresh Polling']['Deadline']
+        self.bot.api_refresh_poll_base = config['Refresh Polling']['Poll Base']
+        self.bot.api_refresh_poll_cap = config['Refresh Polling']['Poll Cap']
+
+        # Hedging Settings
+        self.bot.api_hedging         = config['Hedging']['Enabled']
+        self.bot.api_hedge_rate      = config['Hedging']['Max Rate']
+        self.bot.api_hedge_min_samples = config['Hedging']['Min Samples']
+
+        # Adaptive Concurrency Settings
+        self.bot.api_concurrency_initial = config['Adaptive Concurrency']['Initial Limit']
+        self.bot.api_concurrency_minimum = config['Adaptive Concurrency']['Minimum Limit']
+        self.bot.api_concurrency_maximum = config['Adaptive Concurrency']['Maximum Limit']
+        self.bot.api_latency_target  = config['Adaptive Concurrency']['Latency Target']
+        self.bot.api_error_target    = config['Adaptive Concurrency']['Error Target']
+        self.bot.api_concurrency_window = config['Adaptive Concurrency']['Window']
+
+        # Profile Cache Settings
+        self.bot.profile_cache_size  = config['Profile Cache']['Max Size']
+        self.bot.profile_cache_ttl   = config['Profile Cache']['TTL']
+
+        # Player ID Cache Settings
+        self.bot.player_id_cache_size = config['Player ID Cache']['Max Size']
+        self.bot.player_id_cache_ttl  = config['Player ID Cache']['TTL']
+
+        # Render Cache Settings
+        self.bot.render_cache_size   = config['Render Cache']['Max Size']
+
+        # Negative Cache Settings
+        self.bot.negative_cache_ttl   = config['Negative Cache']['TTL']
+        self.bot.negative_cache_capacity = config['Negative Cache']['Capacity']
+        self.bot.negative_cache_error_rate = config['Negative Cache']['False Positive Rate']
+
+        # Freshness Policies
+        self.bot.freshness = {
+            command: FreshnessPolicy(
+                datetime.timedelta(seconds = policy['Max Staleness']),
+                policy['Revalidate']
+            )
+            for command, policy in config['Freshness'].items()
+        }
+
         # Embed Options
         self.bot.embed_color = Color.from_rgb(
             config['Embed Settings']['Color']['r'],
@@ -73,528 +168,420 @@ class DataManager:
 
         Loading Permission variables into bot attributes.
 
+        The permissions are compiled into a dict of each command's
+        qualified name to the set of role IDs allowed to use it, see
+        './Resources/Permissions.py'.
+
         See 'Permissions.yml' for specifics on each setting.
         """
-        bot_permissions = {}
         with open("./Permissions.yml", 'r') as file:
             permissions = self.bot.yaml.load(file)
-            # Raw permission input is formatted to have role IDs in place.
-            roles = dict(permissions['Roles'])
-            for key in permissions.keys():
-                if not key in (None, 'Roles'):
-                    bot_permissions[key] = []
-                    for permission in permissions[key]:
-                        bot_permissions[key].append(permission.format(**roles))
 
-        self.bot.permissions = permissions
+        self.bot.permissions = compile_permissions(permissions)
 
     def save_data(self):
         """Data | Saving
 
-        Open the data file and save the bot's data to it.
+        Mark all of the bot's data as changed, to be saved by the storage backend.
 
-        Overwrites previous data in file.
+        Prefer `record_change` where only a single entry changed.
         """
-        with open(self.bot.data_file, 'wb+') as save_file:
-            try:
-                pickle.dump(self.bot.data, save_file)
-            except Exception as e:
-                print('Could not save data: ' + str(e))
+        self.storage.save()
+
+    def record_change(self, section, key, value):
+        """Data | Record Change
+
+        Save a single change to the bot's data.
+
+        Args
+        ----------
+        section - Which data changed, either `profiles`, `discords`, `ids` or `leaderboard`.
+        key - The key of the entry that changed.
+        value - The new value of the entry, or `None` if it was removed.
+        """
+        self.storage.record(section, key, value)
+
+    def flush_data(self):
+        """Data | Flush
+
+        Save any unsaved changes straight away. Used when the bot is shutting down.
+        """
+        self.storage.flush()
+        self.history.flush()
 
     def load_data(self):
         """Data | Loading
 
-        Check if the data file exists, if it does, load it, if not, create it.
+        Create the storage backend set in the config, and load the bot's data from it.
 
-        If the data file exists but has not data, give it a new empty data object.
+        'pickle' keeps all data in the data file, 'journal' keeps a snapshot in
+        the data file plus a journal of changes, and 'sqlite' keeps it in the
+        database file, importing the data file the first time it is used.
         """
-        if os.path.exists(self.bot.data_file):
-            with open(self.bot.data_file, 'rb') as file:
-                #content = file.read()
-                #if len(content) == 0:
-                #    self.bot.data = {}
-                #    self.save_data()
-                #else:
-                #    self.bot.data = json.loads(content)
-                self.bot.data = pickle.load(file)
+        if self.bot.storage_backend == 'sqlite':
+            self.storage = SQLiteStorage(self.bot)
+        elif self.bot.storage_backend == 'journal':
+            self.storage = JournalStorage(self.bot)
         else:
-            self.bot.data = {}
+            self.storage = PickleStorage(self.bot)
+
+        self.bot.data = self.storage.load()
+        self.history = HistoryStore(self.bot)
+        self.prepare_user_data()
+
+    def prepare_user_data(self):
+        """Data | Hyperscape User Data
+
+        Make sure the Hyperscape user data exists, and that profiles are
+        held in a ProfileCache using the configured size and TTL, with
+        every profile linked to a Discord user pinned. Player IDs found
+        by name are held in an LRUCache, and names which were not found
+        in a NegativeCache, see `resolve_player_id`. The leaderboards are
+        built from the linked profiles, and each guild's leaderboards once
+        its members are known, see `index_guild`. The stats of the linked
+        profiles are also kept in a StatMatrix, for server-wide analytics.
+
+        Data saved before the caches existed holds profiles in a plain dict,
+        which is converted here.
+        """
+        changed = False
+        if not 'HyperscapeUsers' in self.bot.data.keys():
+            self.bot.data['HyperscapeUsers'] = {"profiles": {}, "discords": {}}
+            changed = True
+
+        users = self.bot.data['HyperscapeUsers']
+        ids = users.get('ids')
+        if not isinstance(ids, LRUCache):
+            ids = LRUCache()
+            for key, player_id in (users.get('ids') or {}).items():
+                ids[key] = player_id
+            users['ids'] = ids
+            changed = True
+        ids.max_size = self.bot.player_id_cache_size
+        ids.ttl = self.bot.player_id_cache_ttl
+        ids.trim()
+
+        # Names which were not found are only remembered briefly, so they are not saved.
+        self.not_found = NegativeCache(
+            self.bot.negative_cache_capacity,
+            self.bot.negative_cache_error_rate,
+            self.bot.negative_cache_ttl
+        )
+
+        profiles = users['profiles']
+        if not isinstance(profiles, ProfileCache):
+            profiles = ProfileCache()
+            profiles.set_pinned(name.lower() for name in users['discords'].values())
+            for key, profile in users['profiles'].items():
+                profiles[key] = profile
+            changed = changed or bool(users['profiles'])
+            users['profiles'] = profiles
+
+        profiles.max_size = self.bot.profile_cache_size
+        profiles.ttl = self.bot.profile_cache_ttl
+        profiles.loader = self.storage.load_profile
+        profiles.set_pinned(name.lower() for name in users['discords'].values())
+        profiles.trim()
+
+        # Linked profiles are always needed, so load any which storage has not already.
+        for key in profiles.pinned:
+            if not key in profiles.pinned_entries:
+                profiles.load(key)
+
+        self.leaderboards = Leaderboards()
+        self.leaderboards.rebuild((key, profiles.peek(key)) for key in profiles.pinned)
+        self.guild_leaderboards = GuildLeaderboards()
+        self.stat_matrix = StatMatrix()
+        self.stat_matrix.rebuild((key, profiles.peek(key)) for key in profiles.pinned)
+
+        if changed:
             self.save_data()
 
-    async def update_user_cache(self, name, platform = "uplay"):
+    def link_discord(self, discord_id, profile):
+        """Function | Link Discord User
+
+        Link a Discord user to a Hyper Scape profile, pinning the profile
+        in the cache and ranking it on the leaderboards, overall and in
+        every guild the user is a member of, and unpinning the previously
+        linked profile if no other Discord user is linked to it.
+
+        Args
+        ----------
+        discord_id - The ID of the Discord user.
+        profile - An instance of the Profile class found in './Resources/APISession.py'
+        """
+        users = self.bot.data['HyperscapeUsers']
+        previous = users['discords'].get(discord_id)
+        users['discords'][discord_id] = profile.player_name
+        self.record_change('discords', discord_id, profile.player_name)
+
+        key = profile.player_name.lower()
+        users['profiles'].pin(key)
+        self.put_profile(key, profile)
+        for guild in self.bot.guilds:
+            if guild.get_member(discord_id):
+                self.add_guild_member(guild.id, discord_id)
+        if previous and previous.lower() != key and not previous.lower() in (name.lower() for name in users['discords'].values()):
+            users['profiles'].unpin(previous.lower())
+            self.leaderboards.remove(previous.lower())
+            self.stat_matrix.remove(previous.lower())
+
+    def put_profile(self, key, profile):
+        """Function | Store Profile
+
+        Store a profile in the profile cache, and save it. The player ID
+        of the profile's name is remembered as well, and linked profiles
+        are moved to their new place on the leaderboards, their row of the
+        stat matrix is updated in place, and a snapshot of their stats is
+        added to their history.
+
+        Args
+        ----------
+        key - The lowercased name the profile is cached under.
+        profile - An instance of the Profile class found in './Resources/APISession.py'
+        """
+        self.bot.data['HyperscapeUsers']['profiles'][key] = profile
+        self.record_change('profiles', key, profile)
+        if key in self.bot.data['HyperscapeUsers']['profiles'].pinned:
+            self.leaderboards.update(key, profile)
+            self.guild_leaderboards.update(key, profile)
+            self.stat_matrix.update(key, profile)
+            self.history.record(profile)
+        self.put_player_id(profile.platform, profile.player_name, profile.player_id)
+
+    def put_player_id(self, platform, name, player_id):
+        """Function | Store Player ID
+
+        Remember the player ID of a name, and save it if it changed.
+
+        Args
+        ----------
+        platform - The platform the name was searched on.
+        name - The player name, or the name searched for.
+        player_id - The ID of the player's profile.
+        """
+        ids = self.bot.data['HyperscapeUsers']['ids']
+        key = (platform, name.lower())
+        self.not_found.confirm(key)
+        if ids.peek(key) != player_id:
+            ids[key] = player_id
+            self.record_change('ids', key, player_id)
+
+    def forget_player_id(self, platform, name):
+        """Function | Forget Player ID
+
+        Drop the remembered player ID of a name, e.g. once it no longer
+        leads to a profile.
+        """
+        key = (platform, name.lower())
+        if self.bot.data['HyperscapeUsers']['ids'].pop(key) is not None:
+            self.record_change('ids', key, None)
+
+    async def resolve_player_id(self, name, platform = "uplay", priority = INTERACTIVE):
+        """Function | Resolve Player ID
+
+        Find the player ID for a name. The ID is taken from the player ID
+        cache where possible, saving the search request entirely.
+
+        Otherwise the name is searched for, and the IDs of every player
+        found are cached, not only the best match. The best match is
+        also cached under the name searched for, so searching for the
+        same name again is answered from the cache as well.
+
+        Names a search found nobody for are remembered for a short while,
+        and searching for them again is answered without a request.
+
+        Returns a tuple of the player ID (or `None` if nobody was found)
+        and whether it came from the cache.
+
+        Args
+        ----------
+        name - The profile name to look up
+        platform - The platform the user's profile is on, either `uplay`,
+            `xbl`, or `psn`.
+        priority - The rate limiter lane of the search request.
+        """
+        key = (platform, name.lower())
+        player_id = self.bot.data['HyperscapeUsers']['ids'].get(key)
+        if player_id is not None:
+            return player_id, True
+        if key in self.not_found:
+            return None, False
+
+        players = await self.bot.api.search_players(name, platform, priority)
+        if not players:
+            # Only remember names the search found nobody for, not failed searches.
+            if players is not None:
+                self.not_found.add(key)
+            return None, False
+
+        best = next(iter(players))
+        for found_id, found_name in players.items():
+            if found_name:
+                self.put_player_id(platform, found_name, found_id)
+                if found_name.lower() == name.lower():
+                    best = found_id
+        self.put_player_id(platform, name, best)
+        return best, False
+
+    async def fetch_profile(self, name, platform = "uplay", priority = INTERACTIVE):
+        """Function | Fetch Profile
+
+        Fetch the profile of a name from the API, refreshing it first if
+        it is due to be refreshed, see `APISession.refresh_player_by_id`.
+
+        If a cached player ID no longer leads to a profile, it is dropped
+        and the name searched for again.
+
+        Returns the profile, or `None` if it could not be found.
+        """
+        player_id, cached = await self.resolve_player_id(name, platform, priority)
+        if not player_id:
+            return None
+
+        profile = await self.bot.api.get_profile_by_id(player_id, priority)
+        if not (profile and profile.found):
+            if cached:
+                self.forget_player_id(platform, name)
+                return await self.fetch_profile(name, platform, priority)
+            return None
+
+        if profile.refresh_age > REFRESH_INTERVAL:
+            profile = await self.bot.api.refresh_player_by_id(player_id, profile.refresh_utime, priority) or profile
+        return profile
+
+    async def update_user_cache(self, name, platform = "uplay", priority = INTERACTIVE):
         """Function | Update User Stat Profile
 
         This function is used to handle the updating of the given name's
         stat data within the data cache. The data can only be updated every 10 minutes,
-        so this is how it is handled.
+        so this is how it is handled. A due update waits until the API has
+        refreshed the profile, up to the refresh deadline.
+
+        Returns the up to date profile, or `None` if it could not be found.
 
         Args
         ----------
         name - The profile name to update
         platform - The platform the user's profile is on, either `uplay`,
             `xbl`, or `psn`.
+        priority - The rate limiter lane of the API requests, `INTERACTIVE`
+            for commands or `BACKGROUND` for work nobody is waiting on.
+
+        Concurrent updates of the same name and priority share a single
+        update.
         """
-        if name.lower() in self.bot.data['HyperscapeUsers']['profiles']:
-            profile = self.bot.data['HyperscapeUsers']['profiles'][name.lower()]
-            if datetime.datetime.now() - datetime.timedelta(minutes = 10) > profile.last_refresh:
-                async with aiohttp.ClientSession() as session:
-                    await self.bot.api.update_player_by_id(session, profile.player_id)
-                    self.bot.data['HyperscapeUsers']['profiles'][name.lower()] = await self.bot.api.get_profile_by_id(session, profile.player_id)
-                    self.save_data()
-            return True
+        # The priority is part of the key, so an interactive caller never waits on a background update.
+        key = ('user', platform, name.lower(), priority)
+        return await self.inflight.do(key, self._update_user_cache, name, platform, priority)
+
+    async def _update_user_cache(self, name, platform, priority):
+        profiles = self.bot.data['HyperscapeUsers']['profiles']
+        profile = profiles.get(name.lower())
+        if profile:
+            if profile.refresh_age > REFRESH_INTERVAL:
+                refreshed = await self.bot.api.refresh_player_by_id(profile.player_id, profile.refresh_utime, priority)
+                if refreshed:
+                    profile = refreshed
+                    self.put_profile(name.lower(), profile)
+            return profile
         else:
-            profile = await self.bot.api.get_profile(name, platform)
+            profile = await self.fetch_profile(name, platform, priority)
             if profile:
-                self.bot.data['HyperscapeUsers']['profiles'][name.lower()] = profile
-                self.save_data()
-                return True
-            else:
-                return False
+                self.put_profile(name.lower(), profile)
+            return profile
+
+    async def get_user_profile(self, name, platform, command):
+        """Function | Get Profile For Command
 
-    def get_stat_category_fields(self, name, profile):
-        """Function | Get Stat Category Embed Fields
+        Get a profile following the freshness policy of a command.
 
-        This function returns a list of field elements to be used
-        in the created of embed responses when a user searches an entire stat
-        category instead of a singular stat.
+        A cached profile no older than the policy's maximum staleness is
+        returned straight away. If the policy revalidates and the profile
+        could be refreshed, a background refresh is started as well.
+        Otherwise the command waits for the profile to be updated.
+
+        If the profile can't be updated because the API is failing, the
+        cached profile is returned however stale it is.
+
+        Returns a tuple of the profile (or `None` if it could not be found)
+        and the background refresh task (or `None` if none was started),
+        which resolves to the refreshed profile.
 
         Args
         ----------
-        name - The name of the stat category being searched
-        profile - An instance of the Profile class found in './Resources/APISession.py'
+        name - The profile name to look up
+        platform - The platform the user's profile is on, either `uplay`,
+            `xbl`, or `psn`.
+        command - The name of the command, as listed under `Freshness` in the config.
         """
-        if name == "main":
-            fields = [
-                {
-                    "name": "Kills",
-                    "value": profile.kills,
-                    "inline": True
-                },
-                {
-                    "name": "Assists",
-                    "value": profile.assists,
-                    "inline": True
-                },
-                {
-                    "name": "KD",
-                    "value": profile.kd,
-                    "inline": True
-                },
-                {
-                    "name": "Wins",
-                    "value": profile.wins,
-                    "inline": True
-                },
-                {
-                    "name": "Losses",
-                    "value": profile.losses,
-                    "inline": True
-                },
-                {
-                    "name": "Winrate",
-                    "value": profile.winrate,
-                    "inline": True
-                },
-                {
-                    "name": "Crown Wins",
-                    "value": profile.crown_wins,
-                    "inline": True
-                },
-                {
-                    "name": "Crown Pickups",
-                    "value": profile.crown_pickups,
-                    "inline": True
-                },
-                {
-                    "name": "Crown Success",
-                    "value": profile.crown_pickup_success_rate,
-                    "inline": True
-                }
-            ]
-        elif name == "solo":
-            fields = [
-                {
-                    "name": "Solo Winrate",
-                    "value": profile.solo_winrate,
-                    "inline": True
-                },
-                {
-                    "name": "Solo Wins",
-                    "value": profile.solo_wins,
-                    "inline": True
-                },
-                {
-                    "name": "Solo Losses",
-                    "value": profile.solo_losses,
-                    "inline": True
-                },
-                {
-                    "name": "Solo Matches",
-                    "value": profile.solo_matches,
-                    "inline": True
-                },
-                {
-                    "name": "Crown Wins",
-                    "value": profile.solo_crown_wins,
-                    "inline": True
-                },
-                {
-                    "name": "Time Played",
-                    "value": profile.solo_time_played,
-                    "inline": True
-                }
-            ]
-        elif name == "squad":
-            fields = [
-                {
-                    "name": "Squad Winrate",
-                    "value": profile.squad_winrate,
-                    "inline": True
-                },
-                {
-                    "name": "Squad Wins",
-                    "value": profile.squad_wins,
-                    "inline": True
-                },
-                {
-                    "name": "Squad Losses",
-                    "value": profile.squad_losses,
-                    "inline": True
-                },
-                {
-                    "name": "Squad Matches",
-                    "value": profile.squad_matches,
-                    "inline": True
-                },
-                {
-                    "name": "Crown Wins",
-                    "value": profile.squad_crown_wins,
-                    "inline": True
-                },
-                {
-                    "name": "Time Played",
-                    "value": profile.squad_time_played,
-                    "inline": True
-                }
-            ]
-        elif name == "general":
-            fields = [
-                {
-                    "name": "Kills",
-                    "value": profile.kills,
-                    "inline": True
-                },
-                {
-                    "name": "Matches",
-                    "value": profile.matches,
-                    "inline": True
-                },
-                {
-                    "name": "Avg. Kills per Match",
-                    "value": profile.avg_kills_per_match,
-                    "inline": True
-                },
-                {
-                    "name": "Avg. Damage per Kill",
-                    "value": profile.avg_dmg_per_kill,
-                    "inline": True
-                },
-                {
-                    "name": "Headshot Accuracy",
-                    "value": profile.headshot_accuracy,
-                    "inline": True
-                },
-                {
-                    "name": "Headshot Damage",
-                    "value": profile.weapon_headshot_damage,
-                    "inline": True
-                },
-                {
-                    "name": "Weapon Damage",
-                    "value": profile.weapon_headshot_damage + profile.weapon_body_damage,
-                    "inline": True
-                },
-                {
-                    "name": "Hack Damage",
-                    "value": profile.damage_by_items,
-                    "inline": True
-                },
-                {
-                    "name": "Chests Broken",
-                    "value": profile.chests_broken,
-                    "inline": True
-                },
-                {
-                    "name": "Fusions",
-                    "value": profile.fusions,
-                    "inline": True
-                },
-                {
-                    "name": "Revives",
-                    "value": profile.revives,
-                    "inline": True
-                },
-                {
-                    "name": "Time Played",
-                    "value": profile.time_played,
-                    "inline": True
-                }
-            ]
-        elif name == "best":
-            fields = [
-                {
-                    "name": "Most Kills",
-                    "value": profile.careerbest_kills,
-                    "inline": True
-                },
-                {
-                    "name": "Long Range Kills",
-                    "value": profile.careerbest_long_range_final_blows,
-                    "inline": True
-                },
-                {
-                    "name": "Short Range Kills",
-                    "value": profile.careerbest_short_range_final_blows,
-                    "inline": True
-                },
-                {
-                    "name": "Damage Done",
-                    "value": profile.careerbest_damage_done,
-                    "inline": True
-                },
-                {
-                    "name": "Headshot Damage",
-                    "value": profile.careerbest_critical_damage,
-                    "inline": True
-                },
-                {
-                    "name": "Assists",
-                    "value": profile.careerbest_assists,
-                    "inline": True
-                },
-                {
-                    "name": "Healed",
-                    "value": profile.careerbest_healed,
-                    "inline": True
-                },
-                {
-                    "name": "Survival Time",
-                    "value": profile.careerbest_survival_time,
-                    "inline": True
-                },
-                {
-                    "name": "Items Fused",
-                    "value": profile.careerbest_item_fused,
-                    "inline": True
-                },
-                {
-                    "name": "Maximum Fusion",
-                    "value": profile.careerbest_fused_to_max,
-                    "inline": True
-                },
-                {
-                    "name": "Revealed",
-                    "value": profile.careerbest_revealed,
-                    "inline": True
-                }
-            ]
-        elif name == "weapons":
-            fields = [
-                {
-                    "name": f"{profile.dragonfly.name} Kills",
-                    "value": profile.dragonfly.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.mammoth.name} Kills",
-                    "value": profile.mammoth.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.ripper.name} Kills",
-                    "value": profile.ripper.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.dtap.name} Kills",
-                    "value": profile.dtap.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.harpy.name} Kills",
-                    "value": profile.harpy.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.komodo.name} Kills",
-                    "value": profile.komodo.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.hexfire.name} Kills",
-                    "value": profile.hexfire.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.riot.name} Kills",
-                    "value": profile.riot.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.salvo.name} Kills",
-                    "value": profile.salvo.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.skybreaker.name} Kills",
-                    "value": profile.skybreaker.kills,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.protocol.name} Kills",
-                    "value": profile.protocol.kills,
-                    "inline": True
-                }
-            ]
-        elif name == "hacks":
-            fields = [
-                {
-                    "name": f"{profile.mine.name} Fusions",
-                    "value": profile.mine.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.slam.name} Fusions",
-                    "value": profile.slam.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.shockwave.name} Fusions",
-                    "value": profile.shockwave.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.wall.name} Fusions",
-                    "value": profile.wall.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.heal.name} Fusions",
-                    "value": profile.heal.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.teleport.name} Fusions",
-                    "value": profile.teleport.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.ball.name} Fusions",
-                    "value": profile.ball.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.invis.name} Fusions",
-                    "value": profile.invis.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.armor.name} Fusions",
-                    "value": profile.armor.fusions,
-                    "inline": True
-                },
-                {
-                    "name": f"{profile.magnet.name} Fusions",
-                    "value": profile.magnet.fusions,
-                    "inline": True
-                }
-            ]
-
-        return fields
-
-    def get_weapon_stat_embed(self, name, profile):
-        """Function | Get Weapon Stat Embed
-
-        This function returns information on the stats a person has
-        for a specific chosen weapon
+        policy = self.bot.freshness[command]
+        profile = self.bot.data['HyperscapeUsers']['profiles'].get(name.lower())
+        if profile:
+            age = profile.refresh_age
+            if age <= policy.max_staleness:
+                refresh = None
+                if policy.revalidate and age > REFRESH_INTERVAL and self.bot.api.breaker.state != CircuitBreaker.OPEN:
+                    refresh = asyncio.ensure_future(self.update_user_cache(name, platform, BACKGROUND))
+                return profile, refresh
+
+        try:
+            return await self.update_user_cache(name, platform), None
+        except APIError:
+            if profile:
+                return profile, None
+            raise
+
+    def index_guild(self, guild):
+        """Function | Index Guild Members
+
+        Record every linked Discord user who is a member of a guild, so
+        the guild's leaderboards rank their profiles. Looks up each linked
+        user in the guild's member cache, so the guild should be chunked.
 
         Args
         ----------
-        name - The name of the weapon searched
-        profile - profile - An instance of the Profile class found in './Resources/APISession.py'
+        guild - The discord.Guild to index.
         """
-        stat = getattr(profile, name)
-        embed = self.bot.embed_util.get_embed(
-            title = f"{stat.name} Stats",
-            thumbnail = profile.avatar_url,
-            author_url = profile.url,
-            fields = [
-                {
-                    "name": "Kills",
-                    "value": stat.kills,
-                    "inline": True
-                },
-                {
-                    "name": "Damage",
-                    "value": stat.damage,
-                    "inline": True
-                },
-                {
-                    "name": "Headshot Damage",
-                    "value": stat.headshot_damage,
-                    "inline": True
-                },
-                {
-                    "name": "Fusions",
-                    "value": stat.fusions,
-                    "inline": True
-                },
-                {
-                    "name": "Headshot Accuracy",
-                    "value": f"{stat.hs_accuracy}%",
-                    "inline": True
-                }
-            ]
-        )
-
-        return embed
+        for discord_id in list(self.bot.data['HyperscapeUsers']['discords']):
+            if guild.get_member(discord_id):
+                self.add_guild_member(guild.id, discord_id)
 
-    def get_hack_stat_embed(self, name, profile):
-        """Function | Get Hack Stat Embed
+    def guild_keys(self, guild_id):
+        """Returns the keys of the profiles linked to members of a guild."""
+        return set(self.guild_leaderboards.members.get(guild_id, {}).values())
 
-        This function returns information on the stats a person has
-        for a specific chosen hack
+    def add_guild_member(self, guild_id, discord_id):
+        """Function | Add Guild Member
 
-        Args
-        ----------
-        name - The name of the hack searched
-        profile - profile - An instance of the Profile class found in './Resources/APISession.py'
+        Rank the profile linked to a Discord user in a guild they are a
+        member of. Users without a linked profile are ignored.
         """
-        stat = getattr(profile, name)
-        embed = self.bot.embed_util.get_embed(
-            title =f"{stat.name} Stats",
-            thumbnail = profile.avatar_url,
-            author_url = profile.url,
-            fields = [
-                {
-                    "name": "Kills",
-                    "value": stat.kills,
-                    "inline": True
-                },
-                {
-                    "name": "Damage",
-                    "value": stat.damage,
-                    "inline": True
-                },
-                {
-                    "name": "Fusions",
-                    "value": stat.fusions,
-                    "inline": True
-                }
-            ]
-        )
+        users = self.bot.data['HyperscapeUsers']
+        name = users['discords'].get(discord_id)
+        if name:
+            key = name.lower()
+            self.guild_leaderboards.add_member(guild_id, discord_id, key, users['profiles'].peek(key))
+
+    async def update_leaderboards(self):
+        """Function | Update Leaderboards
 
-        return embed
+        Refresh the linked profiles which are due to be refreshed, in the
+        background lane and one at a time, so the leaderboards follow the
+        API. Each refreshed profile only moves its own leaderboard entries,
+        see `put_profile`.
 
-    def update_leaderboards(self):
-        pass
+        Stops early while the API is failing, the rest are refreshed next time.
+        """
+        profiles = self.bot.data['HyperscapeUsers']['profiles']
+        for key in list(profiles.pinned):
+            profile = profiles.peek(key)
+            if not profile or profile.refresh_age <= REFRESH_INTERVAL:
+                continue
+            if self.bot.api.breaker.state == CircuitBreaker.OPEN:
+                return
+            try:
+                await self.update_user_cache(key, profile.platform, BACKGROUND)
+            except APIError as e:
+                print(f"{self.bot.WARN} {self.bot.TIMELOG()} Leaderboard refresh of {key} failed: {e}")
+                return
@@ -1,6 +1,8 @@
 from enum import Enum
 from aenum import MultiValueEnum
 
+from Resources.Fields import STAT_FIELDS
+
 class StatCategory(Enum):
     main = "main"
     solo = "solo"
@@ -36,28 +38,8 @@ class HackStat(MultiValueEnum):
     armor = "armor"
     magnet = "magnet", "mag"
 
-class Stat(MultiValueEnum):
-    wins = "wins", "win", "w"
-    crown_wins = "crownwins", "crownwin", "crown_win", "crown_wins", "cw", "cws"
-    damage = "damage", "dmg"
-    assists = "assists", "assist", "ass"
-    matches = "matches", "match", "ma"
-    chests_broken = "chests_broken", "cb", "chestsbroken", "chest_broken", "chestbroken"
-    crown_pickups = "crown_pickups", "crownpickups", "crown_pickup", "crownpickup", "cp", "cps"
-    damage_done = "damage_done", "damagedone", "dmgdone", "dmgd"
-    kills = "kills", "kill", "k", "ks"
-    fusions = "fusions", "fusion", "f", "fs"
-    revives = "revives", "revive", "rv", "rvs"
-    time_played = "time_played", "timeplayed", "tmpd", "tmp"
-    weapon_headshot_damage = "weapon_headshot_damage", "weaponheadshotdamage", "wpnhdshtdmg", "hdshtdmg"
-    weapon_body_damage = "weapon_body_damage", "weaponbodydamage", "wpnbdydmg"
-    damage_by_items = "damage_by_items", "dmg_by_items", "damagebyitems", "itmdmdg", "itemdamage", "item_damage"
-    avg_kills_per_match = "avg_kills_per_match", "avg_kills", "avgkills"
-    avg_dmg_per_kill = "avg_dmg_per_kill", "avg_damage_per_kill", "avgdamageperkill", "avgdmgkill"
-    losses = "losses", "loss", "l", "ls"
-    winrate = "winrate", "wnr"
-    kd = "kd"
-    headshot_accuracy = "headshot_accuracy", "hdshtacc"
+# Every stat with aliases can be searched, see './Resources/Fields.py'.
+Stat = MultiValueEnum('Stat', [(field.attr, field.aliases) for field in STAT_FIELDS if field.aliases])
 
 class Platforms(Enum):
     uplay = "pc"
@@ -0,0 +1,313 @@
+"""Resource | Fields
+
+This file hosts the declarative description of every value the
+Hyper Scape API reports for a player, and the decoders built
+from it.
+
+To add a stat, add a `Field` to `STAT_FIELDS`. It then becomes an
+attribute of `Profile`, a searchable `Stat` (when it has aliases)
+and gets its display label, without touching any other file.
+"""
+import operator
+from collections import namedtuple
+
+class Field(namedtuple('Field', ['key', 'attr', 'type', 'default', 'label', 'aliases'])):
+    """Class | Field
+
+    A single value of a player endpoint response.
+
+    Args
+    ----------
+    key - The key of the value in its section of the API response.
+    attr - The attribute name the value is stored under.
+    type - The type of the value, others are converted to it.
+        `float` fields also keep integer values as they are. Rates
+        and times are sent already formatted, as `str`.
+    default - The value used when the key or its section is missing.
+    label - The name the value is displayed with.
+    aliases - The names the stat can be searched by with `!stat`,
+        or empty if it can't be searched on its own.
+    """
+    __slots__ = ()
+
+    def __new__(cls, key, attr, type, default, label, aliases = ()):
+        return super().__new__(cls, key, attr, type, default, label, aliases)
+
+# The `player`, `custom`, `refresh` and `social` sections of the response.
+PLAYER_FIELDS = (
+    Field('p_id', 'player_id', str, None, "Player ID"),
+    Field('p_user', 'player_user', str, None, "Player User"),
+    Field('p_name', 'player_name', str, "", "Player Name"),
+    Field('p_platform', 'platform', str, "uplay", "Platform")
+)
+CUSTOM_FIELDS = (
+    Field('verified', 'profile_verified', bool, False, "Verified"),
+    Field('visitors', 'profile_visitors', int, 0, "Visitors")
+)
+REFRESH_FIELDS = (
+    Field('utime', 'refresh_utime', int, 0, "Last Refresh"),
+)
+SOCIAL_FIELDS = (
+    Field('is_premium', 'is_premium', bool, False, "Premium"),
+)
+
+# The `data.stats` section, in the order profiles store them.
+STAT_FIELDS = (
+    Field('wins', 'wins', int, 0, "Wins", ("wins", "win", "w")),
+    Field('crown_wins', 'crown_wins', int, 0, "Crown Wins", ("crownwins", "crownwin", "crown_win", "crown_wins", "cw", "cws")),
+    Field('damage', 'damage', int, 0, "Damage", ("damage", "dmg")),
+    Field('assists', 'assists', int, 0, "Assists", ("assists", "assist", "ass")),
+    Field('matches', 'matches', int, 0, "Matches", ("matches", "match", "ma")),
+    Field('chests_broken', 'chests_broken', int, 0, "Chests Broken", ("chests_broken", "cb", "chestsbroken", "chest_broken", "chestbroken")),
+    Field('crown_pickups', 'crown_pickups', int, 0, "Crown Pickups", ("crown_pickups", "crownpickups", "crown_pickup", "crownpickup", "cp", "cps")),
+    Field('damage_done', 'damage_done', int, 0, "Damage Done", ("damage_done", "damagedone", "dmgdone", "dmgd")),
+    Field('kills', 'kills', int, 0, "Kills", ("kills", "kill", "k", "ks")),
+    Field('fusions', 'fusions', int, 0, "Fusions", ("fusions", "fusion", "f", "fs")),
+    Field('last_rank', 'last_rank', int, 0, "Last Rank"),
+    Field('revives', 'revives', int, 0, "Revives", ("revives", "revive", "rv", "rvs")),
+    Field('time_played', 'time_played', str, "0 mins", "Time Played", ("time_played", "timeplayed", "tmpd", "tmp")),
+    Field('solo_crown_wins', 'solo_crown_wins', int, 0, "Solo Crown Wins"),
+    Field('squad_crown_wins', 'squad_crown_wins', int, 0, "Squad Crown Wins"),
+    Field('solo_last_rank', 'solo_last_rank', int, 0, "Solo Last Rank"),
+    Field('squad_last_rank', 'squad_last_rank', int, 0, "Squad Last Rank"),
+    Field('solo_time_played', 'solo_time_played', str, "0 mins", "Solo Time Played"),
+    Field('squad_time_played', 'squad_time_played', str, "0 mins", "Squad Time Played"),
+    Field('solo_matches', 'solo_matches', int, 0, "Solo Matches"),
+    Field('squad_matches', 'squad_matches', int, 0, "Squad Matches"),
+    Field('solo_wins', 'solo_wins', int, 0, "Solo Wins"),
+    Field('squad_wins', 'squad_wins', int, 0, "Squad Wins"),
+    Field('careerbest_fused_to_max', 'careerbest_fused_to_max', int, 0, "Most Fused to Max"),
+    Field('careerbest_chests', 'careerbest_chests', int, 0, "Most Chests"),
+    Field('careerbest_shockwaved', 'careerbest_shockwaved', int, 0, "Most Shockwaved"),
+    Field('careerbest_damage_done', 'careerbest_damage_done', int, 0, "Most Damage Done"),
+    Field('careerbest_revealed', 'careerbest_revealed', int, 0, "Most Revealed"),
+    Field('careerbest_assists', 'careerbest_assists', int, 0, "Most Assists"),
+    Field('careerbest_shielded', 'careerbest_damage_shielded', int, 0, "Most Damage Shielded"),
+    Field('careerbest_long_range_final_blows', 'careerbest_long_range_final_blows', int, 0, "Most Long Range Kills"),
+    Field('careerbest_short_range_final_blows', 'careerbest_short_range_final_blows', int, 0, "Most Short Range Kills"),
+    Field('careerbest_kills', 'careerbest_kills', int, 0, "Most Kills"),
+    Field('careerbest_item_fused', 'careerbest_item_fused', int, 0, "Most Items Fused"),
+    Field('careerbest_critical_damage', 'careerbest_critical_damage', int, 0, "Most Headshot Damage"),
+    Field('careerbest_survival_time', 'careerbest_survival_time', str, "0 mins", "Longest Survival Time"),
+    Field('careerbest_healed', 'careerbest_healed', int, 0, "Most Healed"),
+    Field('careerbest_revives', 'careerbest_revives', int, 0, "Most Revives"),
+    Field('careerbest_snare_triggered', 'careerbest_snare_triggered', int, 0, "Most Snares Triggered"),
+    Field('careerbest_mines_triggered', 'careerbest_mines_triggered', int, 0, "Most Mines Triggered"),
+    Field('weapon_headshot_damage', 'weapon_headshot_damage', int, 0, "Weapon Headshot Damage", ("weapon_headshot_damage", "weaponheadshotdamage", "wpnhdshtdmg", "hdshtdmg")),
+    Field('weapon_body_damage', 'weapon_body_damage', int, 0, "Weapon Body Damage", ("weapon_body_damage", "weaponbodydamage", "wpnbdydmg")),
+    Field('damage_by_items', 'damage_by_items', int, 0, "Hack Damage", ("damage_by_items", "dmg_by_items", "damagebyitems", "itmdmdg", "itemdamage", "item_damage")),
+    Field('avg_kills_per_match', 'avg_kills_per_match', str, "0.00", "Avg. Kills per Match", ("avg_kills_per_match", "avg_kills", "avgkills")),
+    Field('avg_dmg_per_kill', 'avg_dmg_per_kill', str, "0.00", "Avg. Damage per Kill", ("avg_dmg_per_kill", "avg_damage_per_kill", "avgdamageperkill", "avgdmgkill")),
+    Field('losses', 'losses', int, 0, "Losses", ("losses", "loss", "l", "ls")),
+    Field('solo_losses', 'solo_losses', int, 0, "Solo Losses"),
+    Field('squad_losses', 'squad_losses', int, 0, "Squad Losses"),
+    Field('winrate', 'winrate', str, "0%", "Winrate", ("winrate", "wnr")),
+    Field('solo_winrate', 'solo_winrate', str, "0%", "Solo Winrate"),
+    Field('squad_winrate', 'squad_winrate', str, "0%", "Squad Winrate"),
+    Field('crown_pick_success_rate', 'crown_pickup_success_rate', str, "0%", "Crown Success"),
+    Field('kd', 'kd', str, "0.00", "KD", ("kd",)),
+    Field('headshot_accuracy', 'headshot_accuracy', str, "0%", "Headshot Accuracy", ("headshot_accuracy", "hdshtacc"))
+)
+
+# The stats of each weapon in `data.weapons` and each hack in `data.hacks`.
+WEAPON_FIELDS = (
+    Field('kills', 'kills', int, 0, "Kills"),
+    Field('damage', 'damage', int, 0, "Damage"),
+    Field('headshot_damage', 'headshot_damage', int, 0, "Headshot Damage"),
+    Field('fusions', 'fusions', int, 0, "Fusions"),
+    Field('hs_accuracy', 'hs_accuracy', float, 0, "Headshot Accuracy")
+)
+HACK_FIELDS = WEAPON_FIELDS[:4] + (
+    Field('headshot_accuracy', 'hs_accuracy', float, 0, "Headshot Accuracy"),
+)
+
+# The weapons and hacks of a profile in the order they are stored: (attribute, API name).
+WEAPONS = (
+    ('dragonfly', 'Dragon Fly'),
+    ('mammoth', 'Mammoth MK1'),
+    ('ripper', 'The Ripper'),
+    ('dtap', 'D-Tap'),
+    ('harpy', 'Harpy'),
+    ('komodo', 'Komodo'),
+    ('hexfire', 'Hexfire'),
+    ('riot', 'Riot One'),
+    ('salvo', 'Salvo EPL'),
+    ('skybreaker', 'Skybreaker'),
+    ('protocol', 'Protocol V')
+)
+HACKS = (
+    ('mine', 'Mine'),
+    ('slam', 'Slam'),
+    ('shockwave', 'Shockwave'),
+    ('wall', 'Wall'),
+    ('heal', 'Heal'),
+    ('reveal', 'Reveal'),
+    ('teleport', 'Teleport'),
+    ('ball', 'Ball'),
+    ('invis', 'Invisibility'),
+    ('armor', 'Armor'),
+    ('magnet', 'Magnet')
+)
+
+# The display label of every stat, by attribute name.
+STAT_LABELS = {field.attr: field.label for field in STAT_FIELDS}
+
+def _fix(value, field):
+    """Returns the value for a field which was not sent with the field's type."""
+    if value is None:
+        return field.default
+    if field.type is float and isinstance(value, int):
+        return value
+    if field.type is bool:
+        # `bool` would make any non-empty string true, e.g. "false".
+        return bool(value) if value in (0, 1) else field.default
+    try:
+        return field.type(value)
+    except (TypeError, ValueError):
+        return field.default
+
+_EMPTY = {}
+
+def _section(parent, key):
+    """Returns a section of the response, or an empty one if it is missing or not a dict."""
+    section = parent.get(key)
+    return section if section.__class__ is dict else _EMPTY
+
+def _getter(fields):
+    """Returns a function reading the values of the fields from a section as a tuple, raising if one is missing."""
+    keys = tuple(field.key for field in fields)
+    if len(keys) > 1:
+        return operator.itemgetter(*keys)
+    key = keys[0]
+    return lambda section: (section[key],)
+
+def _read(section, fields):
+    """Returns the values of the fields of a section, with `None` for missing ones."""
+    if section.__class__ is not dict:
+        return (None,) * len(fields)
+    return tuple(map(section.get, (field.key for field in fields)))
+
+class _Fixes:
+    """Class | Value Fixes
+
+    Fixes the values read for a sequence of fields which are not of
+    their field's type, by looking up the tuple of the types of every
+    value in a cache of the positions that need fixing, so values of
+    the expected types cost a single lookup rather than a check per
+    field.
+
+    Args
+    ----------
+    fields - The fields the values are read for, in order.
+    """
+    # The most type tuples remembered, as malformed responses can bring new ones.
+    MAX_SIGNATURES = 1024
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.defaults = tuple(field.default for field in fields)
+        self.positions = {}
+        # The last type tuple and its positions, as most responses have the same types.
+        self.last = (None, ())
+
+    def fix(self, values):
+        """Fix a list of values in place."""
+        signature = tuple(map(type, values))
+        last, positions = self.last
+        if signature != last:
+            positions = self.positions.get(signature)
+            if positions is None:
+                positions = self.learn(signature)
+            self.last = (signature, positions)
+        fields, defaults = self.fields, self.defaults
+        for position in positions:
+            value = values[position]
+            values[position] = defaults[position] if value is None else _fix(value, fields[position])
+
+    def learn(self, signature):
+        """Returns and remembers the positions of a type tuple which need fixing."""
+        positions = tuple(
+            position for position, (cls, field) in enumerate(zip(signature, self.fields))
+            if not (cls is field.type or (field.type is float and cls is int))
+        )
+        if len(self.positions) >= self.MAX_SIGNATURES:
+            self.positions.clear()
+        self.positions[signature] = positions
+        return positions
+
+def compile_decoder(fields):
+    """Function | Compile Decoder
+
+    Returns a function reading the given fields from a section of the
+    response, returning their values as a tuple in the order of `fields`.
+    Missing values are replaced with the field's default, and values of
+    another type converted to the field's type.
+    """
+    getter, fixes = _getter(fields), _Fixes(fields)
+
+    def decode(section):
+        try:
+            values = list(getter(section))
+        except (KeyError, TypeError):
+            values = list(_read(section, fields))
+        fixes.fix(values)
+        return tuple(values)
+    return decode
+
+# The sections of the response before `data`: (key, fields, getter).
+HEADERS = tuple((key, fields, _getter(fields)) for key, fields in (
+    ('player', PLAYER_FIELDS), ('custom', CUSTOM_FIELDS), ('refresh', REFRESH_FIELDS), ('social', SOCIAL_FIELDS)
+))
+HEADER_COUNT = sum(len(fields) for key, fields, getter in HEADERS)
+WEAPON_NAMES = tuple(name for attr, name in WEAPONS)
+HACK_NAMES = tuple(name for attr, name in HACKS)
+
+def compile_profile_decoder():
+    """Function | Compile Profile Decoder
+
+    Returns the function decoding a response of the player endpoint in
+    a single pass. It returns a tuple of the player, custom, refresh
+    and social values, followed by the stats tuple and the flat weapon
+    and hack stat tuples.
+
+    Every section is read with a single `itemgetter` call, and the
+    values of every section fixed at once. Missing sections are decoded
+    as if they were empty.
+    """
+    stats, weapon, hack = _getter(STAT_FIELDS), _getter(WEAPON_FIELDS), _getter(HACK_FIELDS)
+    weapon_sections, hack_sections = operator.itemgetter(*WEAPON_NAMES), operator.itemgetter(*HACK_NAMES)
+    fields = sum((fields for key, fields, getter in HEADERS), ()) + STAT_FIELDS + WEAPON_FIELDS * len(WEAPONS) + HACK_FIELDS * len(HACKS)
+    fixes = _Fixes(fields)
+    stats_end = HEADER_COUNT + len(STAT_FIELDS)
+    weapons_end = stats_end + len(WEAPON_FIELDS) * len(WEAPONS)
+
+    def decode_profile(options):
+        data = _section(options, 'data')
+        try:
+            values = []
+            for key, section_fields, getter in HEADERS:
+                values += getter(options.get(key))
+            values += stats(data.get('stats'))
+            for section in weapon_sections(data.get('weapons')):
+                values += weapon(section)
+            for section in hack_sections(data.get('hacks')):
+                values += hack(section)
+        except (KeyError, TypeError):
+            # A section or a value is missing, so read every section with defaults for them.
+            weapons, hacks = _section(data, 'weapons'), _section(data, 'hacks')
+            values = []
+            for key, section_fields, getter in HEADERS:
+                values += _read(options.get(key), section_fields)
+            values += _read(data.get('stats'), STAT_FIELDS)
+            for name in WEAPON_NAMES:
+                values += _read(weapons.get(name), WEAPON_FIELDS)
+            for name in HACK_NAMES:
+                values += _read(hacks.get(name), HACK_FIELDS)
+
+        fixes.fix(values)
+        return (*values[:HEADER_COUNT], tuple(values[HEADER_COUNT:stats_end]), tuple(values[stats_end:weapons_end]), tuple(values[weapons_end:]))
+    return decode_profile
+
+decode_weapon = compile_decoder(WEAPON_FIELDS)
+decode_hack = compile_decoder(HACK_FIELDS)
+decode_profile = compile_profile_decoder()
@@ -0,0 +1,348 @@
+"""Resource | History
+
+This file hosts the store of past stat snapshots of profiles, kept
+in their own SQLite database so that the history of a profile can be
+read a range at a time instead of being held in memory. More details
+provided for each.
+"""
+import asyncio
+import math
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from Resources.APISession import Profile
+from Resources.StatMatrix import COLUMNS, StatMatrix
+
+# A changed column of a delta: its index and the difference, or its new value if `RAW` is set in the index.
+CHANGE = struct.Struct('<Hd')
+RAW = 0x8000
+KEYFRAME = struct.Struct(f'<{len(COLUMNS)}d')
+
+# The resolution snapshots are kept at: full, then hourly, then daily.
+FULL, HOURLY, DAILY = 0, 1, 2
+BUCKETS = {HOURLY: 3600, DAILY: 86400}
+
+def encode(values, previous = None):
+    """Function | Encode Snapshot
+
+    Returns the stat values of a snapshot encoded as a blob. Without a
+    previous snapshot, every value is stored (a keyframe). Otherwise only
+    the values which changed are stored: integer values as the difference
+    from the previous value, anything else as the new value.
+    """
+    if previous is None:
+        return zlib.compress(KEYFRAME.pack(*values))
+    changes = []
+    for index, (new, old) in enumerate(zip(values, previous)):
+        if new == old or (math.isnan(new) and math.isnan(old)):
+            continue
+        if float(new).is_integer() and float(old).is_integer():
+            changes.append(CHANGE.pack(index, new - old))
+        else:
+            changes.append(CHANGE.pack(index | RAW, new))
+    return zlib.compress(b"".join(changes))
+
+def decode(blob, previous = None):
+    """Function | Decode Snapshot
+
+    Returns the stat values of a snapshot encoded by `encode`, given
+    the values of the previous snapshot unless it is a keyframe.
+    """
+    data = zlib.decompress(blob)
+    if previous is None:
+        return list(KEYFRAME.unpack(data))
+    values = list(previous)
+    for index, value in CHANGE.iter_unpack(data):
+        if index & RAW:
+            values[index & ~RAW] = value
+        else:
+            values[index] += value
+    return values
+
+class HistoryStore:
+    """Class | History Store
+
+    Keeps a snapshot of a profile's stats every time it refreshes, in an
+    SQLite database in WAL mode, keyed by player ID and the time the
+    profile was refreshed upstream.
+
+    Snapshots are delta encoded against the previous snapshot of the same
+    player, with a keyframe holding every value at least every
+    `keyframe_interval` snapshots, so any range is decoded by reading
+    from the keyframe before it.
+
+    `compact` downsamples old snapshots: every snapshot is kept for
+    `full_resolution` seconds, then the last of each hour until
+    `hourly_until` seconds, then the last of each day.
+
+    Every read and write runs in a single worker thread, which owns the
+    connection, so commands are not held up by the database.
+
+    See `History` in the config for the settings.
+
+    Args
+    ----------
+    bot - The discord.Client object of the bot connection.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            player_id TEXT NOT NULL,
+            taken_at INTEGER NOT NULL,
+            resolution INTEGER NOT NULL,
+            keyframe INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (player_id, taken_at)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.path = bot.history_file
+        self.keyframe_interval = bot.history_keyframe_interval
+        self.full_resolution = bot.history_full_resolution
+        self.hourly_until = bot.history_hourly_until
+
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.connection = None
+        # The last snapshot of each player written: (taken_at, values, snapshots since its keyframe).
+        self.latest = {}
+
+        self.recorded = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    def connect(self):
+        """Open the database in the worker thread, setting it aside if it holds another stat layout."""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.executescript(self.SCHEMA)
+            row = self.connection.execute("SELECT value FROM meta WHERE name = 'layout'").fetchone()
+            if row is not None and row[0] != Profile.LAYOUT:
+                # Snapshots of another layout can't be decoded, so start a new history beside them.
+                self.connection.close()
+                os.replace(self.path, f"{self.path}.{row[0]}")
+                self.connection = None
+                return self.connect()
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('layout', ?)", (Profile.LAYOUT,))
+        return self.connection
+
+    async def run(self, func, *args):
+        """Run a function in the worker thread, returning its result."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def record(self, profile):
+        """Function | Record Snapshot
+
+        Store a snapshot of a profile in the worker thread, unless a
+        snapshot of the same refresh is already stored. Profiles which
+        don't know when they were refreshed are not stored.
+        """
+        if profile and profile.found and profile.refresh_utime:
+            future = self.executor.submit(self.write_snapshot, profile.player_id, int(profile.refresh_utime), StatMatrix.to_row(profile))
+            future.add_done_callback(self.report)
+
+    def report(self, future):
+        if future.exception():
+            print(f"{self.bot.ERR} {self.bot.TIMELOG()} Could not record profile history: {future.exception()}")
+
+    def flush(self):
+        """Function | Flush History
+
+        Wait until every snapshot handed to the worker thread is written.
+        """
+        self.executor.submit(lambda: None).result()
+
+    def read_latest(self, player_id):
+        """Returns the last snapshot of a player as stored in `latest`, reading it from the database if needed."""
+        latest = self.latest.get(player_id)
+        if latest is None:
+            rows = self.connection.execute("""
+                SELECT taken_at, keyframe, data FROM snapshots WHERE player_id = ? AND taken_at >= (
+                    SELECT MAX(taken_at) FROM snapshots WHERE player_id = ? AND keyframe = 1
+                ) ORDER BY taken_at
+            """, (player_id, player_id)).fetchall()
+            values = None
+            for taken_at, keyframe, data in rows:
+                values = decode(data, None if keyframe else values)
+            if rows:
+                latest = self.latest[player_id] = (rows[-1][0], values, len(rows) - 1)
+        return latest
+
+    def write_snapshot(self, player_id, taken_at, values):
+        connection = self.connect()
+        latest = self.read_latest(player_id)
+        if latest is not None and taken_at <= latest[0]:
+            self.skipped += 1
+            return
+
+        keyframe = latest is None or latest[2] + 1 >= self.keyframe_interval
+        data = encode(values, None if keyframe else latest[1])
+        with connection:
+            connection.execute(
+                "INSERT INTO snapshots (player_id, taken_at, resolution, keyframe, data) VALUES (?, ?, ?, ?, ?)",
+                (player_id, taken_at, FULL, int(keyframe), data)
+            )
+        self.latest[player_id] = (taken_at, values, 0 if keyframe else latest[2] + 1)
+        self.recorded += 1
+
+    def read_range(self, player_id, start, end):
+        """Returns a list of (taken_at, values) of a player's snapshots from `start` up to `end`."""
+        connection = self.connect()
+        rows = connection.execute("""
+            SELECT taken_at, keyframe, data FROM snapshots WHERE player_id = ? AND taken_at <= ? AND taken_at >= COALESCE((
+                SELECT MAX(taken_at) FROM snapshots WHERE player_id = ? AND keyframe = 1 AND taken_at <= ?
+            ), 0) ORDER BY taken_at
+        """, (player_id, end, player_id, start)).fetchall()
+        snapshots = []
+        values = None
+        for taken_at, keyframe, data in rows:
+            values = decode(data, None if keyframe else values)
+            if taken_at >= start:
+                snapshots.append((taken_at, values))
+        return snapshots
+
+    async def range(self, player_id, start, end = None):
+        """Function | Snapshot Range
+
+        Returns a list of (taken_at, values) of the snapshots of a player
+        taken from `start` up to `end` (the latest if `None`), oldest first, with
+        values in the order of `COLUMNS`. Only the rows from the keyframe
+        before `start` onwards are read.
+        """
+        return await self.run(self.read_range, player_id, start, math.inf if end is None else end)
+
+    def read_at(self, player_id, moment):
+        connection = self.connect()
+        row = connection.execute(
+            "SELECT MAX(taken_at) FROM snapshots WHERE player_id = ? AND taken_at <= ?", (player_id, moment)
+        ).fetchone()
+        if row[0] is None:
+            # Nothing that old, so use the first snapshot.
+            row = connection.execute("SELECT MIN(taken_at) FROM snapshots WHERE player_id = ?", (player_id,)).fetchone()
+            if row[0] is None:
+                return None
+        snapshots = self.read_range(player_id, row[0], row[0])
+        return snapshots[-1] if snapshots else None
+
+    async def at(self, player_id, moment):
+        """Function | Snapshot At
+
+        Returns the (taken_at, values) of the last snapshot of a player
+        taken at or before `moment`, or the first snapshot if there is
+        none that old, or `None` if the player has no history.
+        """
+        return await self.run(self.read_at, player_id, moment)
+
+    def read_recent(self, player_id, count):
+        connection = self.connect()
+        row = connection.execute(
+            "SELECT taken_at FROM snapshots WHERE player_id = ? ORDER BY taken_at DESC LIMIT 1 OFFSET ?", (player_id, count - 1)
+        ).fetchone()
+        if row is None:
+            row = connection.execute("SELECT MIN(taken_at) FROM snapshots WHERE player_id = ?", (player_id,)).fetchone()
+            if row[0] is None:
+                return []
+        return self.read_range(player_id, row[0], math.inf)
+
+    async def recent(self, player_id, count = 10):
+        """Function | Recent Snapshots
+
+        Returns a list of (taken_at, values) of the last `count`
+        snapshots of a player, oldest first.
+        """
+        return await self.run(self.read_recent, player_id, count)
+
+    def compact_player(self, connection, player_id, start, now):
+        hourly_from = now - self.full_resolution
+        daily_from = now - self.hourly_until
+        # Widen to whole days, so a bucket partly downsampled before is downsampled as a whole.
+        start = start // BUCKETS[DAILY] * BUCKETS[DAILY]
+        rows = connection.execute("""
+            SELECT taken_at, resolution, keyframe, data FROM snapshots WHERE player_id = ? AND taken_at >= COALESCE((
+                SELECT MAX(taken_at) FROM snapshots WHERE player_id = ? AND keyframe = 1 AND taken_at <= ?
+            ), 0) ORDER BY taken_at
+        """, (player_id, player_id, start)).fetchall()
+
+        # Decode every row, and keep the last row of each bucket of the window.
+        decoded = []
+        values = None
+        for taken_at, resolution, keyframe, data in rows:
+            values = decode(data, None if keyframe else values)
+            decoded.append((taken_at, resolution, keyframe, values))
+        kept = {}
+        for taken_at, resolution, keyframe, values in decoded:
+            if start <= taken_at < hourly_from:
+                target = DAILY if taken_at < daily_from else HOURLY
+                kept[(target, taken_at // BUCKETS[target])] = taken_at
+        survivors = {taken_at: target for (target, bucket), taken_at in kept.items()}
+
+        previous = None
+        dropped_keyframe = False
+        rewrite = False
+        for taken_at, resolution, keyframe, values in decoded:
+            in_window = start <= taken_at < hourly_from
+            if in_window and not taken_at in survivors:
+                connection.execute("DELETE FROM snapshots WHERE player_id = ? AND taken_at = ?", (player_id, taken_at))
+                dropped_keyframe = dropped_keyframe or keyframe
+                rewrite = True
+                self.dropped += 1
+                continue
+            if rewrite or in_window:
+                # The snapshot before this one may have been dropped, so encode it against the one kept.
+                keyframe = keyframe or dropped_keyframe or previous is None
+                connection.execute(
+                    "UPDATE snapshots SET resolution = ?, keyframe = ?, data = ? WHERE player_id = ? AND taken_at = ?",
+                    (survivors.get(taken_at, resolution), int(keyframe), encode(values, None if keyframe else previous), player_id, taken_at)
+                )
+                dropped_keyframe = False
+                if not in_window:
+                    # Everything after the window is encoded against unchanged snapshots.
+                    break
+            elif taken_at >= hourly_from:
+                break
+            previous = values
+        self.latest.pop(player_id, None)
+
+    def compact_all(self, now):
+        connection = self.connect()
+        players = connection.execute("""
+            SELECT player_id, MIN(taken_at) FROM snapshots
+            WHERE (resolution < ? AND taken_at < ?) OR (resolution < ? AND taken_at < ?)
+            GROUP BY player_id
+        """, (HOURLY, now - self.full_resolution, DAILY, now - self.hourly_until)).fetchall()
+        for player_id, start in players:
+            with connection:
+                self.compact_player(connection, player_id, start, now)
+        return len(players)
+
+    async def compact(self):
+        """Function | Compact History
+
+        Downsample the snapshots which have aged out of their resolution,
+        re-encoding the snapshots kept against each other. Returns how
+        many players' histories were compacted.
+        """
+        return await self.run(self.compact_all, int(time.time()))
+
+    def stats(self):
+        """Function | History Statistics
+
+        Returns a dict of how many snapshots were recorded, skipped as
+        already stored and dropped by downsampling since startup.
+        """
+        return {
+            "recorded": self.recorded,
+            "skipped": self.skipped,
+            "dropped": self.dropped
+        }
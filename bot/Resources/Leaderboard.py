@@ -0,0 +1,390 @@
+"""Resource | Leaderboard
+
+This file hosts the leaderboard engine, which keeps the linked
+profiles ranked by every searchable stat, and by the kills of
+every weapon and hack, both overall and within each guild.
+More details provided for each.
+"""
+import math
+import random
+import re
+from collections import Counter
+
+from Resources.Enums import Stat
+from Resources.Fields import HACKS, STAT_LABELS, WEAPONS
+
+# How to read the value of each board from a profile, and its display label.
+BOARDS = {stat.name: (lambda profile, attr = stat.name: getattr(profile, attr)) for stat in Stat}
+BOARDS.update({attr: (lambda profile, attr = attr: getattr(profile, attr).kills) for attr, name in WEAPONS + HACKS})
+BOARD_LABELS = {stat.name: STAT_LABELS[stat.name] for stat in Stat}
+BOARD_LABELS.update({attr: f"{name} Kills" for attr, name in WEAPONS + HACKS})
+
+# Seconds per unit of a formatted time, by the first letter of the unit.
+TIME_UNITS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+def score(value):
+    """Function | Stat Score
+
+    Returns the number a stat value is ranked by, or `None` if it can't
+    be ranked. Rates and times are sent already formatted, so "12.5%"
+    scores 12.5 and "1 hr 20 mins" scores 4800.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip('%').replace(',', ''))
+        except ValueError:
+            pass
+        parts = re.findall(r"([\d.]+)\s*([a-z]+)", value.lower())
+        if parts and all(unit[0] in TIME_UNITS for number, unit in parts):
+            try:
+                return sum(float(number) * TIME_UNITS[unit[0]] for number, unit in parts)
+            except ValueError:
+                pass
+    return None
+
+class _Node:
+    __slots__ = ('value', 'next', 'width')
+
+    def __init__(self, value, next, width):
+        self.value = value
+        self.next = next
+        self.width = width
+
+class SortedIndex:
+    """Class | Sorted Index
+
+    A sorted list supporting insertion, removal, finding the position
+    of a value and reading the value at a position, each in O(log n)
+    on average, so a single changed entry never re-sorts the list.
+
+    Implemented as an indexable skip list: each link also stores how
+    many values it skips, so positions can be counted while searching.
+
+    Args
+    ----------
+    max_levels - The number of levels of links, enough for about
+        2 ** max_levels values.
+    """
+    def __init__(self, max_levels = 20):
+        self.max_levels = max_levels
+        self.end = _Node(None, [], [])
+        self.head = _Node(None, [self.end] * max_levels, [1] * max_levels)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _search(self, value):
+        """Returns the last node before the value on each level, and the position after each."""
+        chain = [None] * self.max_levels
+        positions = [0] * self.max_levels
+        node = self.head
+        position = 0
+        for level in reversed(range(self.max_levels)):
+            while node.next[level] is not self.end and node.next[level].value < value:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, value):
+        """Add a value to the index."""
+        chain, positions = self._search(value)
+        levels = min(self.max_levels, 1 - int(math.log(1 - random.random(), 2)))
+        node = _Node(value, [None] * levels, [None] * levels)
+        for level in range(levels):
+            previous = chain[level]
+            # How many values the new node is after `previous`.
+            skipped = positions[0] - positions[level] + 1
+            node.next[level] = previous.next[level]
+            node.width[level] = previous.width[level] - skipped + 1
+            previous.next[level] = node
+            previous.width[level] = skipped
+        for level in range(levels, self.max_levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        """Remove a value from the index, raising KeyError if it is not in it."""
+        chain, positions = self._search(value)
+        node = chain[0].next[0]
+        if node is self.end or node.value != value:
+            raise KeyError(value)
+        for level in range(len(node.next)):
+            previous = chain[level]
+            previous.width[level] += node.width[level] - 1
+            previous.next[level] = node.next[level]
+        for level in range(len(node.next), self.max_levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, value):
+        """Returns the position of a value, raising KeyError if it is not in the index."""
+        chain, positions = self._search(value)
+        node = chain[0].next[0]
+        if node is self.end or node.value != value:
+            raise KeyError(value)
+        return positions[0]
+
+    def bisect(self, value):
+        """Returns how many values in the index are less than a value, which need not be in it."""
+        chain, positions = self._search(value)
+        return positions[0]
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        node = self.head
+        # Widths count steps from a node, so the head is position -1.
+        remaining = position + 1
+        for level in reversed(range(self.max_levels)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not self.end:
+            yield node.value
+            node = node.next[0]
+
+    def slice(self, start, stop):
+        """Returns the values from position `start` up to `stop`."""
+        values = []
+        if start >= self.size or stop <= start:
+            return values
+        node = self.head
+        remaining = start + 1
+        for level in reversed(range(self.max_levels)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        while node is not self.end and len(values) < stop - start:
+            values.append(node.value)
+            node = node.next[0]
+        return values
+
+class Leaderboards:
+    """Class | Leaderboards
+
+    Ranks profiles on every board in `BOARDS`, highest first. Tied
+    profiles share a rank, and are listed in order of key. Each board is
+    a SortedIndex, so when a single profile changes only its own entries
+    move, and the top of a board or a profile's rank are found in
+    logarithmic time.
+
+    Profiles are added with `update`, under the same lowercased name
+    key the profile cache uses, and removed with `remove`.
+
+    Args
+    ----------
+    boards - A dict of board name to a function reading its value from a profile.
+    """
+    def __init__(self, boards = BOARDS):
+        self.boards = boards
+        self.indexes = {board: SortedIndex() for board in boards}
+        # The score of each key on each board it is ranked on.
+        self.scores = {}
+
+        self.updates = 0
+        self.moves = 0
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, key):
+        return key in self.scores
+
+    def update(self, key, profile):
+        """Function | Update Profile
+
+        Rank a profile on every board, moving only the entries whose
+        score changed since it was last ranked.
+        """
+        if not (profile and profile.found):
+            self.remove(key)
+            return
+
+        self.updates += 1
+        scores = self.scores.setdefault(key, {})
+        for board, read in self.boards.items():
+            new = score(read(profile))
+            old = scores.get(board)
+            if new == old:
+                continue
+            index = self.indexes[board]
+            if old is not None:
+                index.remove((-old, key))
+                del scores[board]
+            if new is not None:
+                index.insert((-new, key))
+                scores[board] = new
+            self.moves += 1
+
+    def remove(self, key):
+        """Function | Remove Profile
+
+        Remove a profile from every board.
+        """
+        for board, old in self.scores.pop(key, {}).items():
+            self.indexes[board].remove((-old, key))
+
+    def rebuild(self, profiles):
+        """Function | Rebuild Leaderboards
+
+        Rank every profile in an iterable of (key, profile) pairs,
+        dropping everything ranked before.
+        """
+        self.indexes = {board: SortedIndex() for board in self.boards}
+        self.scores = {}
+        for key, profile in profiles:
+            self.update(key, profile)
+
+    def top(self, board, count = 10, start = 0):
+        """Function | Top Of Board
+
+        Returns a list of (rank, key, score) of the profiles ranked from
+        position `start` on a board, best first, with ranks counting from 1.
+        """
+        index = self.indexes[board]
+        top = []
+        for position, (negated, key) in enumerate(index.slice(start, start + count)):
+            if not top:
+                # The first profile listed may be tied with profiles before `start`.
+                rank = index.bisect((negated,)) + 1
+            elif negated != -top[-1][2]:
+                rank = start + position + 1
+            top.append((rank, key, -negated))
+        return top
+
+    def rank(self, board, key):
+        """Function | Profile Rank
+
+        Returns the rank of a profile on a board counting from 1,
+        or `None` if it is not ranked on it.
+        """
+        old = self.scores.get(key, {}).get(board)
+        if old is None:
+            return None
+        # A key-less entry sorts before every profile with the same score.
+        return self.indexes[board].bisect((-old,)) + 1
+
+    def percentile(self, board, key):
+        """Function | Profile Percentile
+
+        Returns the percentage of profiles on a board ranked the same as
+        or below a profile, or `None` if it is not ranked on it.
+        """
+        rank = self.rank(board, key)
+        if rank is None:
+            return None
+        size = self.size(board)
+        return 100 * (size - rank + 1) / size
+
+    def size(self, board):
+        """Returns how many profiles are ranked on a board."""
+        return len(self.indexes[board])
+
+    def stats(self):
+        """Function | Leaderboard Statistics
+
+        Returns a dict of the number of profiles ranked, the number of
+        boards, how many profile updates were made and how many board
+        entries they moved.
+        """
+        return {
+            "profiles": len(self.scores),
+            "boards": len(self.indexes),
+            "updates": self.updates,
+            "moves": self.moves
+        }
+
+class GuildLeaderboards:
+    """Class | Guild Leaderboards
+
+    Indexes which linked Discord users are members of each guild, and
+    keeps a Leaderboards of each guild's linked profiles, so ranking
+    within a guild never checks every linked user for membership.
+
+    A profile is ranked in a guild while at least one member linked to
+    it is in the guild. Membership is kept up to date by the leaderboard
+    cog from member and guild events, see `DataManager.index_guild`.
+    """
+    def __init__(self):
+        # The profile key of each linked member, by guild ID and Discord ID.
+        self.members = {}
+        # How many members of each guild are linked to a profile, by profile key.
+        self.guilds = {}
+        self.leaderboards = {}
+
+    def get(self, guild_id):
+        """Returns the Leaderboards of a guild, or `None` if none of its members are linked."""
+        return self.leaderboards.get(guild_id)
+
+    def add_member(self, guild_id, discord_id, key, profile):
+        """Function | Add Member
+
+        Record a linked member of a guild, ranking their profile in the
+        guild. A member already recorded with another profile is moved to it.
+        """
+        members = self.members.setdefault(guild_id, {})
+        if members.get(discord_id) == key:
+            return
+        self.remove_member(guild_id, discord_id)
+        members[discord_id] = key
+        counts = self.guilds.setdefault(key, Counter())
+        counts[guild_id] += 1
+        if counts[guild_id] == 1:
+            self.leaderboards.setdefault(guild_id, Leaderboards()).update(key, profile)
+
+    def remove_member(self, guild_id, discord_id):
+        """Function | Remove Member
+
+        Forget a member of a guild, unranking their profile in the guild
+        if no other member is linked to it.
+        """
+        key = self.members.get(guild_id, {}).pop(discord_id, None)
+        if key is None:
+            return
+        counts = self.guilds[key]
+        counts[guild_id] -= 1
+        if not counts[guild_id]:
+            del counts[guild_id]
+            self.leaderboards[guild_id].remove(key)
+            if not counts:
+                del self.guilds[key]
+
+    def remove_guild(self, guild_id):
+        """Function | Remove Guild
+
+        Forget every member of a guild, and its leaderboards.
+        """
+        for discord_id in list(self.members.get(guild_id, {})):
+            self.remove_member(guild_id, discord_id)
+        self.members.pop(guild_id, None)
+        self.leaderboards.pop(guild_id, None)
+
+    def update(self, key, profile):
+        """Function | Update Profile
+
+        Move a profile on the leaderboards of every guild it is ranked in.
+        """
+        for guild_id in self.guilds.get(key, ()):
+            self.leaderboards[guild_id].update(key, profile)
+
+    def stats(self):
+        """Function | Guild Leaderboard Statistics
+
+        Returns a dict of the number of guilds with linked members, and
+        the number of linked members across them.
+        """
+        return {
+            "guilds": len(self.leaderboards),
+            "members": sum(len(members) for members in self.members.values())
+        }
@@ -0,0 +1,52 @@
+"""Resource | Permissions
+
+This file hosts the compiled table of which roles may use each
+command, built once from 'Permissions.yml', and the global permission
+check reading it with a dict lookup and a set test. More details
+provided for each.
+"""
+
+def compile_permissions(permissions):
+    """Function | Compile Permissions
+
+    Returns a dict of the qualified name of each command listed in the
+    permissions, e.g. `diagnostics api` for `diagnostics-api`, to a
+    frozenset of the IDs of the roles allowed to use it, with the
+    placeholders of the `Roles` section filled in.
+
+    Raises ValueError naming the command if a permission is not a role ID.
+
+    Args
+    ----------
+    permissions - The contents of 'Permissions.yml'.
+    """
+    roles = dict(permissions['Roles'])
+    table = {}
+    for key, allowed in permissions.items():
+        if key in (None, 'Roles'):
+            continue
+        ids = set()
+        for permission in allowed or ():
+            try:
+                ids.add(int(str(permission).format(**roles)))
+            except (KeyError, ValueError):
+                raise ValueError(f"The permission {permission!r} of {key!r} is not a role ID or a role from 'Roles'.")
+        table[key.replace('-', ' ')] = frozenset(ids)
+    return table
+
+def command_allowed(ctx):
+    """Function | Command Allowed
+
+    Returns whether the author of a command may use it. Commands not in
+    the bot's permission table are allowed for everyone. Those in it are
+    allowed for administrators and members with one of its roles, and
+    never in DMs, where the author is a user without roles.
+    """
+    roles = ctx.bot.permissions.get(ctx.command.qualified_name)
+    if roles is None:
+        return True
+    if not roles.isdisjoint(role.id for role in getattr(ctx.author, 'roles', ())):
+        return True
+    # Administrators are always allowed to use the command.
+    permissions = getattr(ctx.author, 'guild_permissions', None)
+    return permissions is not None and permissions.administrator
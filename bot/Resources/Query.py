@@ -0,0 +1,194 @@
+"""Resource | Stat Query
+
+This file hosts the small query language of the `top` command, which
+filters and sorts linked profiles by their stats, and the compiler
+turning a query into vectorized operations over the StatMatrix.
+
+    kd where matches > 100 limit 10
+    protocol.kills platform=psn
+    wins where kills >= 1000 and kd > 2 asc global
+"""
+import operator
+import re
+
+import numpy
+
+from Resources.Aliases import BOARD_ARGUMENTS, WEAPON_ARGUMENTS, did_you_mean
+from Resources.Cache import LRUCache
+from Resources.Enums import Platforms, Stat
+from Resources.Fields import WEAPON_FIELDS
+from Resources.StatMatrix import COLUMN_INDEX, PLATFORM_CODES
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+# A comparison operator, or a run of anything else.
+TOKEN = re.compile(r"\s*(>=|<=|!=|==|=|>|<|[^\s<>=!]+)")
+
+# The largest number of profiles a query may list.
+MAX_LIMIT = 25
+
+class QueryError(Exception):
+    """Class | Query Error
+
+    Raised when a query could not be compiled.
+    The message is suitable to show to users.
+    """
+
+def resolve_column(name):
+    """Function | Resolve Column
+
+    Returns the StatMatrix column of a stat name, resolving aliases
+    through the alias index of the Stat, WeaponStat and HackStat enums.
+    A weapon or hack on its own means its kills, e.g. `protocol`, or one
+    of its stats can be given after a dot, e.g. `protocol.damage`.
+    """
+    name = name.lower()
+    base, dot, field = name.partition('.')
+    if dot:
+        weapon = WEAPON_ARGUMENTS.get(base)
+        if weapon is None:
+            raise QueryError(f"`{base}` is not a weapon or hack. {did_you_mean(WEAPON_ARGUMENTS.suggest(base))}".rstrip())
+        column = f"{weapon.name}_{field}"
+        if not column in COLUMN_INDEX:
+            raise QueryError(f"`{field}` is not a weapon or hack stat, use one of: " + ", ".join(f"`{f.attr}`" for f in WEAPON_FIELDS))
+        return column
+    found = BOARD_ARGUMENTS.lookup(name)
+    if found is None:
+        raise QueryError(f"`{name}` is not a stat, weapon or hack. {did_you_mean(BOARD_ARGUMENTS.suggest(name))}".rstrip())
+    enum, member = found
+    return member.name if enum is Stat else f"{member.name}_kills"
+
+class Query:
+    """Class | Compiled Query
+
+    A query compiled into the StatMatrix columns it reads.
+
+    Args
+    ----------
+    column - The column profiles are sorted by.
+    conditions - A tuple of (column, comparison function, value).
+    platform - The platform code profiles must be on, or `None`.
+    limit - How many profiles to list.
+    ascending - Whether the lowest values are listed first.
+    scope - `server` or `global`.
+    """
+    __slots__ = ('column', 'conditions', 'platform', 'limit', 'ascending', 'scope')
+
+    def __init__(self, column, conditions = (), platform = None, limit = 10, ascending = False, scope = "server"):
+        self.column = column
+        self.conditions = conditions
+        self.platform = platform
+        self.limit = limit
+        self.ascending = ascending
+        self.scope = scope
+
+    def run(self, matrix, where = None):
+        """Function | Run Query
+
+        Returns a list of (key, value) of the matching profiles in order,
+        out of the rows of the `where` mask (every row if `None`). A
+        profile missing a stat never matches a condition on it.
+        """
+        mask = numpy.ones(len(matrix), dtype = bool) if where is None else where.copy()
+        for column, compare, value in self.conditions:
+            values = matrix.column(column)
+            # Missing stats are NaN, which would match `!=`, so they never match a condition.
+            mask &= compare(values, value) & ~numpy.isnan(values)
+        if self.platform is not None:
+            mask &= matrix.platforms() == self.platform
+        return matrix.top(self.column, self.limit, mask, self.ascending)
+
+def parse(text):
+    """Function | Parse Query
+
+    Compile the text of a query, raising QueryError if it is not valid.
+
+        <stat> [where <stat> <op> <number> [and ...]] [platform=<pc|psn|xbl>]
+               [limit <count>] [asc|desc] [global|server]
+    """
+    tokens = TOKEN.findall(text.strip())
+    if not tokens:
+        raise QueryError("Give a stat to sort by, e.g. `kd where matches > 100 limit 10`.")
+
+    column = resolve_column(tokens[0])
+    conditions = []
+    platform = None
+    limit = 10
+    ascending = False
+    scope = "server"
+
+    position = 1
+    def take(what):
+        nonlocal position
+        if position >= len(tokens):
+            raise QueryError(f"Expected {what} at the end of the query.")
+        position += 1
+        return tokens[position - 1]
+
+    while position < len(tokens):
+        word = take("a keyword").lower()
+        if word in ('where', 'and'):
+            name = take("a stat")
+            op = take("a comparison")
+            if not op in OPERATORS:
+                raise QueryError(f"Expected a comparison after `{name}`, one of: " + " ".join(f"`{op}`" for op in OPERATORS))
+            value = take("a number")
+            try:
+                value = float(value.rstrip('%'))
+            except ValueError:
+                raise QueryError(f"`{value}` is not a number.")
+            conditions.append((resolve_column(name), OPERATORS[op], value))
+        elif word == 'platform':
+            if take("`=`") != '=':
+                raise QueryError("Use `platform=pc`, `platform=psn` or `platform=xbl`.")
+            name = take("a platform").lower()
+            try:
+                platform = PLATFORM_CODES[Platforms(name).name]
+            except ValueError:
+                raise QueryError(f"`{name}` is not a platform, use `pc`, `psn` or `xbl`.")
+        elif word == 'limit':
+            count = take("a count")
+            if not count.isdigit() or not 1 <= int(count) <= MAX_LIMIT:
+                raise QueryError(f"The limit must be a number from 1 to {MAX_LIMIT}.")
+            limit = int(count)
+        elif word in ('asc', 'desc'):
+            ascending = word == 'asc'
+        elif word in ('global', 'server'):
+            scope = word
+        else:
+            raise QueryError(f"Unexpected `{word}`, expected `where`, `and`, `platform=`, `limit`, `asc`, `desc` or `global`.")
+
+    return Query(column, tuple(conditions), platform, limit, ascending, scope)
+
+class QueryCompiler:
+    """Class | Query Compiler
+
+    Compiles queries, keeping recently compiled queries in an LRUCache
+    keyed by their normalized text, so repeating a query skips parsing.
+    Queries which fail to compile are not cached.
+
+    Args
+    ----------
+    max_size - How many compiled queries to keep.
+    """
+    def __init__(self, max_size = 256):
+        self.cache = LRUCache(max_size)
+
+    def compile(self, text):
+        key = " ".join(text.lower().split())
+        query = self.cache.get(key)
+        if query is None:
+            query = parse(key)
+            self.cache[key] = query
+        return query
+
+    def stats(self):
+        return self.cache.stats()
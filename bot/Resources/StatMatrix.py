@@ -0,0 +1,211 @@
+"""Resource | Stat Matrix
+
+This file hosts the columnar store of the stats of linked profiles,
+which lets aggregates across many profiles run as vectorized NumPy
+operations instead of reading Profile objects one at a time. More
+details provided for each.
+"""
+import numpy
+
+from Resources.Enums import Platforms
+from Resources.Fields import HACK_FIELDS, HACKS, STAT_FIELDS, WEAPON_FIELDS, WEAPONS
+from Resources.Leaderboard import score
+
+# The name of every column, in the order of `Profile.values()`: stats, then each weapon's and hack's stats.
+COLUMNS = (
+    tuple(field.attr for field in STAT_FIELDS)
+    + tuple(f"{attr}_{field.attr}" for attr, name in WEAPONS for field in WEAPON_FIELDS)
+    + tuple(f"{attr}_{field.attr}" for attr, name in HACKS for field in HACK_FIELDS)
+)
+COLUMN_INDEX = {name: index for index, name in enumerate(COLUMNS)}
+COLUMN_LABELS = dict(zip(COLUMNS,
+    tuple(field.label for field in STAT_FIELDS)
+    + tuple(f"{name} {field.label}" for attr, name in WEAPONS for field in WEAPON_FIELDS)
+    + tuple(f"{name} {field.label}" for attr, name in HACKS for field in HACK_FIELDS)
+))
+
+# The columns which are sent formatted, and need to be scored into numbers.
+FORMATTED = tuple(index for index, field in enumerate(STAT_FIELDS) if field.type is str)
+
+# The code each platform is stored as, by platform name.
+PLATFORM_CODES = {platform.name: code for code, platform in enumerate(Platforms)}
+
+# The kills column of every weapon and hack, by attribute name.
+WEAPON_KILLS = {attr: COLUMN_INDEX[f"{attr}_kills"] for attr, name in WEAPONS}
+HACK_KILLS = {attr: COLUMN_INDEX[f"{attr}_kills"] for attr, name in HACKS}
+
+class StatMatrix:
+    """Class | Stat Matrix
+
+    A float NumPy array with one row per profile and one column per
+    stat in `COLUMNS`, and an index between profile keys and rows.
+    Formatted rates and times are stored as their score, and missing
+    values as NaN. The platform of each row is kept in a separate array
+    of `PLATFORM_CODES`.
+
+    Rows are updated in place when a profile changes. Removing a profile
+    moves the last row into its place, so the rows in use are always
+    `data[:len(self)]` and every column is a contiguous view.
+
+    Args
+    ----------
+    capacity - The number of rows to allocate at first, doubled when full.
+    """
+    def __init__(self, capacity = 64):
+        self.data = numpy.full((capacity, len(COLUMNS)), numpy.nan)
+        self.platform = numpy.full(capacity, -1, dtype = numpy.int8)
+        # The key of each row in use, and the row of each key.
+        self.keys = []
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    @staticmethod
+    def to_row(profile):
+        """Returns the values of a profile as a list of floats in the order of `COLUMNS`."""
+        values = list(profile.values())
+        for index in FORMATTED:
+            values[index] = score(values[index])
+        return [numpy.nan if value is None else value for value in values]
+
+    def update(self, key, profile):
+        """Function | Update Profile
+
+        Write a profile's stats to its row, adding a row if the
+        profile is new. Profiles which were not found are removed.
+        """
+        if not (profile and profile.found):
+            self.remove(key)
+            return
+
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.data):
+                grown = numpy.full((len(self.data) * 2, len(COLUMNS)), numpy.nan)
+                grown[:row] = self.data
+                self.data = grown
+                self.platform = numpy.concatenate((self.platform, numpy.full(row, -1, dtype = numpy.int8)))
+            self.keys.append(key)
+            self.rows[key] = row
+        self.data[row] = self.to_row(profile)
+        self.platform[row] = PLATFORM_CODES.get(profile.platform, -1)
+
+    def remove(self, key):
+        """Function | Remove Profile
+
+        Drop a profile's row, moving the last row into its place.
+        """
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        if row != last:
+            self.data[row] = self.data[last]
+            self.platform[row] = self.platform[last]
+            self.keys[row] = self.keys[last]
+            self.rows[self.keys[row]] = row
+        self.data[last] = numpy.nan
+        self.platform[last] = -1
+        self.keys.pop()
+
+    def rebuild(self, profiles):
+        """Function | Rebuild Matrix
+
+        Store every profile in an iterable of (key, profile) pairs,
+        dropping every row stored before.
+        """
+        pairs = [(key, profile) for key, profile in profiles if profile and profile.found]
+        self.data = numpy.full((max(64, len(pairs)), len(COLUMNS)), numpy.nan)
+        self.platform = numpy.full(len(self.data), -1, dtype = numpy.int8)
+        self.keys = [key for key, profile in pairs]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        if pairs:
+            self.data[:len(pairs)] = [self.to_row(profile) for key, profile in pairs]
+            self.platform[:len(pairs)] = [PLATFORM_CODES.get(profile.platform, -1) for key, profile in pairs]
+
+    def column(self, name):
+        """Returns a view of a column over the rows in use."""
+        return self.data[:len(self.keys), COLUMN_INDEX[name]]
+
+    def platforms(self):
+        """Returns a view of the platform codes of the rows in use."""
+        return self.platform[:len(self.keys)]
+
+    def select(self, keys):
+        """Returns a boolean mask of the rows of the given keys which are stored."""
+        mask = numpy.zeros(len(self.keys), dtype = bool)
+        rows = [self.rows[key] for key in keys if key in self.rows]
+        mask[rows] = True
+        return mask
+
+    def mask(self, where = None, minimums = None):
+        """Function | Row Mask
+
+        Returns a boolean mask of the rows in use, starting from `where`
+        (every row if `None`), keeping only rows whose columns are at
+        least the values in the `minimums` dict.
+        """
+        mask = numpy.ones(len(self.keys), dtype = bool) if where is None else where.copy()
+        for name, minimum in (minimums or {}).items():
+            mask &= self.column(name) >= minimum
+        return mask
+
+    def mean(self, name, where = None):
+        """Returns the mean of a column over the rows of the mask, ignoring missing values, or `None`."""
+        values = self.column(name) if where is None else self.column(name)[where]
+        values = values[~numpy.isnan(values)]
+        return float(values.mean()) if len(values) else None
+
+    def total(self, name, where = None):
+        """Returns the sum of a column over the rows of the mask, ignoring missing values."""
+        values = self.column(name) if where is None else self.column(name)[where]
+        return float(numpy.nansum(values))
+
+    def top(self, name, count = 10, where = None, ascending = False):
+        """Function | Top Of Column
+
+        Returns a list of (key, value) of the rows with the highest values
+        of a column (or lowest if `ascending`), best first, over the rows
+        of the mask. Only the top `count` rows are sorted.
+        """
+        values = self.column(name)
+        rows = numpy.flatnonzero(~numpy.isnan(values) if where is None else where & ~numpy.isnan(values))
+        order = values[rows] if ascending else -values[rows]
+        if len(rows) > count:
+            best = numpy.argpartition(order, count - 1)[:count]
+            rows, order = rows[best], order[best]
+        rows = rows[numpy.argsort(order, kind = 'stable')]
+        return [(self.keys[row], float(values[row])) for row in rows]
+
+    def best(self, columns, where = None):
+        """Function | Best Column
+
+        Returns the name and total of the column with the highest total
+        over the rows of the mask, out of a dict of name to column index,
+        e.g. `WEAPON_KILLS` for the weapon with the most kills.
+        """
+        names = list(columns)
+        data = self.data[:len(self.keys)] if where is None else self.data[:len(self.keys)][where]
+        totals = numpy.nansum(data[:, [columns[name] for name in names]], axis = 0)
+        if not len(totals):
+            return None, 0
+        best = int(numpy.argmax(totals))
+        return names[best], float(totals[best])
+
+    def stats(self):
+        """Function | Stat Matrix Statistics
+
+        Returns a dict of the number of rows in use, the rows allocated,
+        the number of columns and the size of the array in bytes.
+        """
+        return {
+            "rows": len(self.keys),
+            "capacity": len(self.data),
+            "columns": len(COLUMNS),
+            "bytes": self.data.nbytes
+        }
@@ -0,0 +1,606 @@
+"""Resource | Storage
+
+This file hosts the storage backends the DataManager can save
+the bot's data with. More details provided for each.
+
+Every backend takes the same calls:
+- `load()` returns the bot's data.
+- `save()` marks all of the data as changed.
+- `record(section, key, value)` marks a single change, where `section`
+  is one of the keys of `SECTIONS` and a `value` of `None` is a removal.
+- `flush()` writes any unsaved changes straight away.
+- `load_profile(key)` reads a single profile that is not in memory, for
+  backends which only load profiles when they are asked for.
+"""
+import asyncio
+import os
+import pickle
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from Resources.Cache import LRUCache
+
+# Where each section of changes lives within the bot's data.
+SECTIONS = {
+    "profiles": ("HyperscapeUsers", "profiles"),
+    "discords": ("HyperscapeUsers", "discords"),
+    "ids": ("HyperscapeUsers", "ids"),
+    "leaderboard": ("HyperscapeLeaderboard",)
+}
+
+def get_section(data, section):
+    """Function | Get Section
+
+    Returns the container within the data that a section of
+    changes applies to, creating it if it does not exist.
+    """
+    for name in SECTIONS[section]:
+        data = data.setdefault(name, {})
+    return data
+
+def snapshot(value):
+    """Function | Snapshot Data
+
+    Copy the containers (dicts, lists, sets and caches) of the data,
+    so that the copy can be saved in another thread while the bot keeps
+    changing the data. Profiles are replaced rather than changed when
+    they are updated, so they are shared with the copy.
+    """
+    if isinstance(value, dict):
+        return {key: snapshot(item) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [snapshot(item) for item in value]
+    elif isinstance(value, set):
+        return set(value)
+    elif isinstance(value, LRUCache):
+        return value.copy()
+    return value
+
+class PickleStorage:
+    """Class | Pickle Storage
+
+    Stores all of the bot's data in a single pickle file.
+
+    Changes are saved write-behind: changes made within `Save Delay`
+    seconds of each other are saved together, and the data is written
+    in a worker thread so that the bot is not held up while it is saved.
+    The file is written to a temporary file first, then renamed over
+    the data file, so it is never left half written.
+
+    Args
+    ----------
+    bot - The discord.Client object of the bot connection.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.path = bot.data_file
+
+        self.dirty = False
+        self.save_handle = None
+        self.save_task = None
+        self.save_lock = threading.Lock()
+        self.generation = 0
+        self.saved_generation = 0
+
+    def load(self):
+        """Function | Load Data
+
+        Load the data file, or create it with empty data if it does not exist.
+        """
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as file:
+                return pickle.load(file)
+
+        self.bot.data = {}
+        self.save()
+        return self.bot.data
+
+    def load_profile(self, key):
+        # Every profile is loaded with the rest of the data.
+        return None
+
+    def record(self, section, key, value):
+        self.save()
+
+    def save(self):
+        """Function | Save Data
+
+        Mark the data as changed, and schedule it to be saved.
+
+        If no event loop is running (e.g. during startup), the data is
+        saved straight away instead.
+        """
+        self.dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        if self.save_handle is None:
+            self.save_handle = loop.call_later(self.bot.save_delay, self._start_save)
+
+    def _start_save(self):
+        self.save_handle = None
+        if self.save_task and not self.save_task.done():
+            # The previous save is still being written, try again after another delay.
+            self.save()
+        else:
+            self.save_task = asyncio.ensure_future(self._save())
+
+    async def _save(self):
+        data, generation = self.snapshot()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.write, data, generation)
+        except Exception as e:
+            self.dirty = True
+            print(f"{self.bot.ERR} {self.bot.TIMELOG()} Could not save data: {e}")
+
+    def flush(self):
+        """Function | Flush Data
+
+        Save any unsaved changes straight away, instead of waiting for
+        the scheduled save. Used when the bot is shutting down.
+        """
+        if self.save_handle is not None:
+            self.save_handle.cancel()
+            self.save_handle = None
+
+        if self.dirty:
+            try:
+                self.write(*self.snapshot())
+            except Exception as e:
+                self.dirty = True
+                print(f"{self.bot.ERR} {self.bot.TIMELOG()} Could not save data: {e}")
+
+    def snapshot(self):
+        """Function | Snapshot
+
+        Returns a copy of the data that can be written in another thread,
+        and its generation number, which increases with every snapshot.
+        """
+        self.dirty = False
+        self.generation += 1
+        return snapshot(self.bot.data), self.generation
+
+    def write(self, data, generation):
+        """Function | Write Data
+
+        Write a snapshot of the data to a temporary file, then rename it
+        over the data file.
+
+        Snapshots older than the last one written are skipped, so an
+        earlier save finishing late cannot overwrite newer data.
+        """
+        payload = pickle.dumps(data)
+        with self.save_lock:
+            if generation <= self.saved_generation:
+                return
+            temp_file = self.path + '.tmp'
+            with open(temp_file, 'wb') as save_file:
+                save_file.write(payload)
+                save_file.flush()
+                os.fsync(save_file.fileno())
+            os.replace(temp_file, self.path)
+            self.saved_generation = generation
+
+class JournalStorage(PickleStorage):
+    """Class | Journal Storage
+
+    Stores the bot's data as a pickle snapshot in the data file, plus a
+    journal of every change made since the snapshot was written.
+
+    Each change is appended to the journal as a small record, so the
+    cost of saving is proportional to the change rather than to all of
+    the data. Once the journal grows past `Max Size` bytes, or after
+    `Compact Interval` seconds, it is compacted: a new snapshot is
+    written the same way the pickle storage writes it, and the records
+    it contains are discarded.
+
+    On startup the snapshot is loaded and the journal replayed on top of it.
+    Every record is checksummed, so a record left half written by a crash
+    is detected and dropped along with anything after it.
+
+    Records are flushed to the journal as they are made, so they survive
+    the bot's process crashing. They are synced to disk in batches, at
+    most `Save Delay` seconds after they are made, so a crash of the
+    machine itself loses at most the changes of the last `Save Delay`
+    seconds.
+
+    Args
+    ----------
+    bot - The discord.Client object of the bot connection.
+    """
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, bot):
+        super().__init__(bot)
+        self.journal_path = self.path + '.journal'
+        # The journal being compacted into a snapshot that has not been written yet.
+        self.pending_path = self.path + '.journal.pending'
+        self.journal = None
+        self.journal_size = 0
+        self.last_compact = time.monotonic()
+        self.sync_handle = None
+
+    def load(self):
+        """Function | Load Data
+
+        Load the snapshot, then replay the journal of changes on top of it.
+        """
+        data = super().load()
+        for path in (self.pending_path, self.journal_path):
+            for section, key, value in self.read_journal(path):
+                container = get_section(data, section)
+                if value is None:
+                    container.pop(key, None)
+                else:
+                    container[key] = value
+
+        self.journal = open(self.journal_path, 'ab')
+        self.journal_size = self.journal.tell()
+        return data
+
+    def read_journal(self, path):
+        """Function | Read Journal
+
+        Yield the (section, key, value) records of a journal file, stopping
+        at the first record which is incomplete or fails its checksum.
+        The journal is truncated there, so new records follow the last good one.
+        """
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'r+b') as journal:
+            offset = 0
+            while True:
+                header = journal.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    break
+                length, checksum = self.HEADER.unpack(header)
+                payload = journal.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                offset = journal.tell()
+                yield pickle.loads(payload)
+
+            if offset != os.path.getsize(path):
+                print(f"{self.bot.WARN} {self.bot.TIMELOG()} Dropping incomplete records from the end of {path}.")
+                journal.truncate(offset)
+
+    def record(self, section, key, value):
+        """Function | Record Change
+
+        Append a change to the journal, compacting it if it is due.
+        """
+        payload = pickle.dumps((section, key, value))
+        self.journal.write(self.HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.journal.flush()
+        self.journal_size += self.HEADER.size + len(payload)
+        self.schedule_sync()
+
+        if self.journal_size >= self.bot.journal_max_size or time.monotonic() - self.last_compact >= self.bot.journal_compact_interval:
+            self.save()
+
+    def schedule_sync(self):
+        """Function | Schedule Sync
+
+        Schedule the journal to be synced to disk along with any other
+        records made within `Save Delay` seconds. If no event loop is
+        running, it is synced straight away instead.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.sync()
+            return
+
+        if self.sync_handle is None:
+            self.sync_handle = loop.call_later(self.bot.save_delay, self.sync)
+
+    def sync(self):
+        """Write the journal's records through to disk."""
+        if self.sync_handle is not None:
+            self.sync_handle.cancel()
+            self.sync_handle = None
+        if self.journal is not None:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    def flush(self):
+        self.sync()
+        super().flush()
+
+    def snapshot(self):
+        """Function | Snapshot
+
+        Take a snapshot of the data, and start a new journal for the
+        changes made after it. The old journal is kept until the
+        snapshot is written.
+        """
+        if self.journal is not None:
+            # The records are only in the pending journal until the snapshot is written.
+            self.sync()
+            self.journal.close()
+            if os.path.exists(self.pending_path):
+                # An earlier snapshot was never written, so keep its records too.
+                with open(self.pending_path, 'ab') as pending, open(self.journal_path, 'rb') as journal:
+                    shutil.copyfileobj(journal, pending)
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.pending_path)
+            self.journal = open(self.journal_path, 'ab')
+            self.journal_size = 0
+        self.last_compact = time.monotonic()
+        return super().snapshot()
+
+    def write(self, data, generation):
+        super().write(data, generation)
+        with self.save_lock:
+            # Only the latest snapshot holds every record of the pending journal.
+            if generation == self.generation and os.path.exists(self.pending_path):
+                os.remove(self.pending_path)
+
+class SQLiteStorage:
+    """Class | SQLite Storage
+
+    Stores the bot's data in an SQLite database in WAL mode, with tables
+    for profiles (keyed by player ID), the names profiles are cached under,
+    the player IDs of searched names, Discord links and leaderboard state. Any other data is kept in the
+    `extra` table, one row per top level key.
+
+    Each change is written as its own row, in a worker thread, rather
+    than rewriting all of the data. Profiles are only read from the
+    database when they are asked for, apart from linked profiles, which
+    are loaded on startup.
+
+    If the database is empty and the pickle data file exists, the
+    pickle file is imported on the first load.
+
+    Args
+    ----------
+    bot - The discord.Client object of the bot connection.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            player_id TEXT PRIMARY KEY,
+            stored_at REAL NOT NULL,
+            profile BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS profile_names (
+            name TEXT PRIMARY KEY,
+            player_id TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS profile_names_player ON profile_names (player_id);
+        CREATE TABLE IF NOT EXISTS player_ids (
+            platform TEXT NOT NULL,
+            name TEXT NOT NULL,
+            player_id TEXT NOT NULL,
+            stored_at REAL NOT NULL,
+            PRIMARY KEY (platform, name)
+        );
+        CREATE TABLE IF NOT EXISTS discords (
+            discord_id INTEGER PRIMARY KEY,
+            player_name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS extra (
+            name TEXT PRIMARY KEY,
+            value BLOB NOT NULL
+        );
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.path = bot.database_file
+
+        # All writes go through a single worker thread, which owns its own connection.
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.write_connection = None
+        self.connection = self.connect()
+        self.connection.executescript(self.SCHEMA)
+        # Profiles are read lazily on the event loop, through a connection of their own.
+        self.read_connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri = True)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread = False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def load(self):
+        """Function | Load Data
+
+        Load the Discord links, leaderboard state and extra data.
+        Profiles are left in the database until they are asked for.
+        """
+        if self.is_empty() and os.path.exists(self.bot.data_file):
+            print(f"{self.bot.OK} {self.bot.TIMELOG()} Importing {self.bot.data_file} into {self.path}...")
+            with open(self.bot.data_file, 'rb') as file:
+                self.import_data(pickle.load(file))
+
+        if self.bot.profile_cache_ttl is not None:
+            self.prune(time.time() - self.bot.profile_cache_ttl)
+        if self.bot.player_id_cache_ttl is not None:
+            with self.connection:
+                self.connection.execute("DELETE FROM player_ids WHERE stored_at < ?", (time.time() - self.bot.player_id_cache_ttl,))
+
+        data = {name: pickle.loads(value) for name, value in self.connection.execute("SELECT name, value FROM extra")}
+        users = data.setdefault("HyperscapeUsers", {})
+        users["profiles"] = {}
+        users["discords"] = dict(self.connection.execute("SELECT discord_id, player_name FROM discords"))
+        users["ids"] = LRUCache(self.bot.player_id_cache_size, self.bot.player_id_cache_ttl)
+        for platform, name, player_id, stored_at in self.connection.execute("SELECT platform, name, player_id, stored_at FROM player_ids ORDER BY stored_at"):
+            users["ids"].entries[(platform, name)] = (stored_at, player_id)
+        data["HyperscapeLeaderboard"] = {key: pickle.loads(value) for key, value in self.connection.execute("SELECT key, value FROM leaderboard")}
+        return data
+
+    def is_empty(self):
+        for table in ("profiles", "player_ids", "discords", "leaderboard", "extra"):
+            if self.connection.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                return False
+        return True
+
+    def prune(self, cutoff):
+        """Function | Prune Profiles
+
+        Delete profiles stored before the cutoff time,
+        unless they are linked to a Discord user.
+        """
+        with self.connection:
+            self.connection.execute("""
+                DELETE FROM profiles WHERE stored_at < ? AND player_id NOT IN (
+                    SELECT profile_names.player_id FROM profile_names
+                    JOIN discords ON profile_names.name = lower(discords.player_name)
+                )
+            """, (cutoff,))
+            self.connection.execute("DELETE FROM profile_names WHERE player_id NOT IN (SELECT player_id FROM profiles)")
+
+    def load_profile(self, key):
+        """Function | Load Profile
+
+        Read the profile cached under the key from the database.
+
+        Returns a tuple of the time it was stored and the profile,
+        or `None` if there is no profile for the key.
+
+        This is the loader of the ProfileCache, which is synchronous, so
+        the read blocks the event loop. It uses a read-only connection
+        which is never shared with a write, and in WAL mode it never waits
+        for the worker thread's writes either, so a read is two primary
+        key lookups: far less time than handing it to a thread would take.
+        """
+        row = self.read_connection.execute("""
+            SELECT profiles.stored_at, profiles.profile FROM profile_names
+            JOIN profiles ON profiles.player_id = profile_names.player_id
+            WHERE profile_names.name = ?
+        """, (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], pickle.loads(row[1])
+
+    def record(self, section, key, value):
+        """Function | Record Change
+
+        Write a single change to the database in the worker thread.
+        """
+        self.submit(self.write_change, section, key, value, time.time())
+
+    def save(self):
+        """Function | Save All Data
+
+        Write all of the data held in memory to the database.
+        """
+        self.submit(self.write_data, snapshot(self.bot.data), time.time())
+
+    def flush(self):
+        """Function | Flush Data
+
+        Wait until every change handed to the worker thread is written.
+        """
+        self.executor.submit(lambda: None).result()
+
+    def submit(self, func, *args):
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(self.report)
+
+    def report(self, future):
+        if future.exception():
+            print(f"{self.bot.ERR} {self.bot.TIMELOG()} Could not save data: {future.exception()}")
+
+    def get_write_connection(self):
+        if self.write_connection is None:
+            self.write_connection = self.connect()
+        return self.write_connection
+
+    def write_change(self, section, key, value, stored_at):
+        connection = self.get_write_connection()
+        with connection:
+            self.write_row(connection, section, key, value, stored_at)
+
+    def write_row(self, connection, section, key, value, stored_at):
+        if section == "profiles":
+            if value is None:
+                connection.execute("DELETE FROM profile_names WHERE name = ?", (key,))
+            else:
+                connection.execute(
+                    "INSERT OR REPLACE INTO profiles (player_id, stored_at, profile) VALUES (?, ?, ?)",
+                    (value.player_id, stored_at, pickle.dumps(value))
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO profile_names (name, player_id) VALUES (?, ?)",
+                    (key, value.player_id)
+                )
+        elif section == "ids":
+            if value is None:
+                connection.execute("DELETE FROM player_ids WHERE platform = ? AND name = ?", key)
+            else:
+                connection.execute(
+                    "INSERT OR REPLACE INTO player_ids (platform, name, player_id, stored_at) VALUES (?, ?, ?, ?)",
+                    key + (value, stored_at)
+                )
+        elif section == "discords":
+            if value is None:
+                connection.execute("DELETE FROM discords WHERE discord_id = ?", (key,))
+            else:
+                connection.execute("INSERT OR REPLACE INTO discords (discord_id, player_name) VALUES (?, ?)", (key, value))
+        elif section == "leaderboard":
+            if value is None:
+                connection.execute("DELETE FROM leaderboard WHERE key = ?", (key,))
+            else:
+                connection.execute("INSERT OR REPLACE INTO leaderboard (key, value) VALUES (?, ?)", (key, pickle.dumps(value)))
+
+    def write_data(self, data, stored_at):
+        connection = self.get_write_connection()
+        with connection:
+            self.write_all(connection, data, stored_at)
+
+    def write_all(self, connection, data, stored_at):
+        users = data.get("HyperscapeUsers", {})
+        for key, profile in users.get("profiles", {}).items():
+            self.write_row(connection, "profiles", key, profile, stored_at)
+        for discord_id, player_name in users.get("discords", {}).items():
+            self.write_row(connection, "discords", discord_id, player_name, stored_at)
+        for key, player_id in users.get("ids", {}).items():
+            self.write_row(connection, "ids", key, player_id, stored_at)
+        for key, value in data.get("HyperscapeLeaderboard", {}).items():
+            self.write_row(connection, "leaderboard", key, value, stored_at)
+
+        # Anything else is stored whole, one row per top level key.
+        extra = {name: value for name, value in data.items() if not name in ("HyperscapeUsers", "HyperscapeLeaderboard")}
+        users = {name: value for name, value in users.items() if not name in ("profiles", "discords", "ids")}
+        if users:
+            extra["HyperscapeUsers"] = users
+        for name, value in extra.items():
+            connection.execute("INSERT OR REPLACE INTO extra (name, value) VALUES (?, ?)", (name, pickle.dumps(value)))
+
+    def import_data(self, data):
+        """Function | Import Data
+
+        Write data loaded from a pickle data file into the database.
+        """
+        with self.connection:
+            self.write_all(self.connection, data, time.time())
+
+if __name__ == "__main__":
+    # One-shot import of a pickle data file into an SQLite database:
+    # python -m Resources.Storage ./Data/data_storage.pickle ./Data/data_storage.db
+    class ImportSettings:
+        data_file = sys.argv[1]
+        database_file = sys.argv[2]
+
+    storage = SQLiteStorage(ImportSettings)
+    with open(ImportSettings.data_file, 'rb') as file:
+        storage.import_data(pickle.load(file))
+    count = storage.connection.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+    print(f"Imported {count} profiles from {ImportSettings.data_file} into {ImportSettings.database_file}.")
@@ -6,13 +6,50 @@ the program. More details provided for each.
 import discord
 import datetime
 
+from Resources.Cache import RenderCache
+
+def thaw_embed(payload):
+    """Returns an embed built from a stored payload, with its own copy of the fields."""
+    if 'fields' in payload:
+        payload = dict(payload, fields = [dict(field) for field in payload['fields']])
+    return discord.Embed.from_dict(payload)
+
 class EmbedUtil:
     def __init__(self, bot):
+        self.bot = bot
         self.embed_color = bot.embed_color
         self.footer = bot.footer
         self.footer_image = bot.footer_image
         self.timestamp = bot.embed_ts
         self.show_author = bot.show_command_author
+        self.renders = RenderCache(bot.render_cache_size)
+
+    def settings(self):
+        """Returns the settings every embed is rendered with, as part of the key of cached renders."""
+        return (self.embed_color.value, self.footer, self.footer_image, self.show_author, self.bot.prefix)
+
+    def render_profile(self, profile, view, build):
+        """Function | Render Profile Embed
+
+        Returns the embed of a view of a profile, from the render cache
+        if the same view of the same refresh of the profile was rendered
+        with the same settings, otherwise calling `build` to create it.
+        The embed returned can be changed, e.g. to set its author,
+        without changing the cached render.
+
+        Profiles which don't know when they were refreshed can't tell
+        one version from another, so their views are always built.
+
+        Args
+        ----------
+        profile - An instance of the Profile class found in './Resources/APISession.py'
+        view - A hashable name of the view, e.g. `("stat", category)`.
+        build - A function creating the embed.
+        """
+        if not profile.refresh_utime:
+            return build()
+        key = (profile.player_id, profile.refresh_utime, view, self.settings())
+        return self.renders.render(key, lambda: build().to_dict(), thaw_embed)
 
     def get_embed(self, title = None, desc = None, fields = None, ts = False, author = None, thumbnail = None, image = None, author_url = None):
         """Function | Create Embedded Message
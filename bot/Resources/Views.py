@@ -0,0 +1,149 @@
+"""Resource | Stat Views
+
+This file hosts the registry of the views of a profile's stats which
+the `stat`, `profile` and `search` commands show, each compiled once
+at load time into the getters of its fields, and the one function
+rendering any of them into embed fields.
+
+To add a view, or a field to a view, add it to the specs below.
+"""
+import operator
+from collections import namedtuple
+
+from Resources.Enums import HackStat, StatCategory, WeaponStat
+from Resources.Fields import HACK_FIELDS, HACKS, STAT_FIELDS, STAT_LABELS, WEAPON_FIELDS, WEAPONS
+
+class View(namedtuple('View', ['title', 'fields', 'read', 'formats'])):
+    """Class | Compiled View
+
+    A view of a profile's stats.
+
+    Args
+    ----------
+    title - The title of the embed showing the view.
+    fields - A tuple of the embed field of each field of the view,
+        with its label and inline flag and no value, copied for
+        every render.
+    read - A function reading the values of every field from a
+        profile at once, as a tuple in the order of `fields`.
+    formats - A tuple of (position, format function) of the fields
+        whose value is formatted before it is shown.
+    """
+    __slots__ = ()
+
+# Where each stat, weapon stat and hack stat is in the value tuples of a profile: (tuple attribute, position).
+POSITIONS = {field.attr: ('stat_values', index) for index, field in enumerate(STAT_FIELDS)}
+for array, stats, fields in (('weapon_values', WEAPONS, WEAPON_FIELDS), ('hack_values', HACKS, HACK_FIELDS)):
+    for index, (attr, name) in enumerate(stats):
+        for offset, field in enumerate(fields):
+            POSITIONS[f"{attr}.{field.attr}"] = (array, index * len(fields) + offset)
+
+def compile_field(spec):
+    """Function | Compile Field
+
+    Returns the (label, attribute, format) of a field spec, which is a
+    profile attribute, or a tuple of the attribute, the label (`None`
+    for the stat's label) and optionally a format string. Attributes of
+    a weapon or hack are dotted, e.g. `protocol.kills`.
+    """
+    if isinstance(spec, str):
+        spec = (spec,)
+    attr, label, fmt = spec + (None,) * (3 - len(spec))
+    return (label or STAT_LABELS[attr], attr, fmt.format if fmt else None)
+
+def _getter(getter, *items):
+    """Returns a getter of the items, which returns a tuple even for a single item."""
+    if len(items) > 1:
+        return getter(*items)
+    item = getter(items[0])
+    return lambda value: (item(value),)
+
+def compile_reader(attrs):
+    """Function | Compile Reader
+
+    Returns a function reading the values of every attribute from a
+    profile as a tuple. When every attribute is in the same value tuple
+    of the profile, e.g. `stat_values`, they are read from it with a
+    single `itemgetter` call. Otherwise they are read with a single
+    `attrgetter` call.
+    """
+    arrays = {POSITIONS[attr][0] if attr in POSITIONS else None for attr in attrs}
+    array = arrays.pop() if len(arrays) == 1 else None
+    if array is None:
+        return _getter(operator.attrgetter, *attrs)
+    items = _getter(operator.itemgetter, *(POSITIONS[attr][1] for attr in attrs))
+    array = operator.attrgetter(array)
+    return lambda profile: items(array(profile))
+
+def compile_view(title, specs):
+    """Returns the View of a title and a list of field specs, see `compile_field`."""
+    fields = [compile_field(spec) for spec in specs]
+    return View(
+        title,
+        tuple({"name": label, "value": None, "inline": True} for label, attr, fmt in fields),
+        compile_reader([attr for label, attr, fmt in fields]),
+        tuple((position, fmt) for position, (label, attr, fmt) in enumerate(fields) if fmt)
+    )
+
+MAIN = (
+    'kills', 'assists', 'kd', 'wins', 'losses', 'winrate', 'crown_wins', 'crown_pickups', 'crown_pickup_success_rate'
+)
+CATEGORIES = {
+    'main': MAIN,
+    'solo': (
+        'solo_winrate', 'solo_wins', 'solo_losses', 'solo_matches',
+        ('solo_crown_wins', "Crown Wins"), ('solo_time_played', "Time Played")
+    ),
+    'squad': (
+        'squad_winrate', 'squad_wins', 'squad_losses', 'squad_matches',
+        ('squad_crown_wins', "Crown Wins"), ('squad_time_played', "Time Played")
+    ),
+    'general': (
+        'kills', 'matches', 'avg_kills_per_match', 'avg_dmg_per_kill', 'headshot_accuracy',
+        ('weapon_headshot_damage', "Headshot Damage"),
+        ('weapon_damage', "Weapon Damage"),
+        'damage_by_items', 'chests_broken', 'fusions', 'revives', 'time_played'
+    ),
+    'best': (
+        ('careerbest_kills', "Most Kills"),
+        ('careerbest_long_range_final_blows', "Long Range Kills"),
+        ('careerbest_short_range_final_blows', "Short Range Kills"),
+        ('careerbest_damage_done', "Damage Done"),
+        ('careerbest_critical_damage', "Headshot Damage"),
+        ('careerbest_assists', "Assists"),
+        ('careerbest_healed', "Healed"),
+        ('careerbest_survival_time', "Survival Time"),
+        ('careerbest_item_fused', "Items Fused"),
+        ('careerbest_fused_to_max', "Maximum Fusion"),
+        ('careerbest_revealed', "Revealed")
+    ),
+    'weapons': tuple((f"{attr}.kills", f"{name} Kills") for attr, name in WEAPONS),
+    'hacks': tuple((f"{attr}.fusions", f"{name} Fusions") for attr, name in HACKS if attr != 'reveal')
+}
+
+# The fields of the view of a single weapon or hack.
+WEAPON_VIEW = (('kills', None), ('damage', None), ('headshot_damage', None), ('fusions', None), ('hs_accuracy', "{}%"))
+HACK_VIEW = (('kills', None), ('damage', None), ('fusions', None))
+
+# Every view, by the StatCategory, WeaponStat or HackStat it is shown for.
+VIEWS = {StatCategory(name): compile_view(f"{name.capitalize()} Stats", specs) for name, specs in CATEGORIES.items()}
+for enum, stats, fields, specs in ((WeaponStat, WEAPONS, WEAPON_FIELDS, WEAPON_VIEW), (HackStat, HACKS, HACK_FIELDS, HACK_VIEW)):
+    labels = {field.attr: field.label for field in fields}
+    for attr, name in stats:
+        VIEWS[enum[attr]] = compile_view(f"{name} Stats", [(f"{attr}.{field}", labels[field], fmt) for field, fmt in specs])
+
+# The stats shown by `profile` and `search`.
+MAIN_VIEW = VIEWS[StatCategory.main]
+
+def render_fields(view, profile):
+    """Function | Render View
+
+    Returns the embed fields of a view of a profile.
+    """
+    fields = list(map(dict.copy, view.fields))
+    for field, value in zip(fields, view.read(profile)):
+        field["value"] = value
+    for position, fmt in view.formats:
+        field = fields[position]
+        field["value"] = fmt(field["value"])
+    return fields
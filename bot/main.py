@@ -21,6 +21,8 @@ import os
 from Resources.Data import DataManager
 from Resources.Utility import EmbedUtil
 from Resources.APISession import APISession
+from Resources.Concurrency import AdaptiveLimiter, CircuitBreaker, RateLimiter
+from Resources.Permissions import command_allowed
 from colorama import init
 init()
 
@@ -36,8 +38,25 @@ def get_prefix(bot, message):
     """
     return bot.prefix
 
+class HyperscapeBot(commands.Bot):
+    """Class | Hyperscape Bot
+
+    The bot itself, extended so that shared resources are released
+    whenever the bot disconnects, whether from the 'restart' command
+    or from the process being stopped.
+    """
+    async def close(self):
+        self.data_manager.flush_data()
+        await self.api.close()
+        await super().close()
+
+# The members intent lets guild leaderboards follow who joins and leaves each server.
+# NOTE: It must also be enabled for the bot in the Discord developer portal.
+intents = discord.Intents.default()
+intents.members = True
+
 # Create the 'bot' instance, using the fucntion above for getting the prefix.
-bot = commands.Bot(command_prefix=get_prefix, description="Heroicos_HM's Custom Bot", case_insensitive = True)
+bot = HyperscapeBot(command_prefix=get_prefix, description="Heroicos_HM's Custom Bot", case_insensitive = True, intents = intents)
 
 # Remove the help command to leave room for implementing a custom one.
 bot.remove_command('help')
@@ -59,7 +78,38 @@ bot.data_manager.load_config()
 bot.data_manager.load_permissions()
 bot.data_manager.load_data()
 
-bot.api = APISession()
+bot.api = APISession(
+    keepalive = bot.api_keepalive,
+    limit_per_host = bot.api_limit_per_host,
+    dns_cache_ttl = bot.api_dns_cache_ttl,
+    limiter = RateLimiter(
+        rate = bot.api_rate,
+        burst = bot.api_burst,
+        max_wait = bot.api_max_wait
+    ),
+    breaker = CircuitBreaker(
+        failure_threshold = bot.api_failure_threshold,
+        reset_timeout = bot.api_reset_timeout
+    ),
+    concurrency = AdaptiveLimiter(
+        initial = bot.api_concurrency_initial,
+        minimum = bot.api_concurrency_minimum,
+        maximum = bot.api_concurrency_maximum,
+        latency_target = bot.api_latency_target,
+        error_target = bot.api_error_target,
+        window = bot.api_concurrency_window
+    ),
+    timeouts = bot.api_timeouts,
+    retries = bot.api_retries,
+    backoff_base = bot.api_backoff_base,
+    backoff_cap = bot.api_backoff_cap,
+    hedging = bot.api_hedging,
+    hedge_rate = bot.api_hedge_rate,
+    hedge_min_samples = bot.api_hedge_min_samples,
+    refresh_deadline = bot.api_refresh_deadline,
+    refresh_poll_base = bot.api_refresh_poll_base,
+    refresh_poll_cap = bot.api_refresh_poll_cap
+)
 
 bot.embed_util = EmbedUtil(bot)
 
@@ -68,7 +118,10 @@ extensions = [
     'Cogs.Errors',
     'Cogs.General',
     'Cogs.Help',
-    'Cogs.HyperscapeStats'
+    'Cogs.HyperscapeStats',
+    'Cogs.HyperscapeLeaderboard',
+    'Cogs.HyperscapeHistory',
+    'Cogs.Diagnostics'
 ]
 # Load the extension files listed above.
 for extension in extensions:
@@ -89,6 +142,11 @@ async def on_ready():
 
     print(f"{bot.OK} {bot.TIMELOG()} Logged in as {bot.user} and connected to Discord! (ID: {bot.user.id})")
 
+    # Open the pooled API session, and connect to the API ahead of the first command if enabled.
+    await bot.api.start()
+    if bot.api_warm_up:
+        bot.loop.create_task(bot.api.warm_up())
+
     # Set the playing status of the bot to what is set in the config.
     if bot.show_game_status:
         game = discord.Game(name = bot.game_to_show.format(prefix = bot.prefix))
@@ -114,41 +172,14 @@ async def command_permissions(ctx):
     When a comand is used this function will use the permissions imported
     from Permissions.yml to verify that a user is/is not allowed
     to use a command.
+
+    Commands listed in the permissions can only be used by members with
+    one of the roles listed for it, or by administrators. The roles are
+    compiled to a set of role IDs for each command when the permissions
+    are loaded, so this is a dict lookup and a set test, see
+    './Resources/Permissions.py'.
     """
-    # Administrators are always allowed to use the command.
-    if ctx.author.guild_permissions.administrator:
-        return True
-    else:
-        # Finding permission name scheme of a command.
-        name = ctx.command.name
-        if ctx.command.parent:
-            command = ctx.command
-            parent_exists = True
-            while parent_exists == True:
-                name = ctx.command.parent.name + '-' + name
-                command = ctx.command.parent
-                if not command.parent:
-                    parent_exists = False
-
-        """Checking command permissions
-
-        For each role ID listed for a command, check if the user has that role id.
-
-        If they do, allow command usage, otherwise, proceed to checking next role on the list.
-
-        If the user does not have any of the roles, deny the command usage.
-        """
-        if name in ctx.bot.permissions.keys():
-            for permission in ctx.bot.permissions[name]:
-                try:
-                    role = ctx.guild.get_role(int(permission))
-                    if role in ctx.author.roles:
-                        return True
-                except Exception as e:
-                    print(e)
-            return False
-        else:
-            return True
+    return command_allowed(ctx)
 
 try:
     bot.run(bot.TOKEN, bot = True, reconnect = True)